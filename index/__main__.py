@@ -0,0 +1,150 @@
+from typing import Dict, List
+from os import path
+import argparse
+import json
+import logging
+import os
+import sys
+
+from .structure import FileIndex
+
+#linha de comando para os jobs de indexação e os processos de consulta. Ex.:
+#   python -m index build wiki/ --file-prefix dados/occur_index --workers 4 --positional
+#   python -m index query dados/occur_index_3.lex "casa verde" "casa AND NOT azul" --mode boolean
+#   python -m index stats dados/occur_index_3.lex
+#Sem consultas na linha de comando, query lê uma consulta por linha da entrada padrão e
+#responde uma linha JSON por consulta. Apenas build (e query com Cleaner) carregam nltk/bs4
+QUERY_MODES = ("ranked", "boolean", "phrase")
+SCORERS = ("bm25", "tfidf")
+
+
+def cleaner_file_name(str_lexicon_file:str) -> str:
+    #configuração do Cleaner da indexação, ao lado do léxico (ex.: occur_index_3.cleaner)
+    return f"{path.splitext(str_lexicon_file)[0]}.cleaner"
+
+def cleaner_options(args) -> Dict:
+    return {"stop_words_file": path.abspath(args.stop_words), "language": args.language,
+            "perform_stop_words_removal": not args.keep_stop_words,
+            "perform_accents_removal": not args.keep_accents,
+            "perform_stemming": not args.no_stemming, "html_engine": args.html_engine}
+
+def load_cleaner(str_lexicon_file:str):
+    #o mesmo Cleaner da indexação (None se o indice foi criado sem ele)
+    str_file = cleaner_file_name(str_lexicon_file)
+    if not path.exists(str_file):
+        return None
+    from .indexer import Cleaner
+    with open(str_file) as file:
+        return Cleaner(**json.load(file))
+
+def file_size(str_file:str) -> int:
+    return os.path.getsize(str_file) if path.exists(str_file) else 0
+
+
+def build(args):
+    from .indexer import Cleaner, HTMLIndexer
+    dic_cleaner_options = cleaner_options(args)
+    obj_index = FileIndex(spimi=True, file_prefix=args.file_prefix, compressed=args.compressed,
+                            memory_budget=args.memory_budget, positional=args.positional,
+                            frozen_lexicon=True, bitmap_threshold=args.bitmap_threshold)
+    indexer = HTMLIndexer(obj_index, positional=args.positional, cleaner=Cleaner(**dic_cleaner_options))
+    indexer.index_text_dir(args.html_dir, num_workers=args.workers)
+    obj_index.finish_indexing()
+    str_lexicon_file = obj_index.save(args.lexicon)
+    with open(cleaner_file_name(str_lexicon_file), "w") as file:
+        json.dump(dic_cleaner_options, file, indent=4)
+    obj_index.close()
+    print(str_lexicon_file)
+
+def query(args):
+    obj_index = FileIndex.open(args.lexicon, cache_bytes=args.cache_bytes, query_cache_bytes=args.query_cache_bytes)
+    cleaner = None if args.raw else load_cleaner(args.lexicon)
+    if args.mode == "ranked":
+        from .ranking import RankedQuery, BM25, TfIdf
+        scorer = BM25(obj_index) if args.scorer == "bm25" else TfIdf(obj_index)
+        obj_query = RankedQuery(obj_index, scorer, cleaner)
+        search = lambda str_query: [[doc_id, score] for doc_id, score in obj_query.search(str_query, args.k)]
+    elif args.mode == "boolean":
+        from .query import BooleanQuery
+        search = BooleanQuery(obj_index, cleaner).search
+    else:
+        from .query import PhraseQuery
+        obj_query = PhraseQuery(obj_index, cleaner)
+        search = lambda str_query: obj_query.search(str_query, args.slop)
+
+    it_queries = args.queries if len(args.queries) > 0 else (str_line.strip() for str_line in sys.stdin)
+    for str_query in it_queries:
+        if str_query == "":
+            continue
+        try:
+            dic_output = {"query": str_query, "results": search(str_query)}
+        except ValueError as e:
+            dic_output = {"query": str_query, "error": str(e)}
+        print(json.dumps(dic_output, ensure_ascii=False), flush=True)
+    obj_index.close()
+
+def stats(args):
+    obj_index = FileIndex.open(args.lexicon)
+    statistics = obj_index.statistics
+    str_idx_file = obj_index.str_idx_file_name
+    dic_output = {"documents": obj_index.document_count, "terms": len(obj_index.dic_index),
+                  "total_tokens": statistics.total_tokens,
+                  "average_document_length": statistics.average_document_length,
+                  "compressed": obj_index.compressed,
+                  "positional": obj_index.arr_positions_term_id is not None,
+                  "bitmap_terms": 0 if obj_index.arr_bitmap_term_id is None else len(obj_index.arr_bitmap_term_id),
+                  "files": {str_file: file_size(str_file)
+                                for str_file in [args.lexicon, str_idx_file, f"{str_idx_file}.pos", f"{str_idx_file}.bm"]
+                                if path.exists(str_file)}}
+    obj_index.close()
+    print(json.dumps(dic_output, indent=4, ensure_ascii=False))
+
+
+def add_cleaner_arguments(parser):
+    group = parser.add_argument_group("Cleaner")
+    group.add_argument("--stop-words", default="stopwords.txt", help="arquivo de stop words")
+    group.add_argument("--language", default="portuguese", help="idioma do stemmer")
+    group.add_argument("--keep-stop-words", action="store_true")
+    group.add_argument("--keep-accents", action="store_true")
+    group.add_argument("--no-stemming", action="store_true")
+    group.add_argument("--html-engine", choices=("bs4", "parser"), default="parser", help="parser não depende do bs4")
+
+def main(lst_args:List[str]=None):
+    parser = argparse.ArgumentParser(prog="python -m index", description="Indexação e consulta de coleções HTML")
+    parser.add_argument("--log-level", default="WARNING")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_build = subparsers.add_parser("build", help="indexa um diretório de HTMLs (um subdiretório por grupo de arquivos)")
+    parser_build.add_argument("html_dir")
+    parser_build.add_argument("--file-prefix", default="occur_index")
+    parser_build.add_argument("--lexicon", default=None, help="arquivo do léxico (padrão: <arquivo de indice>.lex)")
+    parser_build.add_argument("--workers", type=int, default=1)
+    parser_build.add_argument("--compressed", action="store_true")
+    parser_build.add_argument("--positional", action="store_true", help="necessário para o modo phrase")
+    parser_build.add_argument("--bitmap-threshold", type=int, default=None)
+    parser_build.add_argument("--memory-budget", type=int, default=None, help="bytes")
+    add_cleaner_arguments(parser_build)
+    parser_build.set_defaults(function=build)
+
+    parser_query = subparsers.add_parser("query", help="consulta um indice gravado por build")
+    parser_query.add_argument("lexicon")
+    parser_query.add_argument("queries", nargs="*", help="consultas (padrão: uma por linha da entrada padrão)")
+    parser_query.add_argument("--mode", choices=QUERY_MODES, default="ranked")
+    parser_query.add_argument("--scorer", choices=SCORERS, default="bm25")
+    parser_query.add_argument("-k", type=int, default=10)
+    parser_query.add_argument("--slop", type=int, default=0)
+    parser_query.add_argument("--raw", action="store_true", help="não normaliza os termos da consulta")
+    parser_query.add_argument("--cache-bytes", type=int, default=0)
+    parser_query.add_argument("--query-cache-bytes", type=int, default=0)
+    parser_query.set_defaults(function=query)
+
+    parser_stats = subparsers.add_parser("stats", help="estatísticas de um indice gravado por build")
+    parser_stats.add_argument("lexicon")
+    parser_stats.set_defaults(function=stats)
+
+    args = parser.parse_args(lst_args)
+    logging.basicConfig(level=args.log_level.upper())
+    args.function(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+from typing import Dict, List, Tuple
+from collections import Counter
+from itertools import accumulate
+from random import Random
+from time import perf_counter
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import tracemalloc
+
+from .structure import Index, HashIndex, FileIndex
+from .segment import SegmentedIndex
+from .shard import ShardedIndex
+from .metrics import peak_rss_bytes
+
+#benchmark reprodutível da indexação: gera (ou lê) a coleção, mede cada fase separadamente
+#e grava o resultado em JSON para comparar os engines entre commits. Ex.:
+#   python -m index.benchmark --engine hash spimi compressed --docs 2000 --output resultado.json
+PHASES = ("tokenize", "index", "flush", "finalize", "cold_lookup", "warm_lookup")
+
+#engines disponíveis: nome -> função que cria o indice dentro do diretório de trabalho
+ENGINES = {
+    "hash": lambda str_dir: HashIndex(),
+    "hash-frozen": lambda str_dir: HashIndex(frozen=True),
+    "file": lambda str_dir: FileIndex(file_prefix=os.path.join(str_dir, "occur_index")),
+    "spimi": lambda str_dir: FileIndex(spimi=True, file_prefix=os.path.join(str_dir, "occur_index")),
+    "spimi-thread": lambda str_dir: FileIndex(spimi=True, flush_executor="thread", file_prefix=os.path.join(str_dir, "occur_index")),
+    "spimi-process": lambda str_dir: FileIndex(spimi=True, flush_executor="process", file_prefix=os.path.join(str_dir, "occur_index")),
+    "compressed": lambda str_dir: FileIndex(spimi=True, compressed=True, file_prefix=os.path.join(str_dir, "occur_index")),
+    "segmented": lambda str_dir: SegmentedIndex(os.path.join(str_dir, "segments"), background_merge=False),
+    "sharded": lambda str_dir: ShardedIndex(4, os.path.join(str_dir, "shards")),
+}
+
+
+def zipf_vocabulary(vocabulary_size:int) -> List[str]:
+    #termos distintos e determinísticos ("a", "b", ..., "aa", "ab", ...)
+    lst_vocabulary = []
+    for i in range(vocabulary_size):
+        str_term = ""
+        i += 1
+        while i > 0:
+            i, int_letter = divmod(i-1, 26)
+            str_term = chr(97+int_letter)+str_term
+        lst_vocabulary.append(str_term)
+    return lst_vocabulary
+
+def zipf_corpus(num_docs:int, terms_per_doc:int, vocabulary_size:int, zipf_s:float=1.0, seed:int=10):
+    #gera (doc_id, lista de tokens): o termo de posição r do vocabulário tem probabilidade
+    #proporcional a 1/r^s, como a distribuição das palavras em textos reais
+    rnd = Random(seed)
+    lst_vocabulary = zipf_vocabulary(vocabulary_size)
+    lst_cum_weights = list(accumulate(1/(rank**zipf_s) for rank in range(1, vocabulary_size+1)))
+    for doc_id in range(1, num_docs+1):
+        #o tamanho dos documentos varia entre metade e uma vez e meia terms_per_doc
+        int_size = rnd.randint(max(terms_per_doc//2, 1), terms_per_doc+terms_per_doc//2)
+        yield doc_id, rnd.choices(lst_vocabulary, cum_weights=lst_cum_weights, k=int_size)
+
+def bytes_written() -> int:
+    #total de bytes escritos pelo processo (Linux); None se não estiver disponível
+    try:
+        with open("/proc/self/io") as file:
+            for str_line in file:
+                if str_line.startswith("wchar:"):
+                    return int(str_line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class PhaseMeter:
+    #acumula tempo, pico de memória (tracemalloc) e bytes escritos de cada fase
+    def __init__(self, track_memory:bool=True):
+        self.track_memory = track_memory
+        self.dic_phases = {str_phase: {"seconds": 0.0, "peak_memory_bytes": None, "bytes_written": None} for str_phase in PHASES}
+        self.str_phase = None
+
+    def start(self, str_phase:str):
+        self.str_phase = str_phase
+        if self.track_memory:
+            tracemalloc.reset_peak()
+        self.int_bytes_start = bytes_written()
+        self.time_start = perf_counter()
+
+    def stop(self):
+        dic_phase = self.dic_phases[self.str_phase]
+        dic_phase["seconds"] += perf_counter()-self.time_start
+        int_bytes_end = bytes_written()
+        if int_bytes_end is not None:
+            dic_phase["bytes_written"] = (dic_phase["bytes_written"] or 0)+int_bytes_end-self.int_bytes_start
+        if self.track_memory:
+            dic_phase["peak_memory_bytes"] = max(dic_phase["peak_memory_bytes"] or 0, tracemalloc.get_traced_memory()[1])
+        self.str_phase = None
+
+
+def tokenize_corpus(meter:PhaseMeter, num_docs:int, terms_per_doc:int, vocabulary_size:int,
+                        zipf_s:float, seed:int, str_html_dir:str=None) -> List[Tuple[int,Dict[str,int]]]:
+    #lista de (doc_id, {termo: frequência}); a geração da coleção sintética não é medida
+    if str_html_dir is not None:
+        from .indexer import HTMLIndexer
+        indexer = HTMLIndexer(None)
+        lst_files = indexer.list_text_dir(str_html_dir)
+        meter.start("tokenize")
+        lst_word_counts = [indexer.file_word_count(str_file) for str_file in lst_files]
+        meter.stop()
+        return lst_word_counts
+
+    lst_docs = list(zipf_corpus(num_docs, terms_per_doc, vocabulary_size, zipf_s, seed))
+    meter.start("tokenize")
+    lst_word_counts = [(doc_id, Counter(lst_tokens)) for doc_id, lst_tokens in lst_docs]
+    meter.stop()
+    return lst_word_counts
+
+def lookup_terms(lst_word_counts, num_lookups:int) -> List[str]:
+    #metade dos termos mais frequentes e metade dos demais (ordem determinística)
+    lst_terms = [term for term, _ in Counter(term for _, dic_word_count in lst_word_counts
+                                               for term in dic_word_count).most_common()]
+    int_half = num_lookups//2
+    lst_tail = lst_terms[int_half:]
+    int_step = max(len(lst_tail)//max(num_lookups-int_half, 1), 1)
+    return lst_terms[:int_half]+lst_tail[::int_step][:num_lookups-int_half]
+
+def run_benchmark(create_index, lst_word_counts, lst_lookup_terms:List[str], meter:PhaseMeter, str_dir:str) -> Dict:
+    obj_index : Index = create_index(str_dir)
+
+    #o tempo de gravação dos buffers durante a indexação é contado na fase flush
+    if hasattr(obj_index, "save_tmp_occurrences"):
+        save_tmp_occurrences = obj_index.save_tmp_occurrences
+        def timed_save_tmp_occurrences():
+            if meter.str_phase != "index":
+                return save_tmp_occurrences()
+            meter.stop()
+            meter.start("flush")
+            save_tmp_occurrences()
+            meter.stop()
+            meter.start("index")
+        obj_index.save_tmp_occurrences = timed_save_tmp_occurrences
+
+    int_occurrences = 0
+    meter.start("index")
+    for doc_id, dic_word_count in lst_word_counts:
+        for term, term_freq in dic_word_count.items():
+            obj_index.index(term, doc_id, term_freq)
+        int_occurrences += len(dic_word_count)
+    meter.stop()
+
+    meter.start("finalize")
+    obj_index.finish_indexing()
+    meter.stop()
+
+    int_postings = 0
+    for str_phase in ("cold_lookup", "warm_lookup"):
+        meter.start(str_phase)
+        int_postings = sum(len(obj_index.get_occurrence_list(term)) for term in lst_lookup_terms)
+        meter.stop()
+
+    dic_result = {"documents": obj_index.document_count, "terms": len(obj_index.vocabulary),
+                  "occurrences": int_occurrences, "lookup_postings": int_postings,
+                  "phases": meter.dic_phases}
+    if hasattr(obj_index, "close"):
+        obj_index.close()
+    return dic_result
+
+def benchmark(lst_engines:List[str], num_docs:int=2000, terms_per_doc:int=500, vocabulary_size:int=20000,
+                zipf_s:float=1.0, seed:int=10, str_html_dir:str=None, num_lookups:int=100,
+                track_memory:bool=True) -> Dict:
+    dic_output = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+                  "corpus": {"html_dir": str_html_dir} if str_html_dir is not None else
+                            {"docs": num_docs, "terms_per_doc": terms_per_doc, "vocabulary": vocabulary_size,
+                             "zipf_s": zipf_s, "seed": seed},
+                  "engines": {}}
+    for str_engine in lst_engines:
+        if track_memory:
+            tracemalloc.start()
+        meter = PhaseMeter(track_memory)
+        lst_word_counts = tokenize_corpus(meter, num_docs, terms_per_doc, vocabulary_size, zipf_s, seed, str_html_dir)
+        lst_lookup_terms = lookup_terms(lst_word_counts, num_lookups)
+        with tempfile.TemporaryDirectory() as str_dir:
+            dic_output["engines"][str_engine] = run_benchmark(ENGINES[str_engine], lst_word_counts, lst_lookup_terms, meter, str_dir)
+        if track_memory:
+            tracemalloc.stop()
+    #o pico de RSS é do processo inteiro (todos os engines)
+    dic_output["peak_rss_bytes"] = peak_rss_bytes()
+    return dic_output
+
+
+def main(lst_args:List[str]=None):
+    parser = argparse.ArgumentParser(description="Benchmark de indexação")
+    parser.add_argument("--engine", nargs="+", choices=sorted(ENGINES), default=["hash", "file"])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--terms-per-doc", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--zipf-s", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=10)
+    parser.add_argument("--html-dir", default=None, help="usa os arquivos HTML do diretório em vez da coleção sintética")
+    parser.add_argument("--lookups", type=int, default=100)
+    parser.add_argument("--no-memory", action="store_true", help="desabilita o tracemalloc (mais rápido)")
+    parser.add_argument("--output", default=None, help="arquivo JSON de saída (padrão: saída padrão)")
+    args = parser.parse_args(lst_args)
+
+    dic_output = benchmark(args.engine, args.docs, args.terms_per_doc, args.vocabulary, args.zipf_s, args.seed,
+                            args.html_dir, args.lookups, not args.no_memory)
+    str_json = json.dumps(dic_output, indent=4)
+    if args.output is None:
+        print(str_json)
+    else:
+        with open(args.output, "w") as file:
+            file.write(str_json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+from typing import Dict, List
+from array import array
+
+from .codec import vbyte_encode, vbyte_decode, vbyte_decode_all, term_offsets_to_bytes, array_to_bytes, array_from_bytes
+
+#bitmaps de doc_ids no estilo Roaring: os doc_ids são divididos em blocos (containers) de
+#2^16 documentos pelos 16 bits mais altos. Em disco, um container com até ARRAY_CONTAINER_MAX
+#documentos é gravado como a lista dos 16 bits mais baixos (2 bytes cada) e os demais como
+#um bitmap de 8 KB. Em memória, cada container é um int Python de 65536 bits, então AND/OR/NOT
+#entre dois termos são operações bit a bit feitas em C, uma palavra de máquina por vez
+CONTAINER_BITS = 16
+CONTAINER_SIZE = 1 << CONTAINER_BITS
+CONTAINER_BYTES = CONTAINER_SIZE//8
+ARRAY_CONTAINER_MAX = 4096
+
+#posições dos bits ligados de cada valor de byte
+_BYTE_BITS = [tuple(i for i in range(8) if int_byte & (1 << i)) for int_byte in range(256)]
+
+
+def container_lows(int_mask:int):
+    #16 bits mais baixos dos doc_ids de um container, em ordem (percorre os bytes não nulos da máscara)
+    for i, int_byte in enumerate(int_mask.to_bytes(CONTAINER_BYTES, "little")):
+        if int_byte:
+            int_byte_base = i*8
+            yield from (int_byte_base+int_bit for int_bit in _BYTE_BITS[int_byte])
+
+
+class Bitmap:
+    #conjunto de doc_ids: número do container -> máscara (int) dos 16 bits mais baixos
+    def __init__(self, dic_containers:Dict[int,int]=None):
+        self.dic_containers = dic_containers if dic_containers is not None else {}
+
+    @classmethod
+    def from_doc_ids(cls, it_doc_ids) -> "Bitmap":
+        #os bits são ligados em um bytearray por container, convertido em int uma única vez
+        dic_bytes = {}
+        for doc_id in it_doc_ids:
+            int_key = doc_id >> CONTAINER_BITS
+            bytes_container = dic_bytes.get(int_key)
+            if bytes_container is None:
+                bytes_container = dic_bytes[int_key] = bytearray(CONTAINER_BYTES)
+            int_low = doc_id & (CONTAINER_SIZE-1)
+            bytes_container[int_low >> 3] |= 1 << (int_low & 7)
+        return cls({int_key: int.from_bytes(bytes_container, "little") for int_key, bytes_container in dic_bytes.items()})
+
+    def __and__(self, other:"Bitmap") -> "Bitmap":
+        dic_containers = {}
+        for int_key, int_mask in self.dic_containers.items():
+            int_other = other.dic_containers.get(int_key)
+            if int_other is not None and int_mask & int_other:
+                dic_containers[int_key] = int_mask & int_other
+        return Bitmap(dic_containers)
+
+    def __or__(self, other:"Bitmap") -> "Bitmap":
+        dic_containers = dict(self.dic_containers)
+        for int_key, int_mask in other.dic_containers.items():
+            dic_containers[int_key] = dic_containers.get(int_key, 0) | int_mask
+        return Bitmap(dic_containers)
+
+    def __sub__(self, other:"Bitmap") -> "Bitmap":
+        #AND NOT
+        dic_containers = {}
+        for int_key, int_mask in self.dic_containers.items():
+            int_mask &= ~other.dic_containers.get(int_key, 0)
+            if int_mask:
+                dic_containers[int_key] = int_mask
+        return Bitmap(dic_containers)
+
+    def __contains__(self, doc_id:int) -> bool:
+        return bool(self.dic_containers.get(doc_id >> CONTAINER_BITS, 0) >> (doc_id & (CONTAINER_SIZE-1)) & 1)
+
+    def __len__(self) -> int:
+        return sum(int_mask.bit_count() for int_mask in self.dic_containers.values())
+
+    def doc_ids(self) -> List[int]:
+        #doc_ids em ordem crescente
+        lst_doc_ids = []
+        for int_key in sorted(self.dic_containers):
+            int_base = int_key << CONTAINER_BITS
+            lst_doc_ids.extend(int_base+int_low for int_low in container_lows(self.dic_containers[int_key]))
+        return lst_doc_ids
+
+    def encode(self) -> bytearray:
+        #quantidade de containers e, para cada um (em ordem): número, quantidade de documentos e conteúdo
+        bytes_out = bytearray()
+        vbyte_encode(len(self.dic_containers), bytes_out)
+        for int_key in sorted(self.dic_containers):
+            int_mask = self.dic_containers[int_key]
+            int_count = int_mask.bit_count()
+            vbyte_encode(int_key, bytes_out)
+            vbyte_encode(int_count, bytes_out)
+            if int_count > ARRAY_CONTAINER_MAX:
+                bytes_out += int_mask.to_bytes(CONTAINER_BYTES, "little")
+            else:
+                bytes_out += array_to_bytes(array('H', container_lows(int_mask)))
+        return bytes_out
+
+    @classmethod
+    def decode(cls, bytes_bitmap, int_pos:int=0) -> "Bitmap":
+        dic_containers = {}
+        int_containers, int_pos = vbyte_decode(bytes_bitmap, int_pos)
+        for _ in range(int_containers):
+            int_key, int_pos = vbyte_decode(bytes_bitmap, int_pos)
+            int_count, int_pos = vbyte_decode(bytes_bitmap, int_pos)
+            if int_count > ARRAY_CONTAINER_MAX:
+                dic_containers[int_key] = int.from_bytes(bytes_bitmap[int_pos:int_pos+CONTAINER_BYTES], "little")
+                int_pos += CONTAINER_BYTES
+            else:
+                bytes_container = bytearray(CONTAINER_BYTES)
+                for int_low in array_from_bytes('H', bytes_bitmap[int_pos:int_pos+2*int_count]):
+                    bytes_container[int_low >> 3] |= 1 << (int_low & 7)
+                dic_containers[int_key] = int.from_bytes(bytes_container, "little")
+                int_pos += 2*int_count
+        return cls(dic_containers)
+
+
+#formato de um termo no arquivo de bitmaps (.bm): tamanho do bitmap em bytes, o bitmap
+#(Bitmap.encode) e as frequências (VByte), na ordem dos doc_ids. As frequências só são
+#decodificadas quando as ocorrências do termo são lidas (e não nas operações booleanas)
+
+def encode_bitmap_postings(lst_doc_ids:List[int], lst_term_freqs:List[int]) -> bytearray:
+    bytes_bitmap = Bitmap.from_doc_ids(lst_doc_ids).encode()
+    bytes_out = bytearray()
+    vbyte_encode(len(bytes_bitmap), bytes_out)
+    bytes_out += bytes_bitmap
+    for term_freq in lst_term_freqs:
+        vbyte_encode(term_freq, bytes_out)
+    return bytes_out
+
+
+def decode_bitmap(bytes_postings) -> Bitmap:
+    int_size, int_pos = vbyte_decode(bytes_postings, 0)
+    return Bitmap.decode(bytes_postings[int_pos:int_pos+int_size])
+
+
+def decode_bitmap_postings(bytes_postings):
+    #colunas (doc_ids, term_freqs)
+    int_size, int_pos = vbyte_decode(bytes_postings, 0)
+    lst_doc_ids = Bitmap.decode(bytes_postings[int_pos:int_pos+int_size]).doc_ids()
+    return lst_doc_ids, vbyte_decode_all(bytes_postings, int_pos+int_size)
+
+
+class BitmapWriter:
+    #desvia para o arquivo de bitmaps as ocorrências (ordenadas) dos termos com df >= threshold.
+    #Somente as ocorrências de um termo ficam em memória de cada vez
+    def __init__(self, bitmap_file):
+        self.bitmap_file = bitmap_file
+        self.arr_term_id = array('I')
+        self.arr_term_start = array('Q')
+        self.int_pos = 0
+        #term_id -> (quantidade de documentos, maior term_freq, soma dos term_freqs)
+        self.dic_term_stats = {}
+        self.term_id = None
+        self.lst_doc_ids = []
+        self.lst_term_freqs = []
+
+    def filter(self, it_occurrences, is_bitmap_term):
+        #gera as ocorrências (term_id, doc_id, term_freq) dos demais termos
+        last_term_id = None
+        bol_bitmap = False
+        for occurrence in it_occurrences:
+            if occurrence[0] != last_term_id:
+                last_term_id = occurrence[0]
+                bol_bitmap = is_bitmap_term(last_term_id)
+            if bol_bitmap:
+                self.write(*occurrence)
+            else:
+                yield occurrence
+        self.flush()
+
+    def write(self, term_id:int, doc_id:int, term_freq:int):
+        if term_id != self.term_id:
+            self.flush()
+            self.term_id = term_id
+        self.lst_doc_ids.append(doc_id)
+        self.lst_term_freqs.append(term_freq)
+
+    def flush(self):
+        if self.term_id is None:
+            return
+        bytes_postings = encode_bitmap_postings(self.lst_doc_ids, self.lst_term_freqs)
+        self.arr_term_id.append(self.term_id)
+        self.arr_term_start.append(self.int_pos)
+        self.bitmap_file.write(bytes_postings)
+        self.int_pos += len(bytes_postings)
+        self.dic_term_stats[self.term_id] = (len(self.lst_doc_ids), max(self.lst_term_freqs), sum(self.lst_term_freqs))
+        self.term_id = None
+        self.lst_doc_ids = []
+        self.lst_term_freqs = []
+
+    def index_bytes(self) -> bytes:
+        return term_offsets_to_bytes(self.arr_term_id, self.arr_term_start, self.int_pos)
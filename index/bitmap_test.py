@@ -0,0 +1,69 @@
+from index.bitmap import *
+from index.structure import FileIndex, HashIndex
+import unittest
+import tempfile
+import os
+
+class BitmapTest(unittest.TestCase):
+    def test_operations(self):
+        #doc_ids em vários containers (de 2^16 documentos)
+        set_a = set(range(0, 200000, 3))
+        set_b = set(range(0, 200000, 5))|{70000, 70001}
+        bitmap_a, bitmap_b = Bitmap.from_doc_ids(set_a), Bitmap.from_doc_ids(set_b)
+        self.assertListEqual((bitmap_a & bitmap_b).doc_ids(), sorted(set_a & set_b))
+        self.assertListEqual((bitmap_a | bitmap_b).doc_ids(), sorted(set_a | set_b))
+        self.assertListEqual((bitmap_a - bitmap_b).doc_ids(), sorted(set_a - set_b))
+        self.assertEqual(len(bitmap_b), len(set_b))
+        self.assertTrue(70001 in bitmap_b)
+        self.assertFalse(70002 in bitmap_b)
+
+    def test_encode(self):
+        #containers densos (bitmap de 8 KB) e esparsos (lista de 16 bits)
+        lst_doc_ids = list(range(0, 65536, 2))+[65536*3+7, 65536*3+9, 10**7]
+        bytes_bitmap = Bitmap.from_doc_ids(lst_doc_ids).encode()
+        self.assertLess(len(bytes_bitmap), CONTAINER_BYTES+20)
+        self.assertListEqual(Bitmap.decode(bytes_bitmap).doc_ids(), lst_doc_ids)
+
+        lst_term_freqs = [(doc_id%7)+1 for doc_id in lst_doc_ids]
+        bytes_postings = encode_bitmap_postings(lst_doc_ids, lst_term_freqs)
+        self.assertListEqual(decode_bitmap(bytes_postings).doc_ids(), lst_doc_ids)
+        self.assertEqual(decode_bitmap_postings(bytes_postings), (lst_doc_ids, lst_term_freqs))
+
+class BitmapFileIndexTest(unittest.TestCase):
+    def test_bitmap_terms(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            for compressed in [False, True]:
+                expected_index = HashIndex()
+                obj_index = FileIndex(spimi=True, compressed=compressed, bitmap_threshold=100,
+                                      file_prefix=os.path.join(str_dir,f"occur_index_{compressed}"))
+                obj_index.TMP_OCCURRENCES_LIMIT = 300
+                for index in [expected_index, obj_index]:
+                    for doc_id in range(1,1001):
+                        index.index("casa", doc_id, (doc_id%3)+1)
+                        if doc_id % 7 == 0:
+                            index.index("verde", doc_id, 2)
+                        if doc_id % 100 == 0:
+                            index.index("raro", doc_id, 1)
+                    index.finish_indexing()
+
+                self.assertTrue(obj_index.has_bitmap("casa"))
+                self.assertTrue(obj_index.has_bitmap("verde"))
+                self.assertFalse(obj_index.has_bitmap("raro"), "Termos com df abaixo do limite continuam como lista")
+                self.assertListEqual(obj_index.get_bitmap("verde").doc_ids(), list(range(7,1001,7)))
+                self.assertEqual(obj_index.get_posting_view("casa").nbytes, 0, "O termo em bitmap não deve ocupar o arquivo de indice")
+
+                reopened_index = FileIndex.open(obj_index.save())
+                for index in [obj_index, reopened_index]:
+                    for term in ["casa","verde","raro","xuxu"]:
+                        self.assertListEqual([(occ.doc_id, occ.term_freq) for occ in index.get_occurrence_list(term)],
+                                             [(occ.doc_id, occ.term_freq) for occ in expected_index.get_occurrence_list(term)])
+                        self.assertListEqual(list(index.get_posting_cursor(term)), list(expected_index.get_posting_cursor(term)))
+                        self.assertEqual(index.document_count_with_term(term), expected_index.document_count_with_term(term))
+                        self.assertEqual(index.max_term_freq(term), expected_index.max_term_freq(term))
+                        self.assertEqual(index.collection_frequency(term), expected_index.collection_frequency(term))
+                reopened_index.close()
+                obj_index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from threading import Lock
+import sys
+
+
+class ByteBudgetCache:
+    #cache LRU limitado pela soma do tamanho (em bytes) dos valores e não pela quantidade
+    #de entradas: uma lista de ocorrências grande ocupa o espaço de muitas pequenas.
+    #Todas as operações são protegidas por um lock, então o cache pode ser compartilhado
+    #entre threads de consulta
+    def __init__(self, max_bytes:int):
+        self.max_bytes = max_bytes
+        self.dic_entries = OrderedDict()
+        self.lock = Lock()
+        self.int_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.dic_entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.dic_entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, int_bytes:int):
+        #valores maiores que o orçamento inteiro não são armazenados
+        if int_bytes > self.max_bytes:
+            return
+        with self.lock:
+            old_entry = self.dic_entries.pop(key, None)
+            if old_entry is not None:
+                self.int_bytes -= old_entry[1]
+            self.dic_entries[key] = (value, int_bytes)
+            self.int_bytes += int_bytes
+            #remove os menos usados recentemente até caber no orçamento
+            while self.int_bytes > self.max_bytes:
+                _, (_, int_evicted_bytes) = self.dic_entries.popitem(last=False)
+                self.int_bytes -= int_evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        #invalida as entradas (as métricas de acerto são mantidas)
+        with self.lock:
+            self.dic_entries.clear()
+            self.int_bytes = 0
+
+    def __contains__(self, key) -> bool:
+        with self.lock:
+            return key in self.dic_entries
+
+    def __len__(self) -> int:
+        return len(self.dic_entries)
+
+    @property
+    def cache_info(self) -> dict:
+        with self.lock:
+            int_requests = self.hits+self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "hit_ratio": self.hits/int_requests if int_requests > 0 else 0.0,
+                    "entries": len(self.dic_entries), "bytes": self.int_bytes, "max_bytes": self.max_bytes}
+
+
+def result_size(lst_result) -> int:
+    #tamanho aproximado de uma lista de resultados (doc_ids ou tuplas (doc_id, score))
+    int_bytes = sys.getsizeof(lst_result)
+    for item in lst_result:
+        int_bytes += sys.getsizeof(item)
+        if isinstance(item, tuple):
+            int_bytes += sum(sys.getsizeof(value) for value in item)
+    return int_bytes
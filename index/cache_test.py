@@ -0,0 +1,58 @@
+from .cache import ByteBudgetCache
+from concurrent.futures import ThreadPoolExecutor
+import unittest
+
+
+class ByteBudgetCacheTest(unittest.TestCase):
+    def test_eviction(self):
+        cache = ByteBudgetCache(100)
+        cache.put("casa", [1,2,3], 40)
+        cache.put("verde", [4], 40)
+        self.assertEqual(cache.get("casa"), [1,2,3])
+
+        #"verde" é o menos usado recentemente: deve ser removido para caber "vermelho"
+        cache.put("vermelho", [5,6], 40)
+        self.assertNotIn("verde", cache, "A entrada menos usada recentemente deveria ter sido removida")
+        self.assertIn("casa", cache)
+        self.assertIn("vermelho", cache)
+        self.assertLessEqual(cache.cache_info["bytes"], 100, "O cache não pode ultrapassar o limite de bytes")
+
+        #valores maiores que o limite não são armazenados
+        cache.put("predio", list(range(100)), 101)
+        self.assertNotIn("predio", cache)
+
+        #substituir uma entrada atualiza o tamanho ocupado
+        cache.put("casa", [1], 10)
+        self.assertEqual(cache.cache_info["bytes"], 50)
+
+    def test_cache_info(self):
+        cache = ByteBudgetCache(100)
+        cache.put("casa", [1], 60)
+        cache.get("casa")
+        cache.get("verde")
+        cache.put("verde", [2], 60)
+        dic_info = cache.cache_info
+        self.assertEqual((dic_info["hits"], dic_info["misses"], dic_info["evictions"]), (1,1,1))
+        self.assertAlmostEqual(dic_info["hit_ratio"], 0.5)
+        self.assertEqual((dic_info["entries"], dic_info["bytes"]), (1,60))
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.cache_info["bytes"]), (0,0), "O cache deveria estar vazio após o clear")
+
+    def test_threads(self):
+        cache = ByteBudgetCache(1000)
+        def use_cache(i):
+            for j in range(500):
+                key = (i+j)%50
+                if cache.get(key) is None:
+                    cache.put(key, key, 30)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(use_cache, range(8)))
+        dic_info = cache.cache_info
+        self.assertEqual(dic_info["hits"]+dic_info["misses"], 8*500)
+        self.assertEqual(dic_info["bytes"], 30*dic_info["entries"], "O tamanho do cache ficou inconsistente")
+        self.assertLessEqual(dic_info["bytes"], 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,284 @@
+from typing import List
+from array import array
+import struct
+import sys
+
+BYTE_SIZE = 4
+
+#cada ocorrência é gravada como 3 inteiros de 4 bytes big-endian: doc_id, term_id, term_freq
+OCCURRENCE_RECORD = struct.Struct(">III")
+RECORD_SIZE = OCCURRENCE_RECORD.size
+
+#quantidade de registros lidos/escritos por chamada de read()/write()
+BLOCK_RECORDS = 8192
+
+
+def array_from_bytes(type_code:str, bytes_data) -> array:
+    #arrays são gravados em little-endian, independente da plataforma
+    arr = array(type_code)
+    arr.frombytes(bytes_data)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+def array_to_bytes(arr:array) -> bytes:
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+class OccurrenceWriter:
+    #escreve ocorrências em blocos: os registros são empacotados em um bytearray
+    #e o arquivo só recebe um write() a cada BLOCK_RECORDS ocorrências
+    def __init__(self, idx_file, block_records:int=BLOCK_RECORDS):
+        self.idx_file = idx_file
+        self.block = bytearray(RECORD_SIZE*block_records)
+        self.block_pos = 0
+        self.record_count = 0
+
+    def write(self, term_id:int, doc_id:int, term_freq:int):
+        OCCURRENCE_RECORD.pack_into(self.block, self.block_pos, doc_id, term_id, term_freq)
+        self.block_pos += RECORD_SIZE
+        self.record_count += 1
+        if self.block_pos == len(self.block):
+            self.flush()
+
+    def write_all(self, it_occurrences):
+        #it_occurrences: tuplas (term_id, doc_id, term_freq)
+        for term_id, doc_id, term_freq in it_occurrences:
+            self.write(term_id, doc_id, term_freq)
+
+    def flush(self):
+        if self.block_pos > 0:
+            self.idx_file.write(memoryview(self.block)[:self.block_pos])
+            self.block_pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+
+def decode_occurrences(bytes_block):
+    #decodifica um bloco de registros completos em tuplas (term_id, doc_id, term_freq)
+    for doc_id, term_id, term_freq in OCCURRENCE_RECORD.iter_unpack(bytes_block):
+        yield (term_id, doc_id, term_freq)
+
+
+def read_occurrences(idx_file, max_records:int=None, block_records:int=BLOCK_RECORDS):
+    #lê o arquivo a partir da posição atual em blocos de block_records registros
+    #(no máximo max_records registros, se definido)
+    int_remaining = max_records
+    while int_remaining is None or int_remaining > 0:
+        int_records = block_records if int_remaining is None else min(block_records, int_remaining)
+        bytes_block = idx_file.read(RECORD_SIZE*int_records)
+        #descarta um eventual registro incompleto no final do arquivo
+        bytes_block = bytes_block[:len(bytes_block)-len(bytes_block)%RECORD_SIZE]
+        if not bytes_block:
+            return
+        if int_remaining is not None:
+            int_remaining -= len(bytes_block)//RECORD_SIZE
+        yield from decode_occurrences(bytes_block)
+
+
+#formato comprimido: as ocorrências de um termo são gravadas em blocos de até
+#POSTING_BLOCK_SIZE documentos, sem o term_id, com os doc_ids como diferenças (gaps)
+#em relação ao doc_id anterior e todos os valores codificados em VByte.
+#Cabeçalho de cada bloco: quantidade de documentos, gap do último doc_id do bloco
+#em relação ao último doc_id do bloco anterior e tamanho (em bytes) do bloco.
+#O cabeçalho permite pular blocos inteiros sem decodificá-los
+POSTING_BLOCK_SIZE = 128
+
+
+def vbyte_encode(int_value:int, bytes_out:bytearray):
+    #7 bits por byte, do menos para o mais significativo; o bit mais alto marca o último byte
+    while int_value >= 128:
+        bytes_out.append(int_value & 0x7F)
+        int_value >>= 7
+    bytes_out.append(int_value | 0x80)
+
+
+def vbyte_decode(bytes_in, int_pos:int):
+    #retorna o valor e a posição logo após ele
+    int_value = 0
+    int_shift = 0
+    while True:
+        int_byte = bytes_in[int_pos]
+        int_pos += 1
+        if int_byte & 0x80:
+            return int_value | ((int_byte & 0x7F) << int_shift), int_pos
+        int_value |= int_byte << int_shift
+        int_shift += 7
+
+
+def vbyte_decode_all(bytes_in, int_start:int=0, int_end:int=None):
+    #decodifica todos os valores de bytes_in[int_start:int_end]
+    lst_values = []
+    int_value = 0
+    int_shift = 0
+    for int_byte in bytes_in[int_start:int_end]:
+        if int_byte & 0x80:
+            lst_values.append(int_value | ((int_byte & 0x7F) << int_shift))
+            int_value = 0
+            int_shift = 0
+        else:
+            int_value |= int_byte << int_shift
+            int_shift += 7
+    return lst_values
+
+
+def encode_postings(lst_doc_ids, lst_term_freqs, block_size:int=POSTING_BLOCK_SIZE) -> bytearray:
+    #lst_doc_ids deve estar em ordem crescente
+    bytes_out = bytearray()
+    int_last_doc_id = 0
+    for int_block_start in range(0, len(lst_doc_ids), block_size):
+        arr_block_docs = lst_doc_ids[int_block_start:int_block_start+block_size]
+        arr_block_freqs = lst_term_freqs[int_block_start:int_block_start+block_size]
+
+        bytes_payload = bytearray()
+        int_prev_doc_id = int_last_doc_id
+        for doc_id, term_freq in zip(arr_block_docs, arr_block_freqs):
+            vbyte_encode(doc_id-int_prev_doc_id, bytes_payload)
+            vbyte_encode(term_freq, bytes_payload)
+            int_prev_doc_id = doc_id
+
+        vbyte_encode(len(arr_block_docs), bytes_out)
+        vbyte_encode(int_prev_doc_id-int_last_doc_id, bytes_out)
+        vbyte_encode(len(bytes_payload), bytes_out)
+        bytes_out += bytes_payload
+        int_last_doc_id = int_prev_doc_id
+    return bytes_out
+
+
+def iter_posting_blocks(bytes_postings):
+    #percorre somente os cabeçalhos dos blocos, gerando tuplas
+    #(qtd. de documentos, doc_id base, último doc_id, inicio do payload, fim do payload)
+    int_pos = 0
+    int_last_doc_id = 0
+    int_size = len(bytes_postings)
+    while int_pos < int_size:
+        int_count, int_pos = vbyte_decode(bytes_postings, int_pos)
+        int_last_gap, int_pos = vbyte_decode(bytes_postings, int_pos)
+        int_payload_size, int_pos = vbyte_decode(bytes_postings, int_pos)
+        yield int_count, int_last_doc_id, int_last_doc_id+int_last_gap, int_pos, int_pos+int_payload_size
+        int_last_doc_id += int_last_gap
+        int_pos += int_payload_size
+
+
+def decode_posting_block(bytes_postings, int_start:int, int_end:int, int_doc_id_base:int):
+    #decodifica um bloco inteiro, retornando as colunas (doc_ids, term_freqs)
+    lst_values = vbyte_decode_all(bytes_postings, int_start, int_end)
+    lst_doc_ids = lst_values[0::2]
+    int_doc_id = int_doc_id_base
+    for i, int_gap in enumerate(lst_doc_ids):
+        int_doc_id += int_gap
+        lst_doc_ids[i] = int_doc_id
+    return lst_doc_ids, lst_values[1::2]
+
+
+def decode_postings(bytes_postings):
+    #gera tuplas (doc_id, term_freq) de todos os blocos
+    for int_count, int_doc_id_base, int_last_doc_id, int_start, int_end in iter_posting_blocks(bytes_postings):
+        lst_doc_ids, lst_term_freqs = decode_posting_block(bytes_postings, int_start, int_end, int_doc_id_base)
+        yield from zip(lst_doc_ids, lst_term_freqs)
+
+
+#posições (modo posicional): as posições de um termo em um documento são gravadas
+#como quantidade seguida das diferenças entre posições consecutivas, em VByte.
+#No arquivo de posições (.pos), os documentos de cada termo ficam na ordem da lista
+#de ocorrências, cada um precedido pelo gap do doc_id e pelo tamanho (em bytes) das
+#suas posições, para que os documentos que não interessam sejam pulados sem decodificá-las
+
+def encode_positions(lst_positions) -> bytes:
+    #lst_positions deve estar em ordem crescente
+    bytes_out = bytearray()
+    vbyte_encode(len(lst_positions), bytes_out)
+    int_prev_position = 0
+    for int_position in lst_positions:
+        vbyte_encode(int_position-int_prev_position, bytes_out)
+        int_prev_position = int_position
+    return bytes(bytes_out)
+
+
+def decode_positions(bytes_positions, int_start:int=0, int_end:int=None) -> List[int]:
+    lst_positions = vbyte_decode_all(bytes_positions, int_start, int_end)[1:]
+    for i in range(1, len(lst_positions)):
+        lst_positions[i] += lst_positions[i-1]
+    return lst_positions
+
+
+class PositionsWriter:
+    #grava as posições já codificadas (encode_positions) de cada (termo, documento),
+    #em ordem de term_id e doc_id, guardando onde começa cada termo no arquivo
+    def __init__(self, pos_file):
+        self.pos_file = pos_file
+        self.arr_term_id = array('I')
+        self.arr_term_start = array('Q')
+        self.int_pos = 0
+        self.int_last_doc_id = 0
+
+    def write(self, term_id:int, doc_id:int, bytes_positions:bytes):
+        if len(self.arr_term_id) == 0 or self.arr_term_id[-1] != term_id:
+            self.arr_term_id.append(term_id)
+            self.arr_term_start.append(self.int_pos)
+            self.int_last_doc_id = 0
+        bytes_header = bytearray()
+        vbyte_encode(doc_id-self.int_last_doc_id, bytes_header)
+        vbyte_encode(len(bytes_positions), bytes_header)
+        self.pos_file.write(bytes_header)
+        self.pos_file.write(bytes_positions)
+        self.int_pos += len(bytes_header)+len(bytes_positions)
+        self.int_last_doc_id = doc_id
+
+    def index_bytes(self) -> bytes:
+        return term_offsets_to_bytes(self.arr_term_id, self.arr_term_start, self.int_pos)
+
+
+def term_offsets_to_bytes(arr_term_id:array, arr_term_start:array, int_end:int) -> bytes:
+    #tabela term_id -> início de um arquivo auxiliar (posições, bitmaps): quantidade de termos,
+    #term_ids (ordenados) e inícios, mais o fim do arquivo
+    return struct.pack("<Q", len(arr_term_id))+array_to_bytes(arr_term_id)+\
+                array_to_bytes(arr_term_start)+struct.pack("<Q", int_end)
+
+
+def load_term_offsets(bytes_index):
+    #inverso de term_offsets_to_bytes: (term_ids, inícios), com len(inícios) == len(term_ids)+1
+    int_terms = struct.unpack_from("<Q", bytes_index)[0]
+    int_start = 8+4*int_terms
+    return array_from_bytes('I', bytes_index[8:int_start]), \
+                array_from_bytes('Q', bytes_index[int_start:int_start+8*(int_terms+1)])
+
+
+def write_positions_run(pos_file, it_positions):
+    #run de posições do SPIMI: as posições de cada ocorrência do run, na mesma ordem,
+    #precedidas do tamanho em bytes
+    bytes_out = bytearray()
+    for bytes_positions in it_positions:
+        vbyte_encode(len(bytes_positions), bytes_out)
+        bytes_out += bytes_positions
+        if len(bytes_out) >= 1 << 16:
+            pos_file.write(bytes_out)
+            bytes_out = bytearray()
+    pos_file.write(bytes_out)
+
+
+def read_positions_run(pos_file, block_size:int=1 << 16):
+    #lê o run a partir da posição atual em blocos de block_size bytes: durante a
+    #intercalação fica em memória apenas o bloco atual de cada run
+    bytes_buffer = b""
+    int_pos = 0
+    for bytes_block in iter(lambda: pos_file.read(block_size), b""):
+        bytes_buffer = bytes_buffer[int_pos:]+bytes_block
+        int_pos = 0
+        while int_pos < len(bytes_buffer):
+            try:
+                int_len, int_start = vbyte_decode(bytes_buffer, int_pos)
+            except IndexError:
+                #tamanho incompleto no final do bloco
+                break
+            if int_start+int_len > len(bytes_buffer):
+                break
+            yield bytes_buffer[int_start:int_start+int_len]
+            int_pos = int_start+int_len
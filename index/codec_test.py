@@ -0,0 +1,76 @@
+from index.codec import *
+import io
+import unittest
+
+class OccurrenceCodecTest(unittest.TestCase):
+    def test_write_read_blocks(self):
+        lst_occurrences = [(term_id, doc_id, (doc_id%7)+1) for term_id in range(1,6) for doc_id in range(1,10)]
+        file = io.BytesIO()
+        #bloco pequeno para forçar várias escritas/leituras parciais
+        with OccurrenceWriter(file, block_records=4) as writer:
+            writer.write_all(lst_occurrences)
+        self.assertEqual(len(file.getvalue()), len(lst_occurrences)*RECORD_SIZE)
+        self.assertEqual(writer.record_count, len(lst_occurrences))
+
+        file.seek(0)
+        self.assertListEqual(list(read_occurrences(file, block_records=5)), lst_occurrences)
+
+        #leitura de uma faixa de registros a partir de uma posição do arquivo
+        file.seek(RECORD_SIZE*9)
+        self.assertListEqual(list(read_occurrences(file, max_records=9, block_records=4)), lst_occurrences[9:18])
+
+    def test_same_layout_as_term_occurrence(self):
+        #o formato em disco continua sendo doc_id, term_id, term_freq em big-endian
+        file = io.BytesIO()
+        with OccurrenceWriter(file) as writer:
+            writer.write(2, 1, 3)
+        self.assertEqual(file.getvalue(), (1).to_bytes(BYTE_SIZE,"big")+(2).to_bytes(BYTE_SIZE,"big")+(3).to_bytes(BYTE_SIZE,"big"))
+class VBytePostingsTest(unittest.TestCase):
+    def test_vbyte(self):
+        lst_values = [0, 1, 127, 128, 300, 16383, 16384, 2**32-1]
+        bytes_out = bytearray()
+        [vbyte_encode(int_value, bytes_out) for int_value in lst_values]
+        self.assertListEqual(vbyte_decode_all(bytes_out), lst_values)
+        self.assertEqual(vbyte_decode(bytes_out, 0), (0, 1))
+
+    def test_postings_blocks(self):
+        lst_doc_ids = list(range(3, 3000, 7))
+        lst_term_freqs = [(doc_id%5)+1 for doc_id in lst_doc_ids]
+        bytes_postings = encode_postings(lst_doc_ids, lst_term_freqs, block_size=64)
+        self.assertLess(len(bytes_postings), len(lst_doc_ids)*RECORD_SIZE/3)
+        self.assertListEqual(list(decode_postings(bytes_postings)), list(zip(lst_doc_ids, lst_term_freqs)))
+
+        #os cabeçalhos permitem saber o intervalo de doc_ids de cada bloco sem decodificá-lo
+        lst_blocks = list(iter_posting_blocks(bytes_postings))
+        self.assertEqual(sum(block[0] for block in lst_blocks), len(lst_doc_ids))
+        self.assertListEqual([block[2] for block in lst_blocks], lst_doc_ids[63::64]+[lst_doc_ids[-1]])
+
+    def test_positions(self):
+        from index.cursor import PositionsReader
+        self.assertListEqual(decode_positions(encode_positions([0, 3, 4, 200])), [0, 3, 4, 200])
+        file = io.BytesIO()
+        writer = PositionsWriter(file)
+        writer.write(1, 5, encode_positions([2, 9]))
+        writer.write(1, 8, encode_positions([1]))
+        writer.write(4, 2, encode_positions([7, 8, 300]))
+        arr_term_ids, arr_starts = load_term_offsets(writer.index_bytes())
+        self.assertListEqual(list(arr_term_ids), [1, 4])
+        self.assertEqual(arr_starts[-1], len(file.getvalue()))
+
+        #os documentos devem ser consultados em ordem crescente; os que não têm o termo retornam []
+        reader = PositionsReader(file.getvalue()[arr_starts[0]:arr_starts[1]])
+        self.assertListEqual(reader.positions(3), [])
+        self.assertListEqual(reader.positions(5), [2, 9])
+        self.assertListEqual(reader.positions(8), [1])
+        self.assertListEqual(reader.positions(9), [])
+
+        #run de posições lido em blocos menores que as entradas
+        lst_positions = [encode_positions(list(range(0, int_size*3, 3))) for int_size in [1, 50, 0, 200, 7]]
+        file = io.BytesIO()
+        write_positions_run(file, lst_positions)
+        file.seek(0)
+        self.assertListEqual(list(read_positions_run(file, block_size=5)), lst_positions)
+
+
+if __name__ == "__main__":
+    unittest.main()
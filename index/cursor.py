@@ -0,0 +1,170 @@
+from typing import List
+from bisect import bisect_left
+import struct
+
+from .codec import RECORD_SIZE, iter_posting_blocks, decode_posting_block, vbyte_decode, decode_positions
+
+_UINT = struct.Struct(">I")
+
+
+class PostingCursor:
+    #cursor sobre uma lista de ocorrências ordenada por doc_id. doc_id é o documento
+    #atual (None quando a lista termina); advance(alvo) posiciona o cursor no primeiro
+    #documento >= alvo, podendo pular ocorrências sem lê-las
+    def __init__(self, int_size:int):
+        self.int_size = int_size
+        self.doc_id = None
+
+    def __len__(self) -> int:
+        return self.int_size
+
+    def next(self) -> int:
+        raise NotImplementedError("Voce deve criar uma subclasse e a mesma deve sobrepor este método")
+
+    def advance(self, target:int) -> int:
+        raise NotImplementedError("Voce deve criar uma subclasse e a mesma deve sobrepor este método")
+
+    def term_freq(self) -> int:
+        raise NotImplementedError("Voce deve criar uma subclasse e a mesma deve sobrepor este método")
+
+    def __iter__(self):
+        #itera (doc_id, term_freq) a partir da posição atual
+        while self.doc_id is not None:
+            yield self.doc_id, self.term_freq()
+            self.next()
+
+    def doc_ids(self):
+        #itera apenas os doc_ids a partir da posição atual
+        while self.doc_id is not None:
+            yield self.doc_id
+            self.next()
+
+
+class RecordColumn:
+    #sequência somente leitura de uma coluna dos registros de 12 bytes (ex.: os doc_ids)
+    #de uma view do arquivo de indice, sem decodificar os demais registros
+    def __init__(self, view, int_field_offset:int):
+        self.view = view
+        self.int_field_offset = int_field_offset
+        self.int_size = len(view)//RECORD_SIZE
+
+    def __len__(self) -> int:
+        return self.int_size
+
+    def __getitem__(self, i:int) -> int:
+        if i < 0 or i >= self.int_size:
+            raise IndexError(i)
+        return _UINT.unpack_from(self.view, i*RECORD_SIZE+self.int_field_offset)[0]
+
+
+class ArrayCursor(PostingCursor):
+    #cursor sobre sequências com acesso aleatório (listas, arrays ou RecordColumn).
+    #advance usa busca exponencial (galloping) seguida de busca binária: o custo é
+    #proporcional ao log da distância pulada e não ao tamanho da lista
+    def __init__(self, seq_doc_ids, seq_term_freqs=None):
+        super().__init__(len(seq_doc_ids))
+        self.seq_doc_ids = seq_doc_ids
+        self.seq_term_freqs = seq_term_freqs
+        self.pos = 0
+        self.doc_id = seq_doc_ids[0] if self.int_size > 0 else None
+
+    def next(self) -> int:
+        self.pos += 1
+        self.doc_id = self.seq_doc_ids[self.pos] if self.pos < self.int_size else None
+        return self.doc_id
+
+    def advance(self, target:int) -> int:
+        if self.doc_id is None or self.doc_id >= target:
+            return self.doc_id
+        int_low = self.pos
+        int_step = 1
+        int_high = self.pos+1
+        while int_high < self.int_size and self.seq_doc_ids[int_high] < target:
+            int_low = int_high
+            int_step *= 2
+            int_high = self.pos+int_step
+        self.pos = bisect_left(self.seq_doc_ids, target, int_low+1, min(int_high, self.int_size))
+        self.doc_id = self.seq_doc_ids[self.pos] if self.pos < self.int_size else None
+        return self.doc_id
+
+    def term_freq(self) -> int:
+        return self.seq_term_freqs[self.pos]
+
+
+class BlockCursor(PostingCursor):
+    #cursor sobre o formato comprimido (codec.encode_postings): advance pula os blocos
+    #cujo último doc_id é menor que o alvo lendo apenas os cabeçalhos
+    def __init__(self, bytes_postings, int_size:int):
+        super().__init__(int_size)
+        self.bytes_postings = bytes_postings
+        self.it_blocks = iter_posting_blocks(bytes_postings)
+        self.lst_doc_ids = []
+        self.lst_term_freqs = []
+        self.pos = 0
+        self.load_block()
+
+    def load_block(self, target:int=None):
+        for int_count, int_doc_id_base, int_last_doc_id, int_start, int_end in self.it_blocks:
+            if target is not None and int_last_doc_id < target:
+                continue
+            self.lst_doc_ids, self.lst_term_freqs = decode_posting_block(self.bytes_postings, int_start, int_end, int_doc_id_base)
+            self.pos = 0
+            self.doc_id = self.lst_doc_ids[0]
+            return
+        self.lst_doc_ids = []
+        self.doc_id = None
+
+    def next(self) -> int:
+        self.pos += 1
+        if self.pos < len(self.lst_doc_ids):
+            self.doc_id = self.lst_doc_ids[self.pos]
+        else:
+            self.load_block()
+        return self.doc_id
+
+    def advance(self, target:int) -> int:
+        if self.doc_id is None or self.doc_id >= target:
+            return self.doc_id
+        if self.lst_doc_ids[-1] < target:
+            self.load_block(target)
+            if self.doc_id is None or self.doc_id >= target:
+                return self.doc_id
+        self.pos = bisect_left(self.lst_doc_ids, target, self.pos)
+        self.doc_id = self.lst_doc_ids[self.pos]
+        return self.doc_id
+
+    def term_freq(self) -> int:
+        return self.lst_term_freqs[self.pos]
+
+
+class PositionsReader:
+    #posições de um termo no arquivo de posições (ver codec.PositionsWriter).
+    #positions(doc_id) deve ser chamado com doc_ids crescentes: os documentos anteriores
+    #são pulados lendo apenas o gap e o tamanho, sem decodificar as suas posições
+    def __init__(self, bytes_positions):
+        self.bytes_positions = bytes_positions
+        self.int_size = len(bytes_positions)
+        self.int_pos = 0
+        self.doc_id = 0
+
+    def positions(self, doc_id:int) -> List[int]:
+        while self.int_pos < self.int_size:
+            int_gap, int_pos = vbyte_decode(self.bytes_positions, self.int_pos)
+            int_len, int_pos = vbyte_decode(self.bytes_positions, int_pos)
+            if self.doc_id+int_gap > doc_id:
+                #documento sem o termo: o cabeçalho é lido novamente na próxima chamada
+                return []
+            self.doc_id += int_gap
+            self.int_pos = int_pos+int_len
+            if self.doc_id == doc_id:
+                return decode_positions(self.bytes_positions, int_pos, int_pos+int_len)
+        return []
+
+
+class MappingPositionsReader:
+    #posições mantidas em memória (HashIndex): doc_id -> posições
+    def __init__(self, dic_positions):
+        self.dic_positions = dic_positions
+
+    def positions(self, doc_id:int) -> List[int]:
+        return list(self.dic_positions.get(doc_id, ()))
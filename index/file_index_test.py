@@ -1,5 +1,8 @@
 from .structure import *
+from .metrics import Metrics
 import unittest
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from .index_structure_test import StructureTest
 from .performance_test import PerformanceTest
 
@@ -111,6 +114,259 @@ class FileIndexTest(unittest.TestCase):
 
 
 
+    def test_spimi_runs(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            self.index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir,"occur_index"))
+            lst_runs = [[TermOccurrence(2,4,5), TermOccurrence(1,2,1)],
+                        [TermOccurrence(1,3,3), TermOccurrence(2,3,4)],
+                        [TermOccurrence(2,1,2), TermOccurrence(3,2,2), TermOccurrence(1,1,3)]]
+            set_occurrences = set()
+            for i,lst_run in enumerate(lst_runs):
+                self.index.lst_occurrences_tmp = lst_run
+                set_occurrences = set_occurrences | set(lst_run)
+                self.index.save_tmp_occurrences()
+                self.assertEqual(len(self.index.lst_run_file_names),i+1,"Cada chamada a save_tmp_occurrences deve gerar um novo run")
+
+            lst_run_files = list(self.index.lst_run_file_names)
+            self.index.dic_index = {"casa":TermFilePosition(1),
+                                    "verde":TermFilePosition(2),
+                                    "prédio":TermFilePosition(3),
+                                    "amarelo":TermFilePosition(4)}
+            self.index.finish_indexing()
+            self.check_idx_file(self.index, set_occurrences)
+            [self.assertFalse(os.path.exists(str_run),f"O run {str_run} deveria ser removido após a intercalação") for str_run in lst_run_files]
+
+            self.assertEqual(self.index.dic_index["verde"].doc_count_with_term,2)
+            self.assertListEqual([occ.doc_id for occ in self.index.get_occurrence_list("verde")],[1,3])
+
+    def test_mmap_lookup(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            self.index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir,"occur_index"))
+            for doc_id in range(1,51):
+                self.index.index("casa", doc_id, 1)
+                if doc_id % 5 == 0:
+                    self.index.index("verde", doc_id, doc_id)
+            self.index.finish_indexing()
+
+            view = self.index.get_posting_view("verde")
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(len(view), 10*RECORD_SIZE, "A view deve conter apenas os registros do termo")
+            view.release()
+
+            lst_expected = [(doc_id, doc_id) for doc_id in range(5,51,5)]
+            #várias threads consultando o mesmo mmap
+            with ThreadPoolExecutor(4) as executor:
+                lst_results = list(executor.map(lambda term: [(occ.doc_id, occ.term_freq) for occ in self.index.get_occurrence_list(term)], ["verde"]*8))
+            [self.assertListEqual(lst_result, lst_expected) for lst_result in lst_results]
+            self.assertEqual(len(list(self.index.iter_occurrences("casa"))), 50)
+            self.assertListEqual(self.index.get_occurrence_list("xuxu"), [])
+            self.index.close()
+
+    def test_posting_cache(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            for compressed in [False, True]:
+                obj_index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir,f"occur_index_{compressed}"), compressed=compressed,
+                                      cache_bytes=4096, query_cache_bytes=4096)
+                for doc_id in range(1,51):
+                    obj_index.index("casa", doc_id, 1)
+                    if doc_id % 5 == 0:
+                        obj_index.index("verde", doc_id, doc_id)
+                obj_index.finish_indexing()
+
+                lst_expected = [(doc_id, doc_id) for doc_id in range(5,51,5)]
+                for _ in range(3):
+                    self.assertListEqual([(occ.doc_id, occ.term_freq) for occ in obj_index.get_occurrence_list("verde")], lst_expected)
+                self.assertListEqual(list(obj_index.get_posting_cursor("verde")), lst_expected)
+                dic_info = obj_index.cache_info["postings"]
+                self.assertEqual((dic_info["hits"], dic_info["misses"]), (3,1), "A lista do termo deveria ser lida do arquivo apenas uma vez")
+                self.assertLessEqual(dic_info["bytes"], 4096)
+                self.assertListEqual(obj_index.get_occurrence_list("xuxu"), [])
+
+                #o cache é invalidado quando o indice é reaberto
+                obj_index.open_idx_file()
+                self.assertEqual(obj_index.cache_info["postings"]["entries"], 0, "O cache deveria ser invalidado ao reabrir o indice")
+                reopened_index = FileIndex.open(obj_index.save(), cache_bytes=4096)
+                self.assertListEqual(list(reopened_index.get_posting_cursor("verde")), lst_expected)
+                self.assertNotIn("queries", reopened_index.cache_info)
+                reopened_index.close()
+                obj_index.close()
+
+    def test_memory_budget(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            int_budget = 70000
+            obj_index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir,"budget"), memory_budget=int_budget)
+            obj_index.MIN_BUFFER_OCCURRENCES = 10
+            expected_index = HashIndex()
+            lst_flush_sizes = []
+            save_tmp_occurrences = obj_index.save_tmp_occurrences
+            def save_tmp_occurrences_size():
+                lst_flush_sizes.append(obj_index.memory_usage()["estimated_bytes"])
+                save_tmp_occurrences()
+            obj_index.save_tmp_occurrences = save_tmp_occurrences_size
+
+            for doc_id in range(1,301):
+                for term in ["casa","verde",f"termo{doc_id%40}",f"cor{doc_id%13}",f"raro{doc_id//10}"]:
+                    obj_index.index(term, doc_id, doc_id%7+1)
+                    expected_index.index(term, doc_id, doc_id%7+1)
+                    self.assertLessEqual(obj_index.memory_usage()["estimated_bytes"], int_budget,
+                                         "A memória estimada não pode ultrapassar o orçamento")
+            self.assertGreater(len(lst_flush_sizes), 1, "O buffer deveria ter sido gravado ao atingir o orçamento")
+            #o vocabulário cresce, então sobra cada vez menos espaço para o buffer
+            self.assertGreater(obj_index.memory_usage()["lexicon_bytes"], 85*LEXICON_ENTRY_BYTES)
+            obj_index.finish_indexing()
+
+            for term in ["casa","verde","termo3","cor5","raro7"]:
+                self.assertListEqual([(occ.doc_id, occ.term_freq) for occ in obj_index.get_occurrence_list(term)],
+                                     [(occ.doc_id, occ.term_freq) for occ in expected_index.get_occurrence_list(term)])
+            dic_usage = obj_index.memory_usage()
+            self.assertEqual(dic_usage["memory_budget"], int_budget)
+            self.assertGreater(dic_usage["peak_rss_bytes"], 0)
+            obj_index.close()
+
+    def test_memory_budget_warning(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            #sem vocabulário não há aviso, mesmo com o orçamento dividido entre os buffers pendentes
+            with self.assertNoLogs("index.structure", level="WARNING"):
+                obj_index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir,"budget"), memory_budget=4096,
+                                      flush_executor="thread")
+            with self.assertLogs("index.structure", level="WARNING") as logs:
+                for doc_id in range(1,51):
+                    obj_index.index(f"termo{doc_id}", doc_id, 1)
+            self.assertEqual(len(logs.output), 1, "O aviso deve ser emitido apenas uma vez")
+            self.assertGreater(obj_index.memory_usage()["documents_bytes"], 50*DOCUMENT_ENTRY_BYTES)
+            obj_index.close()
+
+    def test_async_flush(self):
+        self.assertRaises(ValueError, FileIndex, flush_executor="thread")
+        self.assertRaises(ValueError, FileIndex, spimi=True, flush_executor="disco")
+        with tempfile.TemporaryDirectory() as str_dir:
+            for flush_executor in ["thread", "process"]:
+                metrics = Metrics()
+                obj_index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir, flush_executor), flush_executor=flush_executor,
+                                      max_pending_flushes=2, metrics=metrics)
+                obj_index.TMP_OCCURRENCES_LIMIT = 50
+                expected_index = HashIndex()
+                for doc_id in range(1,201):
+                    for term in ["casa","verde",f"termo{doc_id%17}"]:
+                        obj_index.index(term, doc_id, doc_id%5+1)
+                        expected_index.index(term, doc_id, doc_id%5+1)
+                    self.assertLessEqual(len(obj_index.lst_pending_flushes), 2, "Não podem existir mais gravações pendentes que o limite")
+                self.assertEqual(len(obj_index.lst_run_file_names), 12)
+                obj_index.finish_indexing()
+                self.assertListEqual(obj_index.lst_pending_flushes, [], "O finish_indexing deve esperar todas as gravações")
+
+                for term in expected_index.vocabulary:
+                    self.assertListEqual([(occ.doc_id, occ.term_freq) for occ in obj_index.get_occurrence_list(term)],
+                                         [(occ.doc_id, occ.term_freq) for occ in expected_index.get_occurrence_list(term)])
+                dic_snapshot = metrics.snapshot()
+                self.assertEqual(dic_snapshot["timers"]["sort"]["calls"], 12)
+                self.assertEqual(dic_snapshot["counters"]["bytes_written"], 2*600*RECORD_SIZE, "Cada ocorrência deve ser gravada no run e no arquivo final")
+                obj_index.close()
+
+    def test_compressed_postings(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            lst_index = [FileIndex(spimi=True, file_prefix=os.path.join(str_dir,"fixed")),
+                         FileIndex(spimi=True, file_prefix=os.path.join(str_dir,"compressed"), compressed=True)]
+            for obj_index in lst_index:
+                obj_index.TMP_OCCURRENCES_LIMIT = 500
+                for doc_id in range(1,1001):
+                    obj_index.index("casa", doc_id, (doc_id%3)+1)
+                    if doc_id % 2 == 0:
+                        obj_index.index("verde", doc_id, 1)
+                obj_index.finish_indexing()
+            fixed_index, compressed_index = lst_index
+
+            self.assertLess(os.path.getsize(compressed_index.str_idx_file_name)*3, os.path.getsize(fixed_index.str_idx_file_name))
+            for term in ["casa","verde","xuxu"]:
+                self.assertListEqual(list(compressed_index.iter_occurrences(term)), list(fixed_index.iter_occurrences(term)))
+                self.assertEqual(compressed_index.dic_index.get(term) and compressed_index.dic_index[term].doc_count_with_term,
+                                 fixed_index.dic_index.get(term) and fixed_index.dic_index[term].doc_count_with_term)
+            self.assertEqual(compressed_index.dic_index["verde"].term_file_byte_len, len(compressed_index.get_posting_view("verde")))
+            [obj_index.close() for obj_index in lst_index]
+
+    def test_save_open(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            for compressed in [False, True]:
+                obj_index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir,f"occur_index_{compressed}"), compressed=compressed)
+                for term, doc_id, term_freq in [("casa",1,10),("vermelho",1,3),("verde",1,1),
+                                                ("vermelho",2,1),("vermelho",3,1),("casa",2,3)]:
+                    obj_index.index(term, doc_id, term_freq)
+                obj_index.finish_indexing()
+                str_lexicon_file = obj_index.save()
+
+                reopened_index = FileIndex.open(str_lexicon_file)
+                self.assertCountEqual(reopened_index.vocabulary, obj_index.vocabulary)
+                self.assertEqual(reopened_index.document_count, 3)
+                self.assertIsNone(reopened_index.lazy_documents, "O conjunto de documentos não deve ser criado ao abrir o indice")
+                self.assertSetEqual(reopened_index.set_documents, {1,2,3})
+                for term in ["casa","vermelho","verde","prédio"]:
+                    self.assertEqual(reopened_index.document_count_with_term(term), obj_index.document_count_with_term(term))
+                    self.assertListEqual([(occ.doc_id, occ.term_freq) for occ in reopened_index.get_occurrence_list(term)],
+                                         [(occ.doc_id, occ.term_freq) for occ in obj_index.get_occurrence_list(term)])
+                self.assertEqual(reopened_index.get_term_id("verde"), obj_index.get_term_id("verde"))
+                reopened_index.close()
+                obj_index.close()
+
+    def test_statistics(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            for compressed in [False, True]:
+                obj_index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir,f"occur_index_{compressed}"), compressed=compressed)
+                for term, doc_id, term_freq in [("casa",1,10),("vermelho",1,3),("verde",1,1),
+                                                ("vermelho",2,1),("vermelho",3,1),("casa",2,3)]:
+                    obj_index.index(term, doc_id, term_freq)
+                obj_index.finish_indexing()
+                reopened_index = FileIndex.open(obj_index.save())
+
+                for index in [obj_index, reopened_index]:
+                    self.assertListEqual([index.document_count_with_term(term) for term in ["casa","vermelho","verde","prédio"]],
+                                         [2,3,1,0], "Quantidade de documentos por termo (df) incorreta")
+                    self.assertListEqual([index.collection_frequency(term) for term in ["casa","vermelho","verde","prédio"]],
+                                         [13,5,1,0], "Frequência do termo na coleção (cf) incorreta")
+                    self.assertListEqual([index.document_length(doc_id) for doc_id in [1,2,3,4]], [14,4,1,0],
+                                         "Tamanho dos documentos incorreto")
+                    self.assertListEqual([index.document_unique_terms(doc_id) for doc_id in [1,2,3,4]], [3,2,1,0],
+                                         "Quantidade de termos distintos por documento incorreta")
+                    self.assertEqual(index.total_tokens, 19)
+                    self.assertAlmostEqual(index.average_document_length, 19/3)
+                reopened_index.close()
+                obj_index.close()
+
+    def test_frozen_lexicon(self):
+        from .lexicon import Lexicon
+        with tempfile.TemporaryDirectory() as str_dir:
+            #vários blocos do front coding, com prefixos compartilhados e termos acentuados
+            lst_terms = [f"cas{sufixo}" for sufixo in ["a","as","ado","amento","inha","tanha","telo"]]+\
+                        [f"termo{i}" for i in range(40)]+["ação","açúcar","árvore","zebra"]
+            expected_index = HashIndex()
+            obj_index = FileIndex(spimi=True, file_prefix=os.path.join(str_dir,"occur_index"), frozen_lexicon=True)
+            for index in [expected_index, obj_index]:
+                for doc_id in range(1,11):
+                    for i, term in enumerate(lst_terms):
+                        if (doc_id+i) % 3 == 0:
+                            index.index(term, doc_id, doc_id)
+                index.finish_indexing()
+
+            self.assertIsInstance(obj_index.dic_index, Lexicon, "O léxico deve ser congelado no finish_indexing")
+            self.assertListEqual(list(obj_index.dic_index), sorted(lst_terms, key=lambda term: term.encode("utf-8")))
+            for term in lst_terms+["ca","cas","zzz"]:
+                self.assertEqual(term in obj_index.dic_index, term in lst_terms)
+                self.assertListEqual([(occ.doc_id, occ.term_freq) for occ in obj_index.get_occurrence_list(term)],
+                                     [(occ.doc_id, occ.term_freq) for occ in expected_index.get_occurrence_list(term)])
+                self.assertEqual(obj_index.document_count_with_term(term), expected_index.document_count_with_term(term))
+
+            self.assertListEqual(list(obj_index.dic_index.prefix("cas")), sorted(lst_terms[:7]))
+            self.assertListEqual(list(obj_index.dic_index.prefix("a")), ["ação","açúcar"])
+            self.assertListEqual(list(obj_index.dic_index.prefix("á")), ["árvore"])
+            self.assertListEqual(list(obj_index.dic_index.prefix("b")), [])
+            self.assertListEqual(list(obj_index.dic_index.prefix("termo3")), ["termo3"]+[f"termo3{i}" for i in range(10)])
+            for str_pattern in ["cas*", "termo?", "*o", "a*", "ca?a*", "termo1[0-2]"]:
+                self.assertListEqual(obj_index.terms_matching(str_pattern), expected_index.terms_matching(str_pattern))
+
+            reopened_index = FileIndex.open(obj_index.save())
+            self.assertListEqual(list(reopened_index.dic_index), list(obj_index.dic_index))
+            self.assertListEqual(reopened_index.terms_matching("cas*"), sorted(lst_terms[:7]))
+            reopened_index.close()
+            obj_index.close()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 from index.structure import *
 
 import unittest
+import tempfile
 
 class StructureTest(unittest.TestCase):
     def create_terms(self):
@@ -59,10 +60,72 @@ class StructureTest(unittest.TestCase):
         list_occur = self.index.get_occurrence_list('xuxu')
         self.assertListEqual(list_occur,[],"O termo xuxu não existe, deveria retornar lista vazia")
 
+    def test_posting_cursor(self):
+        cursor = self.index.get_posting_cursor("vermelho")
+        self.assertListEqual(list(cursor), [(1,3),(2,1),(3,1)])
+        self.assertEqual(self.index.max_term_freq("vermelho"), 3)
+        self.assertEqual(self.index.max_term_freq("cinza"), 0)
+
+class FrozenHashStructureTest(StructureTest):
+    def setUp(self):
+        self.index = HashIndex(frozen=True)
+        self.create_terms()
+
+    def test_frozen(self):
+        self.assertIsNotNone(self.index.postings, "O finish_indexing deve congelar o indice")
+        arr_doc_ids, arr_term_freqs = self.index.get_posting_arrays("casa")
+        self.assertListEqual(arr_doc_ids.tolist(), [1,2])
+        self.assertListEqual(arr_term_freqs.tolist(), [10,3])
+        self.assertEqual(self.index.get_term_id("verde"), 3)
+        self.assertEqual(self.index.collection_frequency("vermelho"), 5)
+        self.assertRaises(ValueError, self.index.index, "casa", 4, 1)
+
+    def test_write_on_file(self):
+        expected_index = HashIndex()
+        for term, doc_id, term_freq in [("casa",1,10),("vermelho",1,3),("verde",1,1),
+                                        ("vermelho",2,1),("vermelho",3,1),("casa",2,3)]:
+            expected_index.index(term, doc_id, term_freq)
+        str_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as str_dir:
+            os.chdir(str_dir)
+            try:
+                expected_index.writeOnFile()
+                dic_expected = expected_index.readFromFile()
+                self.index.writeOnFile()
+                self.assertDictEqual(self.index.readFromFile(), dic_expected,
+                                     "O indice congelado deve ser gravado no mesmo formato do não congelado")
+            finally:
+                os.chdir(str_cwd)
+
 class FileStructureTest(StructureTest):
     def setUp(self):
         self.index = FileIndex()
         self.create_terms()
 
+class SpimiFileStructureTest(StructureTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"))
+        #força vários runs
+        self.index.TMP_OCCURRENCES_LIMIT = 2
+        self.create_terms()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+class CompressedFileStructureTest(SpimiFileStructureTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"), compressed=True)
+        self.index.TMP_OCCURRENCES_LIMIT = 2
+        self.create_terms()
+
+class AsyncFlushFileStructureTest(SpimiFileStructureTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"), flush_executor="thread")
+        self.index.TMP_OCCURRENCES_LIMIT = 2
+        self.create_terms()
+
 if __name__ == "__main__":
     unittest.main()
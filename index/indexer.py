@@ -1,16 +1,64 @@
-from nltk.stem.snowball import SnowballStemmer
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
+import codecs
 import string
-from nltk.tokenize import word_tokenize
+from multiprocessing import Pool
+from functools import lru_cache
+from typing import Dict, List, Tuple
+import logging
 import os
 
+from .metrics import Metrics, timer
+
+logger = logging.getLogger(__name__)
+
+
+class HTMLTextExtractor(HTMLParser):
+    #extrai o texto do HTML sem construir a árvore do documento (como o BeautifulSoup),
+    #ignorando o conteúdo de <script>, <style> e <template>. Pode ser alimentado aos pedaços com feed()
+    SKIP_TAGS = {"script", "style", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lst_text = []
+        self.int_skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in HTMLTextExtractor.SKIP_TAGS:
+            self.int_skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in HTMLTextExtractor.SKIP_TAGS and self.int_skip_depth > 0:
+            self.int_skip_depth -= 1
+
+    def handle_data(self, data):
+        if self.int_skip_depth == 0:
+            self.lst_text.append(data)
+
+    def pop_text(self) -> str:
+        #texto extraído desde a última chamada
+        text = "".join(self.lst_text)
+        self.lst_text = []
+        return text
+
+    def get_text(self) -> str:
+        self.close()
+        return self.pop_text()
+
 
 class Cleaner:
+    HTML_ENGINES = ("bs4", "parser")
+
     def __init__(self,stop_words_file:str,language:str,
                         perform_stop_words_removal:bool,perform_accents_removal:bool,
-                        perform_stemming:bool):
+                        perform_stemming:bool, cache_size:int=100000, html_engine:str="bs4"):
+        if html_engine not in Cleaner.HTML_ENGINES:
+            raise ValueError(f"html_engine deve ser um de {Cleaner.HTML_ENGINES} e não {html_engine}")
+        #bs4: BeautifulSoup (árvore completa); parser: HTMLTextExtractor (sem árvore, incremental)
+        self.html_engine = html_engine
         self.set_stop_words = self.read_stop_words(stop_words_file)
 
+        #nltk e bs4 são importados apenas quando usados (e não ao importar o módulo)
+        from nltk.stem.snowball import SnowballStemmer
         self.stemmer = SnowballStemmer(language)
         in_table =  "áéíóúâêôçãẽõü"
         out_table = "aeiouaeocaeou"
@@ -23,10 +71,61 @@ class Cleaner:
         self.perform_accents_removal = perform_accents_removal
         self.perform_stemming = perform_stemming
 
+        #cache termo original -> termo normalizado (ou None, se descartado)
+        #cache_size=0 desabilita o cache e cache_size=None o torna ilimitado
+        self.cache_size = cache_size
+        self.create_cache()
+
+        #métricas opcionais (ver metrics.Metrics): tempo e quantidade de chamadas do stemmer
+        self.metrics = None
+
+    def create_cache(self):
+        if self.cache_size == 0:
+            self.preprocess_word_cached = self.normalize_word
+        else:
+            self.preprocess_word_cached = lru_cache(maxsize=self.cache_size)(self.normalize_word)
+
+    def cache_info(self) -> dict:
+        if self.cache_size == 0:
+            return {"hits":0, "misses":0, "size":0, "max_size":0}
+        info = self.preprocess_word_cached.cache_info()
+        return {"hits":info.hits, "misses":info.misses, "size":info.currsize, "max_size":info.maxsize}
+
+    def clear_cache(self):
+        self.create_cache()
+
+    def __getstate__(self):
+        #o cache não é serializado (ex.: ao enviar o Cleaner para os processos do HTMLIndexer)
+        dic_state = self.__dict__.copy()
+        del dic_state["preprocess_word_cached"]
+        dic_state["metrics"] = None
+        return dic_state
+
+    def __setstate__(self, dic_state):
+        self.__dict__.update(dic_state)
+        self.create_cache()
+
     def html_to_plain_text(self,html_doc:str) ->str:
+        if self.html_engine == "parser":
+            parser = HTMLTextExtractor()
+            parser.feed(html_doc)
+            return parser.get_text()
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(html_doc, 'html.parser')
         return soup.get_text()
 
+    def html_file_to_plain_text(self, html_file, chunk_size:int=65536) -> str:
+        #html_file: arquivo binário (utf-8). Com o engine "parser" o arquivo é decodificado
+        #e processado aos pedaços, sem criar uma string com o HTML inteiro
+        if self.html_engine != "parser":
+            return self.html_to_plain_text(html_file.read().decode('utf-8', 'ignore'))
+        decoder = codecs.getincrementaldecoder('utf-8')('ignore')
+        parser = HTMLTextExtractor()
+        for bytes_chunk in iter(lambda: html_file.read(chunk_size), b""):
+            parser.feed(decoder.decode(bytes_chunk))
+        parser.feed(decoder.decode(b"", final=True))
+        return parser.get_text()
+
     def read_stop_words(self,str_file):
         set_stop_words = set()
         with open(str_file, "r", encoding='utf-8') as stop_words_file:
@@ -47,6 +146,22 @@ class Cleaner:
 
 
     def preprocess_word(self,term:str) -> str:
+        return self.preprocess_word_cached(term)
+
+    def tokenize(self, text:str) -> List[str]:
+        #tokens do texto (nltk), usados tanto na indexação quanto nas consultas
+        from nltk.tokenize import word_tokenize
+        return word_tokenize(text)
+
+    def text_words(self, text:str) -> List[str]:
+        #tokens normalizados (None para os descartados), na ordem do texto
+        return self.preprocess_words(self.tokenize(text))
+
+    def preprocess_words(self, lst_terms:List[str]) -> List[str]:
+        #normaliza uma lista de tokens (None para os descartados), na mesma ordem
+        return list(map(self.preprocess_word_cached, lst_terms))
+
+    def normalize_word(self,term:str) -> str:
         if (self.perform_stop_words_removal and self.is_stop_word(term)) or (term in self.set_punctuation):
             return None
 
@@ -54,26 +169,41 @@ class Cleaner:
         if self.perform_accents_removal:
             term = self.remove_accents(term)
         if self.perform_stemming:
-            term = self.word_stem(term)
+            if self.metrics is None:
+                term = self.word_stem(term)
+            else:
+                with self.metrics.timer("stem"):
+                    term = self.word_stem(term)
         return term
 
 
 
-class HTMLIndexer:
-    cleaner = Cleaner(stop_words_file="stopwords.txt",
+def default_cleaner(stop_words_file:str="stopwords.txt") -> Cleaner:
+    #configuração usada pelo HTMLIndexer quando nenhum Cleaner é informado
+    return Cleaner(stop_words_file=stop_words_file,
                         language="portuguese",
                         perform_stop_words_removal=True,
                         perform_accents_removal=True,
                         perform_stemming=True)
-    def __init__(self,index):
+
+
+class HTMLIndexer:
+    def __init__(self,index, metrics:Metrics=None, positional:bool=False, cleaner:Cleaner=None):
         self.index = index
+        #o Cleaner (e o arquivo de stop words) é criado aqui, e não ao importar o módulo
+        self.cleaner = cleaner if cleaner is not None else default_cleaner()
+        #métricas opcionais: tempo de cada etapa (html_extraction, tokenize, normalize, index),
+        #documentos e ocorrências indexados. Para medir também o stemmer, atribua o mesmo
+        #objeto a cleaner.metrics
+        self.metrics = metrics
+        #modo posicional: além da frequência, indexa a posição de cada ocorrência do termo
+        #(o indice deve armazená-las, ex.: HashIndex, FileIndex(spimi=True, positional=True),
+        #SegmentedIndex(positional=True) ou ShardedIndex(positional=True))
+        self.positional = positional
 
     def text_word_count(self,plain_text:str):
         dic_word_count = {}
-        words = word_tokenize(plain_text)
-        # print (words)
-        for word in words:
-            preprocessed_word = self.cleaner.preprocess_word(word)
+        for preprocessed_word in self.text_words(plain_text):
             if preprocessed_word != None:
                 if preprocessed_word in dic_word_count:
                     dic_word_count[preprocessed_word] += 1
@@ -81,20 +211,91 @@ class HTMLIndexer:
                     dic_word_count[preprocessed_word] = 1
         return dic_word_count
 
+    def text_word_positions(self, plain_text:str) -> Dict[str,List[int]]:
+        #termo -> posições dos seus tokens no texto. Os tokens descartados (stop words,
+        #pontuação) também ocupam uma posição, então "casa de papel" não casa com "casa papel"
+        dic_word_positions = {}
+        for int_position, preprocessed_word in enumerate(self.text_words(plain_text)):
+            if preprocessed_word != None:
+                if preprocessed_word in dic_word_positions:
+                    dic_word_positions[preprocessed_word].append(int_position)
+                else:
+                    dic_word_positions[preprocessed_word] = [int_position]
+        return dic_word_positions
+
+    def text_words(self, plain_text:str) -> List[str]:
+        #tokens normalizados, na ordem do texto (None para os descartados)
+        with timer(self.metrics, "tokenize"):
+            words = self.cleaner.tokenize(plain_text)
+        with timer(self.metrics, "normalize"):
+            return self.cleaner.preprocess_words(words)
+
+    def text_word_stats(self, plain_text:str):
+        #contagens ou, no modo posicional, posições de cada termo
+        return self.text_word_positions(plain_text) if self.positional else self.text_word_count(plain_text)
+
+    def html_word_count(self, text_html:str) -> Dict[str,int]:
+        with timer(self.metrics, "html_extraction"):
+            text = self.cleaner.html_to_plain_text(text_html)
+        return self.text_word_stats(text)
+
+    def file_word_count(self, str_file_path:str) -> Tuple[int,Dict[str,int]]:
+        with timer(self.metrics, "html_extraction"), open(str_file_path, 'rb') as fp:
+            text = self.cleaner.html_file_to_plain_text(fp)
+        doc_id = int(os.path.basename(str_file_path).replace(".html", ""))
+        return doc_id, self.text_word_stats(text)
+
+    def index_word_count(self, doc_id:int, dic_word_count:Dict[str,int]):
+        #no modo posicional, dic_word_count é termo -> posições (ver text_word_positions)
+        with timer(self.metrics, "index"):
+            if self.positional:
+                for key,lst_positions in dic_word_count.items():
+                    self.index.index(key, doc_id, len(lst_positions), lst_positions)
+            else:
+                for key,value in dic_word_count.items():
+                    self.index.index(key, doc_id, value)
+        if self.metrics is not None:
+            self.metrics.increment("documents")
+            self.metrics.increment("occurrences", len(dic_word_count))
+            self.metrics.maybe_report()
+
     def index_text(self,doc_id:int, text_html:str):
-        text = self.cleaner.html_to_plain_text(text_html)
-        dict = self.text_word_count(text)
-        for key,value in dict.items():
-            self.index.index(key, doc_id, value)
-    
- 
-    def index_text_dir(self,path:str):
+        self.index_word_count(doc_id, self.html_word_count(text_html))
+
+    def list_text_dir(self, path:str) -> List[str]:
+        lst_files = []
         for str_sub_dir in os.listdir(path):
             path_sub_dir = f"{path}/{str_sub_dir}"
             for file in os.listdir(path_sub_dir):
-                print(file)
-                with open(f"{path_sub_dir}/{file}", 'rb') as fp:                      
-                    htmlContent = fp.read().decode('utf-8', 'ignore')
-                    # print(htmlContent)
-                    self.index_text(int(file.replace(".html", "")), htmlContent)
-                
+                lst_files.append(f"{path_sub_dir}/{file}")
+        return lst_files
+
+    def index_text_dir(self,path:str, num_workers:int=1, chunk_size:int=16):
+        #com num_workers > 1, a extração do HTML e a contagem das palavras são feitas
+        #por um pool de processos; os resultados chegam na ordem da listagem e apenas
+        #este processo escreve no indice, logo os term_ids são os mesmos do modo sequencial
+        #(nesse caso as métricas de extração, tokenização e normalização não são coletadas)
+        lst_files = self.list_text_dir(path)
+        logger.info("Indexando %d arquivos de %s", len(lst_files), path)
+        if num_workers <= 1:
+            for str_file in lst_files:
+                logger.debug("Indexando %s", os.path.basename(str_file))
+                self.index_word_count(*self.file_word_count(str_file))
+        else:
+            with Pool(num_workers, initializer=_init_worker, initargs=(self.cleaner, self.positional)) as pool:
+                for str_file, (doc_id, dic_word_count) in zip(lst_files, pool.imap(_file_word_count_worker, lst_files, chunk_size)):
+                    logger.debug("Indexando %s", os.path.basename(str_file))
+                    self.index_word_count(doc_id, dic_word_count)
+        if self.metrics is not None:
+            self.metrics.report()
+
+
+#estado de cada processo do pool usado por HTMLIndexer.index_text_dir
+_worker_indexer = None
+
+def _init_worker(cleaner:Cleaner, positional:bool=False):
+    global _worker_indexer
+    _worker_indexer = HTMLIndexer(None, positional=positional, cleaner=cleaner)
+
+def _file_word_count_worker(str_file_path:str) -> Tuple[int,Dict[str,int]]:
+    return _worker_indexer.file_word_count(str_file_path)
@@ -1,6 +1,9 @@
 from index.indexer import *
 from index.structure import *
+from index.metrics import Metrics
 import unittest
+import pickle
+import io
 
 class IndexerTest(unittest.TestCase):
     def test_indexer(self):
@@ -21,6 +24,62 @@ class IndexerTest(unittest.TestCase):
                 self.assertTrue(type(occur.doc_id) == int,f"O tipo do documento deveria ser inteiro")
                 self.assertTrue(occur.doc_id in dic_expected,f"O docid número {occur.doc_id} não deveria existir ou não deveria indexar o termo 'cas'")
                 self.assertEqual(dic_expected[occur.doc_id].term_freq,occur.term_freq, f"A frequencia do termo 'cas' no documento {occur.doc_id} deveria ser {occur.term_freq}")
+    def test_parallel_indexer(self):
+        obj_index = HashIndex()
+        HTMLIndexer(obj_index).index_text_dir("index/docs_test")
+        obj_parallel_index = HashIndex()
+        HTMLIndexer(obj_parallel_index).index_text_dir("index/docs_test", num_workers=2, chunk_size=1)
+
+        #os ids dos termos devem ser os mesmos do modo sequencial
+        self.assertDictEqual({term:obj_index.get_term_id(term) for term in obj_index.vocabulary},
+                             {term:obj_parallel_index.get_term_id(term) for term in obj_parallel_index.vocabulary})
+        self.assertEqual(str(obj_index), str(obj_parallel_index))
+class CleanerTest(unittest.TestCase):
+    def test_preprocess_cache(self):
+        cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                            perform_stop_words_removal=True, perform_accents_removal=True,
+                            perform_stemming=True, cache_size=2)
+        lst_words = ["Casas","casas","Casas","ser",",","verdes"]
+        lst_expected = [cleaner.normalize_word(word) for word in lst_words]
+        self.assertListEqual(cleaner.preprocess_words(lst_words), lst_expected)
+        self.assertListEqual(lst_expected[:5], ["cas","cas","cas",None,None])
+
+        dic_info = cleaner.cache_info()
+        self.assertEqual(dic_info["hits"], 1, "Apenas a segunda ocorrência de 'Casas' deveria ser encontrada no cache")
+        self.assertEqual(dic_info["size"], 2, "O cache não pode passar do tamanho configurado")
+
+        cleaner.clear_cache()
+        self.assertEqual(cleaner.cache_info()["size"], 0)
+    def test_html_parser_engine(self):
+        cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                            perform_stop_words_removal=True, perform_accents_removal=True,
+                            perform_stemming=True, html_engine="parser")
+        bytes_html = "<html><head><style>p {color:red}</style><script>var a = '<b>x</b>';</script></head><body><p>A casa &amp; o prédio</p></body></html>".encode("utf-8")
+        #pedaços pequenos para quebrar tags e caracteres utf-8 no meio
+        self.assertEqual(cleaner.html_file_to_plain_text(io.BytesIO(bytes_html), chunk_size=5), "A casa & o prédio")
+        self.assertEqual(cleaner.html_to_plain_text(bytes_html.decode("utf-8")), "A casa & o prédio")
+
+    def test_html_engines_equivalent(self):
+        #os dois engines devem extrair o mesmo texto (e indexar os mesmos termos)
+        dic_cleaners = {html_engine: Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                                             perform_stop_words_removal=True, perform_accents_removal=True,
+                                             perform_stemming=True, html_engine=html_engine)
+                            for html_engine in Cleaner.HTML_ENGINES}
+        str_html = ("<html><head><title>Casa</title><style>p {color:red}</style></head><body>"
+                    "<p>A casa <b>verde</b></p><template><p>modelo oculto</p></template>"
+                    "<script>var a = 1;</script><div>e o prédio</div></body></html>")
+        self.assertEqual(dic_cleaners["parser"].html_to_plain_text(str_html), dic_cleaners["bs4"].html_to_plain_text(str_html))
+        self.assertNotIn("modelo", dic_cleaners["parser"].html_to_plain_text(str_html), "O conteúdo de <template> não é texto do documento")
+
+    def test_metrics(self):
+        cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                            perform_stop_words_removal=True, perform_accents_removal=True,
+                            perform_stemming=True)
+        cleaner.metrics = Metrics()
+        cleaner.preprocess_words(["Casas","casas","Casas","ser","verdes"])
+        #o stemmer só é chamado quando o termo não está no cache (e não é stop word)
+        self.assertEqual(cleaner.metrics.snapshot()["timers"]["stem"]["calls"], 3)
+        self.assertIsNone(pickle.loads(pickle.dumps(cleaner)).metrics, "As métricas não devem ser enviadas aos processos")
 
 if __name__ == "__main__":
     unittest.main()
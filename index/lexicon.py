@@ -0,0 +1,217 @@
+from collections.abc import Mapping
+from array import array
+from bisect import bisect_left, bisect_right
+from fnmatch import fnmatchcase
+from typing import Dict, List
+import struct
+import os
+
+from .structure import TermFilePosition
+from .codec import array_from_bytes, array_to_bytes, vbyte_encode, vbyte_decode
+
+#arquivo binário do léxico (little-endian):
+#   cabeçalho | nome do arquivo de ocorrências | blocos de termos (ordenados, front coding)
+#   | início de cada bloco (blocos+1) | term_id (n) | posição (n) | qtd. documentos (n)
+#   | tamanho em bytes (n) | maior term_freq (n) | doc_ids indexados
+LEXICON_MAGIC = b"RILX"
+LEXICON_VERSION = 3
+LEXICON_HEADER = struct.Struct("<4sBBHIIIQ")
+
+FLAG_COMPRESSED = 1
+
+#front coding: os termos são agrupados em blocos de LEXICON_BLOCK_SIZE. O primeiro termo
+#de cada bloco é gravado inteiro (tamanho + bytes) e os demais como o tamanho do prefixo
+#comum com o termo anterior, o tamanho do sufixo e o sufixo, tudo em VByte.
+#A busca é binária sobre o primeiro termo dos blocos e linear dentro do bloco
+LEXICON_BLOCK_SIZE = 16
+
+#caracteres especiais dos padrões aceitos por Lexicon.match (ver fnmatch)
+WILDCARD_CHARS = "*?["
+
+
+def front_code(lst_terms, int_block_size:int=LEXICON_BLOCK_SIZE):
+    #lst_terms: termos (bytes) ordenados. Retorna os blocos concatenados e o início de cada bloco
+    bytes_out = bytearray()
+    arr_block_start = array('Q')
+    bytes_prev = b""
+    for i, bytes_term in enumerate(lst_terms):
+        if i % int_block_size == 0:
+            arr_block_start.append(len(bytes_out))
+            vbyte_encode(len(bytes_term), bytes_out)
+            bytes_out += bytes_term
+        else:
+            int_shared = 0
+            int_max_shared = min(len(bytes_prev), len(bytes_term))
+            while int_shared < int_max_shared and bytes_prev[int_shared] == bytes_term[int_shared]:
+                int_shared += 1
+            vbyte_encode(int_shared, bytes_out)
+            vbyte_encode(len(bytes_term)-int_shared, bytes_out)
+            bytes_out += bytes_term[int_shared:]
+        bytes_prev = bytes_term
+    arr_block_start.append(len(bytes_out))
+    return bytes(bytes_out), arr_block_start
+
+
+class Lexicon(Mapping):
+    #dicionário somente leitura termo -> TermFilePosition. Os termos ficam ordenados e com
+    #front coding em um único buffer de bytes e os metadados em arrays paralelos: a busca é
+    #binária e o TermFilePosition só é criado quando o termo é consultado.
+    #Também permite enumerar os termos de um prefixo (prefix) ou de um padrão como "cas*" (match)
+    def __init__(self, bytes_terms:bytes, arr_block_start:array, arr_term_id:array, arr_start_pos:array,
+                        arr_doc_count:array, arr_byte_len:array, arr_max_term_freq:array, arr_doc_ids:array=None,
+                        str_idx_file_name:str=None, compressed:bool=False, block_size:int=LEXICON_BLOCK_SIZE):
+        self.bytes_terms = bytes_terms
+        self.arr_block_start = arr_block_start
+        self.block_size = block_size
+        self.arr_term_id = arr_term_id
+        self.arr_start_pos = arr_start_pos
+        self.arr_doc_count = arr_doc_count
+        self.arr_byte_len = arr_byte_len
+        self.arr_max_term_freq = arr_max_term_freq
+        self.arr_doc_ids = arr_doc_ids if arr_doc_ids is not None else array('I')
+        self.str_idx_file_name = str_idx_file_name
+        self.compressed = compressed
+        #último bloco decodificado (as consultas e a iteração costumam repetir o mesmo bloco)
+        self.cached_block = (-1, [])
+
+    @classmethod
+    def from_dic_index(cls, dic_index:Dict[str,TermFilePosition], set_documents=(),
+                        str_idx_file_name:str=None, compressed:bool=False) -> "Lexicon":
+        lst_terms = sorted((str_term.encode("utf-8"), obj_term) for str_term, obj_term in dic_index.items())
+
+        arr_term_id, arr_doc_count, arr_max_term_freq = array('I'), array('I'), array('I')
+        arr_start_pos, arr_byte_len = array('Q'), array('Q')
+        for bytes_term, obj_term in lst_terms:
+            arr_term_id.append(obj_term.term_id)
+            arr_start_pos.append(obj_term.term_file_start_pos or 0)
+            arr_doc_count.append(obj_term.doc_count_with_term or 0)
+            arr_byte_len.append(obj_term.term_file_byte_len or 0)
+            arr_max_term_freq.append(obj_term.max_term_freq or 0)
+        bytes_terms, arr_block_start = front_code([bytes_term for bytes_term, _ in lst_terms])
+        return cls(bytes_terms, arr_block_start, arr_term_id, arr_start_pos, arr_doc_count, arr_byte_len, arr_max_term_freq, array('I', sorted(set_documents)),
+                    str_idx_file_name, compressed)
+
+    def save(self, str_file:str):
+        #o nome do arquivo de ocorrências é gravado relativo ao diretório do léxico
+        str_idx_file_name = os.path.relpath(self.str_idx_file_name, os.path.dirname(os.path.abspath(str_file)))
+        bytes_file_name = str_idx_file_name.encode("utf-8")
+        with open(str_file, "wb") as file:
+            file.write(LEXICON_HEADER.pack(LEXICON_MAGIC, LEXICON_VERSION, FLAG_COMPRESSED if self.compressed else 0,
+                                           self.block_size, len(self), len(self.arr_doc_ids), len(bytes_file_name), len(self.bytes_terms)))
+            file.write(bytes_file_name)
+            file.write(self.bytes_terms)
+            for arr in (self.arr_block_start, self.arr_term_id, self.arr_start_pos,
+                        self.arr_doc_count, self.arr_byte_len, self.arr_max_term_freq, self.arr_doc_ids):
+                file.write(array_to_bytes(arr))
+
+    @classmethod
+    def load(cls, str_file:str) -> "Lexicon":
+        with open(str_file, "rb") as file:
+            bytes_file = memoryview(file.read())
+        magic, version, flags, int_block_size, int_terms, int_docs, int_name_len, int_terms_len = LEXICON_HEADER.unpack_from(bytes_file)
+        if magic != LEXICON_MAGIC or version != LEXICON_VERSION:
+            raise ValueError(f"{str_file} não é um arquivo de léxico válido")
+
+        int_pos = LEXICON_HEADER.size
+        str_idx_file_name = bytes(bytes_file[int_pos:int_pos+int_name_len]).decode("utf-8")
+        str_idx_file_name = os.path.join(os.path.dirname(os.path.abspath(str_file)), str_idx_file_name)
+        int_pos += int_name_len
+        bytes_terms = bytes(bytes_file[int_pos:int_pos+int_terms_len])
+        int_pos += int_terms_len
+
+        lst_arrays = []
+        int_blocks = (int_terms+int_block_size-1)//int_block_size
+        for type_code, int_len in (('Q', int_blocks+1), ('I', int_terms), ('Q', int_terms),
+                                   ('I', int_terms), ('Q', int_terms), ('I', int_terms), ('I', int_docs)):
+            int_size = array(type_code).itemsize*int_len
+            lst_arrays.append(array_from_bytes(type_code, bytes_file[int_pos:int_pos+int_size]))
+            int_pos += int_size
+        return cls(bytes_terms, *lst_arrays, str_idx_file_name=str_idx_file_name,
+                    compressed=bool(flags & FLAG_COMPRESSED), block_size=int_block_size)
+
+    @property
+    def block_count(self) -> int:
+        return len(self.arr_block_start)-1
+
+    def block_first_term(self, int_block:int) -> bytes:
+        #o primeiro termo do bloco está inteiro: não é preciso decodificar o restante
+        int_len, int_pos = vbyte_decode(self.bytes_terms, self.arr_block_start[int_block])
+        return self.bytes_terms[int_pos:int_pos+int_len]
+
+    def decode_block(self, int_block:int) -> List[bytes]:
+        int_cached_block, lst_terms = self.cached_block
+        if int_cached_block == int_block:
+            return lst_terms
+        int_pos = self.arr_block_start[int_block]
+        int_end = self.arr_block_start[int_block+1]
+        int_len, int_pos = vbyte_decode(self.bytes_terms, int_pos)
+        bytes_term = self.bytes_terms[int_pos:int_pos+int_len]
+        int_pos += int_len
+        lst_terms = [bytes_term]
+        while int_pos < int_end:
+            int_shared, int_pos = vbyte_decode(self.bytes_terms, int_pos)
+            int_len, int_pos = vbyte_decode(self.bytes_terms, int_pos)
+            bytes_term = bytes_term[:int_shared]+self.bytes_terms[int_pos:int_pos+int_len]
+            int_pos += int_len
+            lst_terms.append(bytes_term)
+        self.cached_block = (int_block, lst_terms)
+        return lst_terms
+
+    def term_bytes(self, i:int) -> bytes:
+        return self.decode_block(i//self.block_size)[i%self.block_size]
+
+    def lower_bound(self, bytes_term:bytes) -> int:
+        #posição do primeiro termo >= bytes_term
+        int_block = bisect_right(range(self.block_count), bytes_term, key=self.block_first_term)-1
+        if int_block < 0:
+            return 0
+        return int_block*self.block_size+bisect_left(self.decode_block(int_block), bytes_term)
+
+    def find(self, term:str) -> int:
+        #posição do termo na ordem do léxico (ou -1)
+        bytes_term = term.encode("utf-8")
+        i = self.lower_bound(bytes_term)
+        if i < len(self) and self.term_bytes(i) == bytes_term:
+            return i
+        return -1
+
+    def iter_term_bytes(self, int_start:int=0):
+        #termos (bytes) a partir da posição int_start, decodificando um bloco de cada vez
+        int_block, int_offset = divmod(int_start, self.block_size)
+        for int_block in range(int_block, self.block_count):
+            yield from self.decode_block(int_block)[int_offset:]
+            int_offset = 0
+
+    def prefix(self, str_prefix:str):
+        #termos que começam com str_prefix, em ordem (a ordem dos bytes utf-8 é a dos caracteres)
+        bytes_prefix = str_prefix.encode("utf-8")
+        for bytes_term in self.iter_term_bytes(self.lower_bound(bytes_prefix)):
+            if not bytes_term.startswith(bytes_prefix):
+                return
+            yield bytes_term.decode("utf-8")
+
+    def match(self, str_pattern:str):
+        #termos que casam com o padrão (ex.: "cas*", "c?sa"); apenas os termos com o
+        #prefixo anterior ao primeiro caractere especial são testados
+        int_literal = min((i for i, char in enumerate(str_pattern) if char in WILDCARD_CHARS), default=len(str_pattern))
+        return (term for term in self.prefix(str_pattern[:int_literal]) if fnmatchcase(term, str_pattern))
+
+    def entry(self, i:int) -> TermFilePosition:
+        return TermFilePosition(self.arr_term_id[i], self.arr_start_pos[i], self.arr_doc_count[i], self.arr_byte_len[i],
+                                self.arr_max_term_freq[i])
+
+    def __getitem__(self, term:str) -> TermFilePosition:
+        i = self.find(term) if isinstance(term, str) else -1
+        if i < 0:
+            raise KeyError(term)
+        return self.entry(i)
+
+    def __contains__(self, term) -> bool:
+        return isinstance(term, str) and self.find(term) >= 0
+
+    def __iter__(self):
+        for bytes_term in self.iter_term_bytes():
+            yield bytes_term.decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.arr_term_id)
@@ -0,0 +1,66 @@
+from index.__main__ import main, cleaner_file_name
+from index.structure import FileIndex
+from contextlib import redirect_stdout
+import unittest
+import tempfile
+import subprocess
+import sys
+import json
+import io
+import os
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        #indice gravado sem Cleaner (as consultas não são normalizadas)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        obj_index = FileIndex(spimi=True, positional=True, frozen_lexicon=True,
+                              file_prefix=os.path.join(self.tmp_dir.name,"occur_index"))
+        for doc_id, lst_terms in [(1,["casa","verde"]), (2,["casa","azul","verde"]), (3,["verde","casa"])]:
+            for int_position, term in enumerate(lst_terms):
+                obj_index.index(term, doc_id, 1, [int_position])
+        obj_index.finish_indexing()
+        self.str_lexicon_file = obj_index.save()
+        obj_index.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_main(self, lst_args):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            main(lst_args)
+        return output.getvalue()
+
+    def test_query(self):
+        lst_lines = self.run_main(["query", self.str_lexicon_file, "casa AND NOT azul", "casa OR", "--mode", "boolean"]).splitlines()
+        self.assertDictEqual(json.loads(lst_lines[0]), {"query":"casa AND NOT azul", "results":[1,3]})
+        self.assertIn("error", json.loads(lst_lines[1]), "Consultas inválidas devem ser reportadas sem interromper as demais")
+
+        dic_output = json.loads(self.run_main(["query", self.str_lexicon_file, "casa verde", "--mode", "phrase"]))
+        self.assertListEqual(dic_output["results"], [1])
+
+        dic_output = json.loads(self.run_main(["query", self.str_lexicon_file, "azul verde", "-k", "2"]))
+        self.assertEqual(dic_output["results"][0][0], 2, "O documento 2 é o único com 'azul'")
+        self.assertEqual(len(dic_output["results"]), 2)
+        self.assertFalse(os.path.exists(cleaner_file_name(self.str_lexicon_file)))
+
+    def test_stats(self):
+        dic_output = json.loads(self.run_main(["stats", self.str_lexicon_file]))
+        self.assertEqual(dic_output["documents"], 3)
+        self.assertEqual(dic_output["terms"], 3)
+        self.assertEqual(dic_output["total_tokens"], 7)
+        self.assertTrue(dic_output["positional"])
+        self.assertIn(self.str_lexicon_file, dic_output["files"])
+
+    def test_lazy_imports(self):
+        #consultar não deve carregar IPython, bs4 nem nltk
+        str_code = ("import sys; from index.__main__ import main; "
+                    f"main(['query', {self.str_lexicon_file!r}, 'casa', '--mode', 'boolean']); "
+                    "print(sorted(m for m in ('IPython', 'bs4', 'nltk') if m in sys.modules))")
+        str_output = subprocess.run([sys.executable, "-c", str_code], capture_output=True, text=True, check=True,
+                                    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+        self.assertEqual(str_output.splitlines()[-1], "[]")
+
+
+if __name__ == "__main__":
+    unittest.main()
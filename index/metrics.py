@@ -0,0 +1,121 @@
+from contextlib import nullcontext
+from time import perf_counter
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+#contexto vazio usado por timer() quando as métricas estão desabilitadas
+NULL_TIMER = nullcontext()
+
+
+class Metrics:
+    #contadores e tempos da indexação. É opcional: HTMLIndexer, Cleaner e FileIndex só
+    #medem alguma coisa quando recebem um Metrics (self.metrics is not None), então o
+    #custo quando desabilitado é apenas essa comparação.
+    #callback(snapshot) é chamado no máximo a cada report_interval segundos (ver maybe_report)
+    def __init__(self, callback=None, report_interval:float=10.0):
+        self.callback = callback
+        self.report_interval = report_interval
+        #nome -> [chamadas, segundos]
+        self.dic_timers = {}
+        #nome -> valor
+        self.dic_counters = {}
+        #nome -> [quantidade, soma, mínimo, máximo]
+        self.dic_values = {}
+        self.time_start = perf_counter()
+        self.time_last_report = self.time_start
+
+    def add_time(self, str_name:str, seconds:float, int_calls:int=1):
+        lst_timer = self.dic_timers.get(str_name)
+        if lst_timer is None:
+            self.dic_timers[str_name] = [int_calls, seconds]
+        else:
+            lst_timer[0] += int_calls
+            lst_timer[1] += seconds
+
+    def timer(self, str_name:str) -> "MetricsTimer":
+        #with metrics.timer("merge"): ...
+        return MetricsTimer(self, str_name)
+
+    def increment(self, str_name:str, value:int=1):
+        self.dic_counters[str_name] = self.dic_counters.get(str_name, 0)+value
+
+    def observe(self, str_name:str, value:int):
+        #distribuição de um valor (ex.: tamanho de cada run gravado)
+        lst_value = self.dic_values.get(str_name)
+        if lst_value is None:
+            self.dic_values[str_name] = [1, value, value, value]
+        else:
+            lst_value[0] += 1
+            lst_value[1] += value
+            lst_value[2] = min(lst_value[2], value)
+            lst_value[3] = max(lst_value[3], value)
+
+    def snapshot(self) -> dict:
+        elapsed = perf_counter()-self.time_start
+        return {"elapsed_seconds": elapsed,
+                "timers": {str_name: {"calls": int_calls, "seconds": seconds}
+                                for str_name, (int_calls, seconds) in self.dic_timers.items()},
+                "counters": dict(self.dic_counters),
+                "values": {str_name: {"count": int_count, "sum": value_sum, "min": value_min, "max": value_max,
+                                      "mean": value_sum/int_count}
+                                for str_name, (int_count, value_sum, value_min, value_max) in self.dic_values.items()},
+                "peak_rss_bytes": peak_rss_bytes(),
+                "rates": {"docs_per_second": self.dic_counters.get("documents", 0)/elapsed if elapsed > 0 else 0.0,
+                          "occurrences_per_second": self.dic_counters.get("occurrences", 0)/elapsed if elapsed > 0 else 0.0}}
+
+    def maybe_report(self):
+        if self.callback is not None and perf_counter()-self.time_last_report >= self.report_interval:
+            self.report()
+
+    def report(self):
+        self.time_last_report = perf_counter()
+        if self.callback is not None:
+            self.callback(self.snapshot())
+
+    def reset(self):
+        self.dic_timers = {}
+        self.dic_counters = {}
+        self.dic_values = {}
+        self.time_start = perf_counter()
+        self.time_last_report = self.time_start
+
+
+class MetricsTimer:
+    def __init__(self, metrics:Metrics, str_name:str):
+        self.metrics = metrics
+        self.str_name = str_name
+
+    def __enter__(self):
+        self.time_start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.add_time(self.str_name, perf_counter()-self.time_start)
+        return False
+
+
+def peak_rss_bytes() -> int:
+    #maior memória residente do processo até agora (None se não estiver disponível)
+    try:
+        import resource
+    except ImportError:
+        return None
+    int_max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss é em KB no Linux e em bytes no macOS
+    return int_max_rss if sys.platform == "darwin" else int_max_rss*1024
+
+
+def timer(metrics:Metrics, str_name:str):
+    #with timer(self.metrics, "tokenize"): ... (não mede nada se metrics for None)
+    return NULL_TIMER if metrics is None else MetricsTimer(metrics, str_name)
+
+
+def log_metrics(dic_snapshot:dict):
+    #callback pronto para Metrics: resume o snapshot no log
+    dic_rates = dic_snapshot["rates"]
+    str_timers = ", ".join(f"{str_name}: {dic_timer['seconds']:.2f}s/{dic_timer['calls']}"
+                            for str_name, dic_timer in sorted(dic_snapshot["timers"].items()))
+    logger.info("%.1f docs/s, %.1f ocorrências/s (%s)", dic_rates["docs_per_second"],
+                dic_rates["occurrences_per_second"], str_timers)
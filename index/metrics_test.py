@@ -0,0 +1,56 @@
+from index.structure import *
+from index.metrics import *
+import unittest
+import tempfile
+
+
+class MetricsTest(unittest.TestCase):
+    def test_snapshot(self):
+        lst_snapshots = []
+        metrics = Metrics(callback=lst_snapshots.append, report_interval=0)
+        with metrics.timer("tokenize"):
+            pass
+        with timer(metrics, "tokenize"):
+            pass
+        metrics.increment("documents", 2)
+        metrics.observe("run_size", 10)
+        metrics.observe("run_size", 30)
+        metrics.maybe_report()
+
+        self.assertEqual(len(lst_snapshots), 1, "O callback deveria ter sido chamado")
+        dic_snapshot = lst_snapshots[0]
+        self.assertEqual(dic_snapshot["timers"]["tokenize"]["calls"], 2)
+        self.assertEqual(dic_snapshot["counters"]["documents"], 2)
+        self.assertEqual((dic_snapshot["values"]["run_size"]["min"], dic_snapshot["values"]["run_size"]["max"],
+                          dic_snapshot["values"]["run_size"]["mean"]), (10,30,20))
+        self.assertGreater(dic_snapshot["rates"]["docs_per_second"], 0)
+
+        #sem métricas, timer não mede nada
+        with timer(None, "tokenize"):
+            pass
+
+    def test_file_index_metrics(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            for spimi, compressed in [(False, False), (True, False), (True, True)]:
+                metrics = Metrics()
+                obj_index = FileIndex(spimi=spimi, compressed=compressed, metrics=metrics,
+                                      file_prefix=os.path.join(str_dir, f"occur_index_{spimi}_{compressed}"))
+                obj_index.TMP_OCCURRENCES_LIMIT = 100
+                for doc_id in range(1,101):
+                    for term in ["casa","verde","vermelho"]:
+                        obj_index.index(term, doc_id, 1)
+                obj_index.finish_indexing()
+
+                dic_snapshot = metrics.snapshot()
+                self.assertEqual(dic_snapshot["counters"]["flushes"], 3)
+                self.assertEqual(dic_snapshot["values"]["run_size"]["sum"], 300, "Todas as ocorrências deveriam ter sido gravadas")
+                self.assertEqual(dic_snapshot["timers"]["sort"]["calls"], 3)
+                self.assertIn("merge", dic_snapshot["timers"])
+                self.assertGreater(dic_snapshot["counters"]["bytes_read"], 0)
+                if not compressed:
+                    self.assertGreaterEqual(dic_snapshot["counters"]["bytes_written"], 300*RECORD_SIZE)
+                obj_index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,13 @@
-from IPython.display import clear_output
 from index.structure import *
+from index.indexer import Cleaner
+from index.benchmark import PHASES, PhaseMeter, tokenize_corpus, lookup_terms, run_benchmark
 
 from datetime import datetime
-import math
+import json
+import tempfile
 import tracemalloc
 import unittest
+import io
 from random import randrange,seed
 
 
@@ -15,67 +18,95 @@ from random import randrange,seed
 class PerformanceTest(unittest.TestCase):
     NUM_DOCS = 2000
     NUM_TERM_PER_DOC = 500
+    VOCABULARY_SIZE = 20000
 
-    def setUp(self):
-        self.index = HashIndex()
+    def create_index(self, str_dir:str) -> Index:
+        return HashIndex()
 
-    def create_vocabulary(self):
-        vocabulary = []
-        for i in range(65,91):
-            for j in range(65,91):
-                for k in range(65,91):
-                    vocabulary.append(f"{chr(i)}{chr(j)}{chr(k)}")
-        return vocabulary
+    def test_performance(self):
+        #coleção sintética com distribuição de Zipf (ver benchmark.py)
+        tracemalloc.start()
+        meter = PhaseMeter()
+        lst_word_counts = tokenize_corpus(meter, PerformanceTest.NUM_DOCS, PerformanceTest.NUM_TERM_PER_DOC,
+                                            PerformanceTest.VOCABULARY_SIZE, 1.0, 10)
+        with tempfile.TemporaryDirectory() as str_dir:
+            dic_result = run_benchmark(self.create_index, lst_word_counts, lookup_terms(lst_word_counts, 100), meter, str_dir)
+        tracemalloc.stop()
 
-    def print_status(self,count:int,total:int):
+        print(json.dumps(dic_result, indent=4))
+        self.assertEqual(dic_result["documents"], PerformanceTest.NUM_DOCS)
+        self.assertEqual(dic_result["occurrences"], sum(len(dic_word_count) for _, dic_word_count in lst_word_counts))
+        self.assertGreater(dic_result["lookup_postings"], 0)
+        self.assertCountEqual(dic_result["phases"].keys(), PHASES)
 
-        delta = datetime.now()-self.time
-        porc_complete = math.floor(count/total*100)
-        current, peak = tracemalloc.get_traced_memory()
+class FilePerformanceTest(PerformanceTest):
+    def create_index(self, str_dir:str) -> Index:
+        obj_index = FileIndex(file_prefix=os.path.join(str_dir, "occur_index"))
+        #força algumas gravações durante a indexação, medidas na fase flush
+        obj_index.TMP_OCCURRENCES_LIMIT = 200000
+        return obj_index
 
-        clear_output(wait=True)
-        print(f"Memoria usada: {current / 10**6:,} MB; Máximo {peak / 10**6:,} MB")
-        print(f"Indexando ocorrencia #{count:,}/{total:,} ({porc_complete}%)")
-        print(f"Tempo gasto: {delta.total_seconds()}s")
+class OccurrenceBufferPerformanceTest(unittest.TestCase):
+    NUM_OCCURRENCES = 300000
 
-    def index_words(self):
-        count = 0
+    def fill(self, buffer_add):
         seed(10)
-        words = []
-        for doc_i in range(PerformanceTest.NUM_DOCS):
-            for term_j in range(PerformanceTest.NUM_TERM_PER_DOC):
-                idx_term = randrange(0,len(self.vocabulary))
-                str_term = self.vocabulary[idx_term]
-                self.index.index(str_term, doc_i, (count%10)+1)
-                #indiceTeste.index(vocabulario[(count+1)%15625], d, (count%10)+1);
-                if count%50000==0:
-                    self.print_status(count,PerformanceTest.NUM_DOCS*PerformanceTest.NUM_TERM_PER_DOC)
-
-                count+=1
-        return count
+        for i in range(OccurrenceBufferPerformanceTest.NUM_OCCURRENCES):
+            buffer_add(i//100, randrange(1,20000), (i%10)+1)
 
-    def test_performance(self):
+    def measure(self, create_buffer, buffer_add_factory):
+        tracemalloc.start()
+        buffer = create_buffer()
+        self.fill(buffer_add_factory(buffer))
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
 
+        time = datetime.now()
+        buffer.sort()
+        delta = datetime.now()-time
+        return current, delta.total_seconds()
 
-        print("Criando vocabulário...")
-        self.vocabulary = self.create_vocabulary()
+    def test_buffer_performance(self):
+        mem_objects, time_objects = self.measure(list, lambda lst: lambda doc_id, term_id, term_freq: lst.append(TermOccurrence(doc_id, term_id, term_freq)))
+        mem_arrays, time_arrays = self.measure(OccurrenceBuffer, lambda buffer: buffer.add)
 
-        tracemalloc.start()
-        self.time = datetime.now()
-        total = self.index_words()
-        self.print_status(total,total)
-        tracemalloc.stop()
+        print(f"Lista de TermOccurrence: {mem_objects / 10**6:,} MB; ordenação em {time_objects}s")
+        print(f"OccurrenceBuffer: {mem_arrays / 10**6:,} MB; ordenação em {time_arrays}s")
+        self.assertLess(mem_arrays, mem_objects, "O buffer colunar deveria ocupar menos memória que a lista de objetos")
 
-import time
-class FilePerformanceTest(PerformanceTest):
-    def setUp(self):
-        self.index = FileIndex()
-
-def test():
-    for i in range(10):
-        clear_output(wait=True)
-        print(f"oi {i}")
-        time.sleep(1)
+class HTMLExtractionPerformanceTest(unittest.TestCase):
+    NUM_DOCS = 300
+
+    def create_documents(self):
+        seed(10)
+        lst_words = ["casa","verde","questão","será","não","vermelho","prédio","amarelo"]
+        lst_docs = []
+        for doc_i in range(HTMLExtractionPerformanceTest.NUM_DOCS):
+            lst_paragraphs = [" ".join(lst_words[randrange(0,len(lst_words))] for _ in range(40)) for _ in range(20)]
+            lst_docs.append(("<html><head><title>Doc</title><style>p {color:red}</style>"
+                             "<script>var x = '<p>ignorar</p>';</script></head><body>"
+                             + "".join(f"<div><p>{paragraph} &amp; <b>mais</b></p></div>" for paragraph in lst_paragraphs)
+                             + "</body></html>").encode("utf-8"))
+        return lst_docs
+
+    def extract_all(self, cleaner:Cleaner, lst_docs):
+        time = datetime.now()
+        lst_texts = [cleaner.html_file_to_plain_text(io.BytesIO(bytes_doc)) for bytes_doc in lst_docs]
+        return lst_texts, (datetime.now()-time).total_seconds()
+
+    def test_extraction_performance(self):
+        lst_docs = self.create_documents()
+        dic_texts = {}
+        for html_engine in Cleaner.HTML_ENGINES:
+            cleaner = Cleaner(stop_words_file="stopwords.txt", language="portuguese",
+                                perform_stop_words_removal=True, perform_accents_removal=True,
+                                perform_stemming=True, html_engine=html_engine)
+            lst_texts, seconds = self.extract_all(cleaner, lst_docs)
+            dic_texts[html_engine] = lst_texts
+            print(f"Engine {html_engine}: {len(lst_docs)/seconds:,.1f} docs/s")
+
+        #os dois engines devem gerar os mesmos tokens
+        self.assertListEqual([text.split() for text in dic_texts["bs4"]], [text.split() for text in dic_texts["parser"]])
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,319 @@
+from typing import Dict, List, Tuple
+from bisect import bisect_left
+from functools import reduce
+from operator import and_, or_, sub
+import heapq
+import re
+
+from .structure import Index
+from .bitmap import Bitmap
+from .cursor import PostingCursor, ArrayCursor
+from .cache import result_size
+
+#consultas booleanas: termos separados por espaço são combinados com AND;
+#os operadores AND, OR e NOT (em maiúsculas) e parênteses também são aceitos.
+#Ex.: "casa AND (verde OR vermelho) NOT predio". Termos com * ou ? (ex.: "cas*") são
+#substituídos pelo OR de todos os termos do vocabulário que casam com o padrão
+QUERY_TOKEN_PATTERN = re.compile(r"\(|\)|[^\s()]+")
+OPERATORS = {"AND", "OR", "NOT"}
+WILDCARDS = ("*", "?")
+
+
+def query_words(cleaner, str_text:str) -> List[str]:
+    #tokens normalizados da consulta pelo mesmo caminho da indexação (Cleaner.text_words),
+    #para que pontuação junto às palavras gere os mesmos termos e posições.
+    #Sem Cleaner, os termos são separados por espaço
+    if cleaner is None:
+        return str_text.split()
+    return cleaner.text_words(str_text)
+
+
+class BooleanQuery:
+    def __init__(self, index:Index, cleaner=None):
+        #cleaner: o mesmo Cleaner usado na indexação, para normalizar os termos da consulta
+        self.index = index
+        self.cleaner = cleaner
+        self.dic_cursors = {}
+
+    def normalize(self, term:str) -> str:
+        if self.cleaner is None:
+            return term
+        return self.cleaner.preprocess_word(term)
+
+    def normalize_pattern(self, str_pattern:str) -> str:
+        #o padrão não passa pelo stemmer nem pela remoção de stop words (é um prefixo, não uma palavra)
+        if self.cleaner is None:
+            return str_pattern
+        str_pattern = str_pattern.lower()
+        if self.cleaner.perform_accents_removal:
+            str_pattern = self.cleaner.remove_accents(str_pattern)
+        return str_pattern
+
+    def parse(self, str_query:str):
+        #gera a árvore da consulta com nós ("term", termo), ("and", [filhos]),
+        #("or", [filhos]) e ("not", filho). Termos descartados pelo Cleaner viram None
+        self.lst_tokens = QUERY_TOKEN_PATTERN.findall(str_query)
+        self.int_pos = 0
+        node = self.parse_or()
+        if self.int_pos < len(self.lst_tokens):
+            raise ValueError(f"Consulta inválida: '{self.lst_tokens[self.int_pos]}' inesperado")
+        return node
+
+    def peek(self) -> str:
+        return self.lst_tokens[self.int_pos] if self.int_pos < len(self.lst_tokens) else None
+
+    def parse_or(self):
+        lst_children = [self.parse_and()]
+        while self.peek() == "OR":
+            self.int_pos += 1
+            lst_children.append(self.parse_and())
+        return self.simplify("or", lst_children)
+
+    def parse_and(self):
+        lst_children = [self.parse_not()]
+        while self.peek() is not None and self.peek() not in ("OR", ")"):
+            if self.peek() == "AND":
+                self.int_pos += 1
+            lst_children.append(self.parse_not())
+        return self.simplify("and", lst_children)
+
+    def parse_not(self):
+        if self.peek() == "NOT":
+            self.int_pos += 1
+            child = self.parse_not()
+            return None if child is None else ("not", child)
+        return self.parse_atom()
+
+    def parse_atom(self):
+        token = self.peek()
+        if token is None or token in OPERATORS or token == ")":
+            raise ValueError(f"Consulta inválida: termo esperado e não '{token}'")
+        self.int_pos += 1
+        if token == "(":
+            node = self.parse_or()
+            if self.peek() != ")":
+                raise ValueError("Consulta inválida: ')' esperado")
+            self.int_pos += 1
+            return node
+        if any(char in token for char in WILDCARDS):
+            lst_terms = self.index.terms_matching(self.normalize_pattern(token))
+            #sem nenhum termo, o nó continua na consulta (e não casa com nenhum documento)
+            return ("term", lst_terms[0]) if len(lst_terms) == 1 else ("or", [("term", term) for term in lst_terms])
+        term = self.normalize(token)
+        return None if term is None else ("term", term)
+
+    def simplify(self, operator:str, lst_children):
+        lst_children = [child for child in lst_children if child is not None]
+        if len(lst_children) == 0:
+            return None
+        if len(lst_children) == 1:
+            return lst_children[0]
+        return (operator, lst_children)
+
+    def search(self, str_query:str) -> List[int]:
+        #lista ordenada dos doc_ids que satisfazem a consulta
+        node = self.parse(str_query)
+        #a chave do cache é a árvore com os termos já normalizados: consultas de objetos
+        #com Cleaners diferentes sobre o mesmo indice não compartilham resultados
+        cache = self.index.query_cache
+        if cache is not None:
+            key = ("boolean", self.cache_key(node))
+            lst_result = cache.get(key)
+            if lst_result is not None:
+                return list(lst_result)
+        #os cursores de todos os termos são obtidos de uma vez (ver Index.get_posting_cursors);
+        #os termos armazenados como bitmap são combinados diretamente (ver evaluate_bitmap)
+        self.dic_cursors = {} if node is None else \
+                                self.index.get_posting_cursors([term for term in self.query_terms(node) if not self.index.has_bitmap(term)])
+        lst_result = [] if node is None else list(self.evaluate(node).doc_ids())
+        if cache is not None:
+            cache.put(key, lst_result, result_size(lst_result))
+            lst_result = list(lst_result)
+        return lst_result
+
+    def cache_key(self, node):
+        #a árvore da consulta com tuplas no lugar das listas de filhos
+        if node is None or node[0] == "term":
+            return node
+        if node[0] == "not":
+            return ("not", self.cache_key(node[1]))
+        return (node[0], tuple(self.cache_key(child) for child in node[1]))
+
+    def query_terms(self, node) -> List[str]:
+        if node[0] == "term":
+            return [node[1]]
+        if node[0] == "not":
+            return self.query_terms(node[1])
+        return [term for child in node[1] for term in self.query_terms(child)]
+
+    def evaluate(self, node) -> PostingCursor:
+        operator = node[0]
+        if operator == "term":
+            #cada cursor pré-carregado é usado uma única vez (o termo pode se repetir na consulta)
+            cursor = self.dic_cursors.pop(node[1], None)
+            return cursor if cursor is not None else self.index.get_posting_cursor(node[1])
+        if operator == "cursor":
+            return node[1]
+        if operator == "and":
+            lst_positive = [child for child in node[1] if child[0] != "not"]
+            lst_negative = [child[1] for child in node[1] if child[0] == "not"]
+            #os filhos que são bitmaps são combinados com AND bit a bit antes da interseção com os demais
+            lst_bitmaps = [self.evaluate_bitmap(child) for child in lst_positive]
+            if any(bitmap is not None for bitmap in lst_bitmaps):
+                bitmap = reduce(and_, [bitmap for bitmap in lst_bitmaps if bitmap is not None])
+                lst_negative_bitmaps = [self.evaluate_bitmap(child) for child in lst_negative]
+                if all(negative is not None for negative in lst_negative_bitmaps):
+                    bitmap = reduce(sub, lst_negative_bitmaps, bitmap)
+                    lst_negative = []
+                lst_positive = [("cursor", ArrayCursor(bitmap.doc_ids()))]+\
+                                    [child for child, child_bitmap in zip(lst_positive, lst_bitmaps) if child_bitmap is None]
+            return ArrayCursor(self.intersect(lst_positive, lst_negative))
+        if operator == "or":
+            bitmap = self.evaluate_bitmap(node)
+            if bitmap is not None:
+                return ArrayCursor(bitmap.doc_ids())
+            return ArrayCursor(self.union([self.evaluate(child) for child in node[1]]))
+        #NOT isolado: complemento em relação a todos os documentos indexados
+        return ArrayCursor(self.intersect([], [node[1]]))
+
+    def evaluate_bitmap(self, node) -> Bitmap:
+        #resultado do nó como bitmap, se todos os seus termos estiverem armazenados como bitmap (senão None)
+        operator = node[0]
+        if operator == "term":
+            return self.index.get_bitmap(node[1])
+        if operator == "or":
+            lst_bitmaps = [self.evaluate_bitmap(child) for child in node[1]]
+            return reduce(or_, lst_bitmaps, Bitmap()) if len(lst_bitmaps) > 0 and all(bitmap is not None for bitmap in lst_bitmaps) else None
+        if operator == "and":
+            lst_positive = [self.evaluate_bitmap(child) for child in node[1] if child[0] != "not"]
+            lst_negative = [self.evaluate_bitmap(child[1]) for child in node[1] if child[0] == "not"]
+            if len(lst_positive) == 0 or any(bitmap is None for bitmap in lst_positive+lst_negative):
+                return None
+            return reduce(sub, lst_negative, reduce(and_, lst_positive))
+        return None
+
+    def intersect(self, lst_positive, lst_negative) -> List[int]:
+        #começa pela menor lista: cada documento dela é procurado nas demais com advance
+        #(galloping), então o custo é proporcional ao tamanho da menor lista
+        lst_negative_cursors = [self.evaluate(child) for child in lst_negative]
+        if len(lst_positive) == 0:
+            lead = ArrayCursor(sorted(self.index.set_documents))
+            lst_cursors = []
+        else:
+            lst_cursors = sorted((self.evaluate(child) for child in lst_positive), key=len)
+            lead = lst_cursors.pop(0)
+
+        lst_result = []
+        doc_id = lead.doc_id
+        while doc_id is not None:
+            for cursor in lst_cursors:
+                cursor_doc_id = cursor.advance(doc_id)
+                if cursor_doc_id is None:
+                    return lst_result
+                if cursor_doc_id != doc_id:
+                    #o documento não está nesta lista: segue a partir do próximo candidato
+                    doc_id = lead.advance(cursor_doc_id)
+                    break
+            else:
+                if not any(cursor.advance(doc_id) == doc_id for cursor in lst_negative_cursors):
+                    lst_result.append(doc_id)
+                doc_id = lead.next()
+        return lst_result
+
+    def union(self, lst_cursors) -> List[int]:
+        lst_result = []
+        for doc_id in heapq.merge(*[cursor.doc_ids() for cursor in lst_cursors]):
+            if len(lst_result) == 0 or lst_result[-1] != doc_id:
+                lst_result.append(doc_id)
+        return lst_result
+
+
+class PhraseQuery(BooleanQuery):
+    #consultas por frase e por proximidade sobre um indice com posições (ver
+    #Index.get_positions_reader). Primeiro os documentos com todos os termos são obtidos
+    #pela interseção das listas de ocorrências; as posições são lidas apenas desses documentos
+    def phrase_terms(self, str_phrase:str) -> List[Tuple[str,int]]:
+        #(termo, posição na frase); os termos descartados pelo Cleaner mantêm a sua posição
+        lst_terms = []
+        for int_offset, term in enumerate(query_words(self.cleaner, str_phrase)):
+            if term is not None:
+                lst_terms.append((term, int_offset))
+        return lst_terms
+
+    def candidates(self, lst_terms:List[str]) -> Dict[int,Dict[str,List[int]]]:
+        #doc_id -> {termo: posições} dos documentos que contém todos os termos
+        lst_terms = list(dict.fromkeys(lst_terms))
+        self.dic_cursors = self.index.get_posting_cursors(lst_terms)
+        lst_doc_ids = self.intersect([("term", term) for term in lst_terms], [])
+        dic_readers = {term: self.index.get_positions_reader(term) for term in lst_terms}
+        return {doc_id: {term: reader.positions(doc_id) for term, reader in dic_readers.items()}
+                    for doc_id in lst_doc_ids}
+
+    def search(self, str_phrase:str, slop:int=0) -> List[int]:
+        #documentos em que os termos aparecem na ordem da frase; com slop > 0 a distância
+        #entre dois termos consecutivos pode variar em até slop posições
+        lst_terms = self.phrase_terms(str_phrase)
+        if len(lst_terms) == 0:
+            return []
+        return self.cached_search(("phrase", tuple(lst_terms), slop),
+                                    lambda: [doc_id for doc_id, dic_positions in self.candidates([term for term, _ in lst_terms]).items()
+                                                if self.match_phrase(lst_terms, dic_positions, slop)])
+
+    def search_near(self, str_terms:str, window:int) -> List[int]:
+        #documentos em que todos os termos (em qualquer ordem) aparecem em um trecho em que
+        #a distância entre o primeiro e o último é no máximo window posições
+        lst_terms = list(dict.fromkeys(term for term, _ in self.phrase_terms(str_terms)))
+        if len(lst_terms) == 0:
+            return []
+        return self.cached_search(("near", tuple(lst_terms), window),
+                                    lambda: [doc_id for doc_id, dic_positions in self.candidates(lst_terms).items()
+                                                if self.min_window(list(dic_positions.values())) <= window])
+
+    def cached_search(self, key, search) -> List[int]:
+        cache = self.index.query_cache
+        if cache is None:
+            return search()
+        lst_result = cache.get(key)
+        if lst_result is None:
+            lst_result = search()
+            cache.put(key, lst_result, result_size(lst_result))
+        return list(lst_result)
+
+    @staticmethod
+    def match_phrase(lst_terms:List[Tuple[str,int]], dic_positions:Dict[str,List[int]], slop:int) -> bool:
+        #posições alcançáveis por cada termo a partir de alguma posição válida do termo anterior
+        term, int_last_offset = lst_terms[0]
+        lst_reachable = dic_positions[term]
+        for term, int_offset in lst_terms[1:]:
+            int_gap = int_offset-int_last_offset
+            int_min_gap = max(int_gap-slop, 1)
+            int_max_gap = int_gap+slop
+            lst_next = []
+            for int_position in dic_positions[term]:
+                i = bisect_left(lst_reachable, int_position-int_max_gap)
+                if i < len(lst_reachable) and lst_reachable[i] <= int_position-int_min_gap:
+                    lst_next.append(int_position)
+            if len(lst_next) == 0:
+                return False
+            lst_reachable = lst_next
+            int_last_offset = int_offset
+        return len(lst_reachable) > 0
+
+    @staticmethod
+    def min_window(lst_positions:List[List[int]]) -> int:
+        #menor distância entre a primeira e a última posição de um trecho com todos os termos
+        #(percorre as listas como em um merge, avançando sempre a menor posição)
+        if any(len(lst) == 0 for lst in lst_positions):
+            return float("inf")
+        heap = [(lst[0], i, 0) for i, lst in enumerate(lst_positions)]
+        heapq.heapify(heap)
+        int_max = max(position for position, _, _ in heap)
+        int_best = float("inf")
+        while True:
+            int_min, i, int_pos = heapq.heappop(heap)
+            int_best = min(int_best, int_max-int_min)
+            if int_pos+1 == len(lst_positions[i]):
+                return int_best
+            int_next = lst_positions[i][int_pos+1]
+            int_max = max(int_max, int_next)
+            heapq.heappush(heap, (int_next, i, int_pos+1))
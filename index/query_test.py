@@ -0,0 +1,251 @@
+from index.structure import *
+from index.query import *
+from index.shard import ShardedIndex
+from index.indexer import Cleaner, HTMLIndexer
+import unittest
+import tempfile
+import re
+
+class SingularCleaner:
+    #Cleaner mínimo para os testes: remove o "s" final dos termos
+    perform_accents_removal = False
+    def preprocess_word(self, term:str) -> str:
+        return term[:-1] if term.endswith("s") else term
+
+    def text_words(self, text:str):
+        return [self.preprocess_word(term) for term in text.split()]
+
+class PunctuationCleaner(Cleaner):
+    #tokenização sem o punkt do nltk: a pontuação vira um token separado, como no word_tokenize
+    def tokenize(self, text:str):
+        return re.findall(r"\w+|[^\w\s]", text)
+
+def punctuation_cleaner() -> PunctuationCleaner:
+    return PunctuationCleaner(stop_words_file="stopwords.txt", language="portuguese",
+                              perform_stop_words_removal=True, perform_accents_removal=True,
+                              perform_stemming=True, html_engine="parser")
+
+class BooleanQueryTest(unittest.TestCase):
+    def create_index(self):
+        #casa: todos os documentos; verde: múltiplos de 3; vermelho: múltiplos de 5; raro: 30 e 60
+        for doc_id in range(1,301):
+            self.index.index("casa", doc_id, 1)
+            if doc_id % 3 == 0:
+                self.index.index("verde", doc_id, 2)
+            if doc_id % 5 == 0:
+                self.index.index("vermelho", doc_id, 1)
+            if doc_id in (30, 60):
+                self.index.index("raro", doc_id, 1)
+        self.index.finish_indexing()
+        self.query = BooleanQuery(self.index)
+
+    def setUp(self):
+        self.index = HashIndex()
+        self.create_index()
+
+    def test_and(self):
+        self.assertListEqual(self.query.search("verde AND vermelho"), list(range(15,301,15)))
+        self.assertListEqual(self.query.search("casa verde raro"), [30,60])
+        self.assertListEqual(self.query.search("raro xuxu"), [])
+
+    def test_or_not(self):
+        self.assertListEqual(self.query.search("raro OR vermelho"), list(range(5,301,5)))
+        self.assertListEqual(self.query.search("verde NOT casa"), [])
+        self.assertListEqual(self.query.search("vermelho AND NOT (verde OR raro)"), [doc_id for doc_id in range(5,301,5) if doc_id % 3 != 0])
+        self.assertListEqual(self.query.search("NOT casa"), [])
+
+    def test_wildcard(self):
+        self.assertListEqual(self.query.search("verd*"), list(range(3,301,3)))
+        self.assertListEqual(self.query.search("ver*"), [doc_id for doc_id in range(1,301) if doc_id % 3 == 0 or doc_id % 5 == 0])
+        self.assertListEqual(self.query.search("v?rde AND ra*"), [30,60])
+        self.assertListEqual(self.query.search("casa xu*"), [], "Um padrão sem nenhum termo não casa com nenhum documento")
+
+    def test_invalid_query(self):
+        self.assertRaises(ValueError, self.query.search, "casa AND")
+        self.assertRaises(ValueError, self.query.search, "(casa verde")
+
+    def test_cursor_advance(self):
+        cursor = self.index.get_posting_cursor("verde")
+        self.assertEqual(len(cursor), 100)
+        self.assertEqual(cursor.advance(100), 102)
+        self.assertEqual(cursor.term_freq(), 2)
+        self.assertEqual(cursor.advance(50), 102, "O cursor não deve voltar")
+        self.assertIsNone(cursor.advance(301))
+
+class FrozenHashBooleanQueryTest(BooleanQueryTest):
+    def setUp(self):
+        self.index = HashIndex(frozen=True)
+        self.create_index()
+
+class FileBooleanQueryTest(BooleanQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"))
+        self.create_index()
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+class CompressedBooleanQueryTest(FileBooleanQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"), compressed=True)
+        self.create_index()
+
+class CachedBooleanQueryTest(FileBooleanQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"),
+                               cache_bytes=1<<16, query_cache_bytes=1<<16)
+        self.create_index()
+
+    def test_query_cache(self):
+        lst_result = self.query.search("verde AND vermelho")
+        lst_result.append(-1)
+        self.assertListEqual(self.query.search("verde AND vermelho"), list(range(15,301,15)),
+                             "Alterar o resultado retornado não pode alterar o cache")
+        self.assertEqual(self.index.cache_info["queries"]["hits"], 1)
+
+        #um novo indice (finish_indexing/open_idx_file) invalida os resultados armazenados
+        self.index.open_idx_file()
+        self.query.search("verde AND vermelho")
+        self.assertEqual(self.index.cache_info["queries"]["hits"], 1)
+
+    def test_query_cache_cleaner(self):
+        #a mesma consulta com Cleaners diferentes não pode compartilhar o resultado
+        self.assertListEqual(BooleanQuery(self.index, SingularCleaner()).search("verdes AND vermelhos"), list(range(15,301,15)))
+        self.assertListEqual(BooleanQuery(self.index).search("verdes AND vermelhos"), [])
+        self.assertListEqual(self.query.search("verde AND vermelho"), list(range(15,301,15)))
+        self.assertEqual(self.index.cache_info["queries"]["hits"], 1, "Consultas com os mesmos termos normalizados usam o cache")
+
+class BitmapBooleanQueryTest(FileBooleanQueryTest):
+    def setUp(self):
+        #casa, verde e vermelho em bitmap; raro como lista
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"), bitmap_threshold=50)
+        self.create_index()
+
+    def test_bitmap_terms(self):
+        self.assertListEqual([self.index.has_bitmap(term) for term in ["casa","verde","vermelho","raro"]], [True,True,True,False])
+
+class FrozenLexiconBooleanQueryTest(FileBooleanQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"), frozen_lexicon=True)
+        self.create_index()
+
+class ShardedBooleanQueryTest(FileBooleanQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = ShardedIndex(3, self.tmp_dir.name, batch_size=50)
+        self.create_index()
+
+class PhraseQueryTest(unittest.TestCase):
+    def index_words(self, doc_id, lst_words):
+        dic_positions = {}
+        for int_position, word in enumerate(lst_words):
+            dic_positions.setdefault(word, []).append(int_position)
+        for term, lst_positions in dic_positions.items():
+            self.index.index(term, doc_id, len(lst_positions), lst_positions)
+
+    def create_index(self):
+        #pares: "casa verde"; múltiplos de 3: "verde casa"; múltiplos de 5: "casa" e "verde" a 4 posições
+        for doc_id in range(1,101):
+            lst_words = ["inicio"]
+            if doc_id % 2 == 0:
+                lst_words += "casa verde grande".split()
+            if doc_id % 3 == 0:
+                lst_words += "verde casa um".split()
+            if doc_id % 5 == 0:
+                lst_words += "casa muito bonita e verde".split()
+            self.index_words(doc_id, lst_words)
+        self.index.finish_indexing()
+        self.query = PhraseQuery(self.index)
+
+    def setUp(self):
+        self.index = HashIndex()
+        self.create_index()
+
+    def test_phrase(self):
+        self.assertListEqual(self.query.search("casa verde"), list(range(2,101,2)))
+        self.assertListEqual(self.query.search("verde casa"), list(range(3,101,3)))
+        self.assertListEqual(self.query.search("inicio casa verde grande"), list(range(2,101,2)))
+        self.assertListEqual(self.query.search("casa xuxu"), [])
+        self.assertListEqual(self.query.search(""), [])
+
+    def test_slop(self):
+        self.assertListEqual(self.query.search("casa verde", slop=3),
+                             [doc_id for doc_id in range(1,101) if doc_id % 2 == 0 or doc_id % 5 == 0])
+        self.assertListEqual(self.query.search("casa verde", slop=2), list(range(2,101,2)))
+
+    def test_near(self):
+        self.assertListEqual(self.query.search_near("verde casa", 1),
+                             [doc_id for doc_id in range(1,101) if doc_id % 2 == 0 or doc_id % 3 == 0])
+        self.assertListEqual(self.query.search_near("verde casa", 4),
+                             [doc_id for doc_id in range(1,101) if doc_id % 2 == 0 or doc_id % 3 == 0 or doc_id % 5 == 0])
+
+class FilePhraseQueryTest(PhraseQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, positional=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"))
+        #vários runs, para intercalar também as posições
+        self.index.TMP_OCCURRENCES_LIMIT = 50
+        self.create_index()
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+    def test_open(self):
+        str_lexicon_file = self.index.save()
+        obj_index = FileIndex.open(str_lexicon_file)
+        self.assertListEqual(PhraseQuery(obj_index).search("verde casa"), list(range(3,101,3)),
+                             "As posições devem ser lidas do arquivo ao lado do indice reaberto")
+        obj_index.close()
+
+    def test_query_cache_cleaner(self):
+        obj_index = FileIndex.open(self.index.save(), query_cache_bytes=1<<16)
+        self.assertListEqual(PhraseQuery(obj_index, SingularCleaner()).search("verdes casas"), list(range(3,101,3)))
+        self.assertListEqual(PhraseQuery(obj_index).search("verdes casas"), [])
+        self.assertListEqual(PhraseQuery(obj_index, SingularCleaner()).search_near("casas verdes", 4), PhraseQuery(obj_index).search_near("casa verde", 4))
+        self.assertListEqual(PhraseQuery(obj_index).search_near("casas verdes", 4), [])
+        obj_index.close()
+
+    def test_no_positions(self):
+        self.assertRaises(ValueError, FileIndex, positional=True)
+        obj_index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"sem_posicoes"))
+        self.assertRaises(ValueError, obj_index.index, "casa", 1, 1, [0])
+        obj_index.index("casa", 1, 1)
+        obj_index.finish_indexing()
+        self.assertRaises(ValueError, PhraseQuery(obj_index).search, "casa verde")
+        obj_index.close()
+
+class PunctuatedPhraseQueryTest(unittest.TestCase):
+    def setUp(self):
+        #consultas e documentos com pontuação junto às palavras: os termos e as posições
+        #da consulta devem ser os mesmos da indexação
+        self.cleaner = punctuation_cleaner()
+        self.index = HashIndex()
+        indexer = HTMLIndexer(self.index, positional=True, cleaner=self.cleaner)
+        indexer.index_text(1, "<p>A casa, verde e grande.</p>")
+        indexer.index_text(2, "<p>Casa azul; verde!</p>")
+        self.index.finish_indexing()
+
+    def test_punctuation(self):
+        query = PhraseQuery(self.index, self.cleaner)
+        self.assertListEqual(query.search("casa, verde"), [1], "A vírgula ocupa uma posição, como na indexação")
+        self.assertListEqual(query.search("casas verdes"), [], "Sem a vírgula, os termos não são adjacentes")
+        self.assertListEqual(query.search("verde e grande."), [1])
+        self.assertListEqual(query.search("Casa azul; verde!"), [2])
+        self.assertListEqual(query.search_near("casa, verde", 3), [1,2])
+
+class CompressedPhraseQueryTest(FilePhraseQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, positional=True, compressed=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"))
+        self.index.TMP_OCCURRENCES_LIMIT = 50
+        self.create_index()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+from typing import List, Tuple
+import heapq
+import math
+
+from .structure import Index
+from .cache import result_size
+from .query import query_words
+
+
+class BM25:
+    def __init__(self, index:Index, k1:float=1.2, b:float=0.75):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = index.average_document_length or 1.0
+
+    def cache_key(self) -> tuple:
+        #identifica o scorer e os seus parâmetros na chave do cache de consultas
+        return ("BM25", self.k1, self.b)
+
+    def idf(self, term:str, int_df:int=None) -> float:
+        #int_df: df já obtido do indice (ex.: de vários termos de uma vez, em search_batch)
+        if int_df is None:
+            int_df = self.index.document_count_with_term(term)
+        return math.log(1+(self.index.document_count-int_df+0.5)/(int_df+0.5))
+
+    def score(self, idf:float, term_freq:int, doc_id:int) -> float:
+        norm = self.k1*(1-self.b+self.b*self.index.document_length(doc_id)/self.avg_doc_length)
+        return idf*term_freq*(self.k1+1)/(term_freq+norm)
+
+    def score_array(self, idf:float, arr_term_freqs, arr_doc_lengths):
+        #score de todas as ocorrências de um termo (arrays NumPy), ver RankedQuery.search_batch
+        arr_norm = self.k1*(1-self.b+self.b*arr_doc_lengths/self.avg_doc_length)
+        return idf*arr_term_freqs*(self.k1+1)/(arr_term_freqs+arr_norm)
+
+    def upper_bound(self, idf:float, term:str) -> float:
+        #maior score possível do termo: maior term_freq com o menor tamanho de documento (zero)
+        max_term_freq = self.index.max_term_freq(term)
+        return idf*max_term_freq*(self.k1+1)/(max_term_freq+self.k1*(1-self.b))
+
+
+class TfIdf:
+    def __init__(self, index:Index):
+        self.index = index
+
+    def cache_key(self) -> tuple:
+        return ("TfIdf",)
+
+    def idf(self, term:str, int_df:int=None) -> float:
+        if int_df is None:
+            int_df = self.index.document_count_with_term(term)
+        return math.log(self.index.document_count/int_df) if int_df > 0 else 0.0
+
+    def score(self, idf:float, term_freq:int, doc_id:int) -> float:
+        return (1+math.log(term_freq))*idf if term_freq > 0 else 0.0
+
+    def score_array(self, idf:float, arr_term_freqs, arr_doc_lengths):
+        import numpy as np
+        return (1+np.log(arr_term_freqs))*idf
+
+    def upper_bound(self, idf:float, term:str) -> float:
+        return self.score(idf, self.index.max_term_freq(term), None)
+
+
+class RankedQuery:
+    #busca top-k document-at-a-time com poda dinâmica (WAND): cada termo tem um limite
+    #superior de score (calculado a partir do max_term_freq armazenado no finish_indexing)
+    #e só são avaliados os documentos cuja soma dos limites pode superar o k-ésimo score
+    def __init__(self, index:Index, scorer=None, cleaner=None):
+        self.index = index
+        self.scorer = scorer if scorer is not None else BM25(index)
+        self.cleaner = cleaner
+        #quantidade de documentos avaliados na última busca
+        self.int_scored_docs = 0
+
+    def query_terms(self, query) -> List[str]:
+        #query: texto (tokenizado como na indexação, ver query.query_words) ou lista de termos
+        if isinstance(query, str):
+            lst_terms = query_words(self.cleaner, query)
+        elif self.cleaner is not None:
+            lst_terms = self.cleaner.preprocess_words(list(query))
+        else:
+            lst_terms = list(query)
+        return list(dict.fromkeys(term for term in lst_terms if term is not None))
+
+    def search(self, query, k:int=10) -> List[Tuple[int,float]]:
+        #lista de (doc_id, score) em ordem decrescente de score
+        lst_query_terms = self.query_terms(query)
+        cache = self.index.query_cache
+        if cache is not None:
+            key = ("ranked", self.scorer.cache_key(), tuple(lst_query_terms), k)
+            lst_result = cache.get(key)
+            if lst_result is not None:
+                return list(lst_result)
+            lst_result = self.search_terms(lst_query_terms, k)
+            cache.put(key, lst_result, result_size(lst_result))
+            return list(lst_result)
+        return self.search_terms(lst_query_terms, k)
+
+    def search_terms(self, lst_query_terms:List[str], k:int) -> List[Tuple[int,float]]:
+        self.int_scored_docs = 0
+        if k <= 0:
+            return []
+        lst_query_terms = [term for term in lst_query_terms if self.index.document_count_with_term(term) > 0]
+        dic_cursors = self.index.get_posting_cursors(lst_query_terms)
+        lst_terms = [(dic_cursors[term], self.scorer.idf(term), term) for term in lst_query_terms]
+        lst_cursors = [[cursor, idf, self.scorer.upper_bound(idf, term)] for cursor, idf, term in lst_terms]
+
+        lst_heap = []
+        threshold = float("-inf")
+        while True:
+            lst_cursors = [cursor for cursor in lst_cursors if cursor[0].doc_id is not None]
+            lst_cursors.sort(key=lambda cursor: cursor[0].doc_id)
+
+            #pivô: primeiro cursor em que a soma dos limites superiores supera o limiar
+            pivot_doc_id = None
+            sum_upper_bound = 0.0
+            for cursor, idf, upper_bound in lst_cursors:
+                sum_upper_bound += upper_bound
+                if sum_upper_bound > threshold:
+                    pivot_doc_id = cursor.doc_id
+                    break
+            if pivot_doc_id is None:
+                break
+
+            if lst_cursors[0][0].doc_id == pivot_doc_id:
+                self.int_scored_docs += 1
+                score = 0.0
+                for cursor, idf, upper_bound in lst_cursors:
+                    if cursor.doc_id != pivot_doc_id:
+                        break
+                    score += self.scorer.score(idf, cursor.term_freq(), pivot_doc_id)
+                    cursor.next()
+                if len(lst_heap) < k:
+                    heapq.heappush(lst_heap, (score, -pivot_doc_id))
+                elif score > lst_heap[0][0]:
+                    heapq.heapreplace(lst_heap, (score, -pivot_doc_id))
+                if len(lst_heap) == k:
+                    threshold = lst_heap[0][0]
+            else:
+                #os documentos antes do pivô não podem entrar no top-k: pula direto para ele
+                for cursor, idf, upper_bound in lst_cursors:
+                    if cursor.doc_id >= pivot_doc_id:
+                        break
+                    cursor.advance(pivot_doc_id)
+
+        return [(-neg_doc_id, score) for score, neg_doc_id in sorted(lst_heap, key=lambda item: (-item[0], -item[1]))]
+
+    def search_exhaustive(self, query, k:int=10) -> List[Tuple[int,float]]:
+        #avalia todas as ocorrências (sem poda); útil para conferir o resultado de search
+        dic_scores = {}
+        for term in self.query_terms(query):
+            if self.index.document_count_with_term(term) == 0:
+                continue
+            idf = self.scorer.idf(term)
+            for doc_id, term_freq in self.index.get_posting_cursor(term):
+                dic_scores[doc_id] = dic_scores.get(doc_id, 0.0)+self.scorer.score(idf, term_freq, doc_id)
+        return heapq.nsmallest(k, ((doc_id, score) for doc_id, score in dic_scores.items()), key=lambda item: (-item[1], item[0]))
+
+    def search_batch(self, lst_queries, k:int=10) -> List[List[Tuple[int,float]]]:
+        #avalia várias consultas de uma vez (ex.: avaliação offline), sem poda e com NumPy:
+        #as ocorrências de cada termo distinto do lote são lidas e pontuadas uma única vez e
+        #compartilhadas entre as consultas. Os scores de cada consulta são somados por documento
+        #com np.bincount e o top-k é obtido com np.argpartition (mesmo resultado de search_exhaustive).
+        #O df e as ocorrências de todos os termos são pedidos ao indice de uma vez (no ShardedIndex,
+        #uma requisição por shard e não uma por termo)
+        import numpy as np
+        lst_query_terms = [self.query_terms(query) for query in lst_queries]
+        dic_df = self.index.document_counts_with_terms(list(dict.fromkeys(term for lst_terms in lst_query_terms for term in lst_terms)))
+        dic_postings = {term: (np.asarray(arr_doc_ids, dtype=np.int64), np.asarray(arr_term_freqs, dtype=np.float64))
+                            for term, (arr_doc_ids, arr_term_freqs) in
+                                self.index.get_posting_arrays_batch([term for term, int_df in dic_df.items() if int_df > 0]).items()}
+        if len(dic_postings) == 0:
+            return [[] for _ in lst_query_terms]
+
+        arr_doc_lengths = self.document_lengths(np.unique(np.concatenate([arr_doc_ids for arr_doc_ids, _ in dic_postings.values()])))
+        dic_scores = {term: (arr_doc_ids, self.scorer.score_array(self.scorer.idf(term, dic_df[term]), arr_term_freqs, arr_doc_lengths[arr_doc_ids]))
+                        for term, (arr_doc_ids, arr_term_freqs) in dic_postings.items()}
+
+        lst_results = []
+        for lst_terms in lst_query_terms:
+            lst_term_scores = [dic_scores[term] for term in lst_terms if term in dic_scores]
+            if len(lst_term_scores) == 0:
+                lst_results.append([])
+                continue
+            arr_doc_ids = np.concatenate([arr_doc_ids for arr_doc_ids, _ in lst_term_scores])
+            arr_scores = np.bincount(arr_doc_ids, weights=np.concatenate([arr_scores for _, arr_scores in lst_term_scores]),
+                                     minlength=len(arr_doc_lengths))
+            arr_candidates = np.unique(arr_doc_ids)
+            lst_results.append(self.top_k(arr_candidates, arr_scores[arr_candidates], k))
+        return lst_results
+
+    def document_lengths(self, arr_doc_ids):
+        #tamanho de cada documento, indexado pelo doc_id (arr_doc_ids: doc_ids ordenados)
+        import numpy as np
+        arr_doc_lengths = np.zeros(int(arr_doc_ids[-1])+1, dtype=np.float64)
+        arr_statistics = self.index.statistics.arr_doc_length
+        if len(arr_statistics) > 0:
+            arr_statistics = np.frombuffer(arr_statistics, dtype=np.uint32)[:len(arr_doc_lengths)]
+            arr_doc_lengths[:len(arr_statistics)] = arr_statistics
+        else:
+            #indices sem CollectionStatistics (ex.: SegmentedIndex): um documento de cada vez
+            arr_doc_lengths[arr_doc_ids] = [self.index.document_length(doc_id) for doc_id in arr_doc_ids.tolist()]
+        return arr_doc_lengths
+
+    @staticmethod
+    def top_k(arr_doc_ids, arr_scores, k:int) -> List[Tuple[int,float]]:
+        #os k maiores scores (empates pelo menor doc_id) sem ordenar todos os documentos
+        import numpy as np
+        if k <= 0:
+            return []
+        if len(arr_scores) > k:
+            threshold = arr_scores[np.argpartition(-arr_scores, k-1)[:k]].min()
+            arr_selected = np.flatnonzero(arr_scores >= threshold)
+        else:
+            arr_selected = np.arange(len(arr_scores))
+        arr_order = arr_selected[np.lexsort((arr_doc_ids[arr_selected], -arr_scores[arr_selected]))][:k]
+        return [(doc_id, score) for doc_id, score in zip(arr_doc_ids[arr_order].tolist(), arr_scores[arr_order].tolist())]
@@ -0,0 +1,140 @@
+from index.structure import *
+from index.ranking import *
+from index.shard import ShardedIndex
+from index.indexer import HTMLIndexer
+from index.query_test import punctuation_cleaner
+import unittest
+import tempfile
+from random import randrange, seed
+
+class RankedQueryTest(unittest.TestCase):
+    NUM_DOCS = 2000
+
+    def create_index(self):
+        seed(10)
+        lst_vocabulary = [f"termo{i}" for i in range(200)]
+        for doc_id in range(1, RankedQueryTest.NUM_DOCS+1):
+            #distribuição desigual: termos com índice baixo aparecem em muito mais documentos
+            set_terms = {lst_vocabulary[min(randrange(0,200), randrange(0,200), randrange(0,200))] for _ in range(30)}
+            for term in sorted(set_terms):
+                self.index.index(term, doc_id, randrange(1,6))
+        self.index.finish_indexing()
+
+    def setUp(self):
+        self.index = HashIndex()
+        self.create_index()
+
+    def check_queries(self, scorer):
+        ranked_query = RankedQuery(self.index, scorer)
+        for query in ["termo0 termo150", "termo1 termo2 termo3", "termo199", "termo5 termo80 termo120 xuxu", "xuxu"]:
+            lst_result = ranked_query.search(query, k=10)
+            lst_expected = ranked_query.search_exhaustive(query, k=10)
+            self.assertListEqual([doc_id for doc_id, _ in lst_result], [doc_id for doc_id, _ in lst_expected], f"Resultado incorreto para a consulta '{query}'")
+            [self.assertAlmostEqual(score, expected_score) for (_, score), (_, expected_score) in zip(lst_result, lst_expected)]
+
+    def test_bm25(self):
+        self.check_queries(BM25(self.index))
+
+    def test_tfidf(self):
+        self.check_queries(TfIdf(self.index))
+
+    def test_search_batch(self):
+        lst_queries = ["termo0 termo150", "termo1 termo2 termo3", "termo199", "termo5 termo80 termo120 xuxu", "xuxu",
+                       "termo1 termo150 termo3"]
+        for scorer in [BM25(self.index), TfIdf(self.index)]:
+            ranked_query = RankedQuery(self.index, scorer)
+            for query, lst_result in zip(lst_queries, ranked_query.search_batch(lst_queries, k=10)):
+                lst_expected = ranked_query.search_exhaustive(query, k=10)
+                self.assertListEqual([doc_id for doc_id, _ in lst_result], [doc_id for doc_id, _ in lst_expected],
+                                     f"Resultado incorreto para a consulta '{query}' ({type(scorer).__name__})")
+                [self.assertAlmostEqual(score, expected_score) for (_, score), (_, expected_score) in zip(lst_result, lst_expected)]
+        self.assertListEqual(RankedQuery(self.index).search_batch([]), [])
+
+    def test_empty_k(self):
+        ranked_query = RankedQuery(self.index)
+        for k in [0, -1]:
+            self.assertListEqual(ranked_query.search("termo0 termo1", k=k), [])
+            self.assertListEqual(ranked_query.search_exhaustive("termo0 termo1", k=k), [])
+            self.assertListEqual(ranked_query.search_batch(["termo0 termo1"], k=k), [[]])
+
+    def test_pruning(self):
+        #termo frequente + termo raro (com pelo menos k documentos): depois que o top-k é preenchido
+        #pelos documentos do termo raro, os documentos que só têm o termo frequente são pulados
+        str_rare_term = min((term for term in self.index.vocabulary if self.index.document_count_with_term(term) >= 10),
+                            key=self.index.document_count_with_term)
+        ranked_query = RankedQuery(self.index)
+        ranked_query.search(f"termo0 {str_rare_term}", k=5)
+        int_candidates = len(set(self.index.get_posting_cursor("termo0").doc_ids()) | set(self.index.get_posting_cursor(str_rare_term).doc_ids()))
+        self.assertLess(ranked_query.int_scored_docs, int_candidates/2, "A poda deveria evitar avaliar a maioria dos documentos")
+
+class FrozenHashRankedQueryTest(RankedQueryTest):
+    def setUp(self):
+        self.index = HashIndex(frozen=True)
+        self.create_index()
+
+class FileRankedQueryTest(RankedQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"), compressed=True)
+        self.create_index()
+
+    def tearDown(self):
+        self.index.close()
+        self.tmp_dir.cleanup()
+
+class CachedRankedQueryTest(FileRankedQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"), compressed=True,
+                               cache_bytes=1<<20, query_cache_bytes=1<<16)
+        self.create_index()
+
+    def test_query_cache_scorer(self):
+        #scorers com parâmetros diferentes não podem compartilhar resultados no cache
+        for scorer in [BM25(self.index), BM25(self.index, k1=2.0), BM25(self.index, b=0.1), TfIdf(self.index)]:
+            ranked_query = RankedQuery(self.index, scorer)
+            lst_result = ranked_query.search("termo1 termo150", k=10)
+            lst_expected = ranked_query.search_exhaustive("termo1 termo150", k=10)
+            self.assertListEqual([doc_id for doc_id, _ in lst_result], [doc_id for doc_id, _ in lst_expected])
+            [self.assertAlmostEqual(score, expected_score) for (_, score), (_, expected_score) in zip(lst_result, lst_expected)]
+        self.assertEqual(self.index.cache_info["queries"]["hits"], 0)
+
+class PunctuatedRankedQueryTest(unittest.TestCase):
+    def test_punctuation(self):
+        #a consulta é tokenizada como na indexação: "verde!" e "casa," são "verd" e "cas"
+        cleaner = punctuation_cleaner()
+        obj_index = HashIndex()
+        indexer = HTMLIndexer(obj_index, cleaner=cleaner)
+        indexer.index_text(1, "<p>A casa, verde e grande.</p>")
+        indexer.index_text(2, "<p>Casa azul; verde!</p>")
+        indexer.index_text(3, "<p>Outro documento.</p>")
+        obj_index.finish_indexing()
+        ranked_query = RankedQuery(obj_index, BM25(obj_index), cleaner)
+        self.assertListEqual(ranked_query.query_terms("casa, verde!"), ["cas", "verd"])
+        self.assertListEqual(sorted(doc_id for doc_id, _ in ranked_query.search("casa, verde!", k=10)), [1,2])
+
+class BitmapRankedQueryTest(FileRankedQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = FileIndex(spimi=True, file_prefix=os.path.join(self.tmp_dir.name,"occur_index"), compressed=True,
+                               bitmap_threshold=500)
+        self.create_index()
+
+class ShardedRankedQueryTest(FileRankedQueryTest):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.index = ShardedIndex(3, self.tmp_dir.name, batch_size=1000, compressed=True)
+        self.create_index()
+
+    def test_search_batch_requests(self):
+        #uma requisição de df e uma de ocorrências por shard, para o lote inteiro
+        lst_commands = []
+        for shard in self.index.lst_shards:
+            send = shard.send
+            shard.send = lambda str_command, args=None, send=send: (lst_commands.append(str_command), send(str_command, args))
+        RankedQuery(self.index).search_batch([f"termo{i} termo{i+50}" for i in range(40)], k=5)
+        self.assertLessEqual(lst_commands.count("postings"), 3)
+        self.assertLessEqual(lst_commands.count("document_count_with_term"), 3)
+
+if __name__ == "__main__":
+    unittest.main()
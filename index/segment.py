@@ -0,0 +1,378 @@
+from typing import List
+from array import array
+from math import log
+from threading import Thread, RLock
+import heapq
+import json
+import os
+
+from .structure import Index, FileIndex, TermOccurrence
+from .cursor import PostingCursor, ArrayCursor, PositionsReader
+
+#arquivo (json) com a lista de segmentos ativos, na ordem em que foram criados
+MANIFEST_FILE_NAME = "segments.json"
+
+
+def is_tombstone(tombstones, doc_id:int) -> bool:
+    #bit do documento no bitset de remoções
+    int_byte = doc_id >> 3
+    return int_byte < len(tombstones) and (tombstones[int_byte] >> (doc_id & 7)) & 1 == 1
+
+
+class Segment:
+    #segmento imutável: um FileIndex já finalizado (léxico + ocorrências + estatísticas)
+    #e um bitset (por doc_id) dos documentos removidos depois da sua criação
+    def __init__(self, obj_index:FileIndex, str_lexicon_file:str, tombstones:bytearray=None):
+        self.index = obj_index
+        self.str_lexicon_file = str_lexicon_file
+        self.tombstones = tombstones if tombstones is not None else bytearray()
+        self.int_deleted = sum(bin(byte).count("1") for byte in self.tombstones)
+
+    @property
+    def tombstone_file_name(self) -> str:
+        return f"{os.path.splitext(self.str_lexicon_file)[0]}.del"
+
+    @classmethod
+    def open(cls, str_lexicon_file:str) -> "Segment":
+        segment = cls(FileIndex.open(str_lexicon_file), str_lexicon_file)
+        if os.path.exists(segment.tombstone_file_name):
+            with open(segment.tombstone_file_name, "rb") as file:
+                segment.tombstones = bytearray(file.read())
+            segment.int_deleted = sum(bin(byte).count("1") for byte in segment.tombstones)
+        return segment
+
+    def is_deleted(self, doc_id:int) -> bool:
+        return is_tombstone(self.tombstones, doc_id)
+
+    def delete(self, doc_id:int) -> bool:
+        #marca o documento como removido (se estiver no segmento e ainda não removido)
+        if doc_id not in self.index.set_documents or self.is_deleted(doc_id):
+            return False
+        int_byte = doc_id >> 3
+        if int_byte >= len(self.tombstones):
+            self.tombstones.extend(bytes(int_byte+1-len(self.tombstones)))
+        self.tombstones[int_byte] |= 1 << (doc_id & 7)
+        self.int_deleted += 1
+        return True
+
+    @property
+    def live_document_count(self) -> int:
+        return self.index.document_count-self.int_deleted
+
+    def live_documents(self):
+        return (doc_id for doc_id in self.index.set_documents if not self.is_deleted(doc_id))
+
+    def live_tokens(self) -> int:
+        #total de termos dos documentos não removidos
+        if self.int_deleted == 0:
+            return self.index.total_tokens
+        return self.index.total_tokens-sum(self.index.document_length(doc_id) for doc_id in self.index.set_documents
+                                                if self.is_deleted(doc_id))
+
+    def iter_postings(self, term:str):
+        #(doc_id, term_freq) do termo, ignorando os documentos removidos
+        for doc_id, term_freq in self.index.get_posting_cursor(term):
+            if not self.is_deleted(doc_id):
+                yield doc_id, term_freq
+
+    def iter_positional_postings(self, term:str):
+        #(doc_id, term_freq, posições) do termo, ignorando os documentos removidos
+        reader = self.index.get_positions_reader(term)
+        for doc_id, term_freq in self.iter_postings(term):
+            yield doc_id, term_freq, reader.positions(doc_id)
+
+    def save_tombstones(self):
+        if self.int_deleted > 0:
+            with open(self.tombstone_file_name, "wb") as file:
+                file.write(self.tombstones)
+
+    def remove_files(self):
+        #o mmap não é fechado aqui: consultas concorrentes ainda podem estar lendo o segmento
+        #(o arquivo removido continua acessível até o mmap ser coletado)
+        str_idx_file = self.index.str_idx_file_name
+        for str_file in (str_idx_file, f"{str_idx_file}.pos", f"{str_idx_file}.posidx", self.str_lexicon_file,
+                            self.tombstone_file_name, FileIndex.statistics_file_name(self.str_lexicon_file)):
+            if os.path.exists(str_file):
+                os.remove(str_file)
+
+
+class SegmentedIndex(Index):
+    #indice incremental: os documentos novos são indexados em um FileIndex em memória
+    #que, no commit (ou ao atingir max_segment_docs documentos), vira um segmento
+    #imutável no diretório. Remoções só marcam o documento no bitset do segmento e
+    #as consultas combinam as listas de todos os segmentos. Segmentos pequenos são
+    #intercalados (em uma thread, se background_merge) pela política em camadas:
+    #quando existem merge_factor segmentos na mesma camada (tamanho ~ max_segment_docs*merge_factor^camada)
+    #eles viram um único segmento, sem os documentos removidos
+    def __init__(self, str_dir:str, max_segment_docs:int=1000, merge_factor:int=4,
+                        compressed:bool=False, background_merge:bool=True, memory_budget:int=None,
+                        positional:bool=False):
+        super().__init__()
+        self.str_dir = str_dir
+        self.max_segment_docs = max_segment_docs
+        self.merge_factor = merge_factor
+        self.compressed = compressed
+        self.background_merge = background_merge
+        #orçamento de memória de cada FileIndex usado na escrita (ver FileIndex.memory_budget)
+        self.memory_budget = memory_budget
+        #segmentos com as posições dos termos (FileIndex posicionais), para consultas por frase
+        self.positional = positional
+
+        self.lst_segments = []
+        self.int_segment_counter = 0
+        self.writer = None
+        #documentos removidos que ainda estão no writer: viram tombstones do segmento no commit
+        self.set_writer_deletes = set()
+        self.merge_thread = None
+        #protege a lista de segmentos e os bitsets (consultas, remoções e a troca feita pelo merge)
+        self.lock = RLock()
+
+        os.makedirs(str_dir, exist_ok=True)
+        if os.path.exists(self.manifest_file_name):
+            self.load_manifest()
+
+    @property
+    def manifest_file_name(self) -> str:
+        return os.path.join(self.str_dir, MANIFEST_FILE_NAME)
+
+    def load_manifest(self):
+        with open(self.manifest_file_name) as file:
+            dic_manifest = json.load(file)
+        self.int_segment_counter = dic_manifest["segment_counter"]
+        self.lst_segments = [Segment.open(os.path.join(self.str_dir, str_file)) for str_file in dic_manifest["segments"]]
+        for segment in self.lst_segments:
+            self.set_documents.update(segment.live_documents())
+            for term in segment.index.vocabulary:
+                self.add_term(term)
+
+    def save_manifest(self):
+        #grava em um arquivo temporário e renomeia: o manifesto nunca fica pela metade
+        str_tmp_file = f"{self.manifest_file_name}.tmp"
+        with open(str_tmp_file, "w") as file:
+            json.dump({"segment_counter": self.int_segment_counter,
+                       "segments": [os.path.relpath(segment.str_lexicon_file, self.str_dir) for segment in self.lst_segments]},
+                      file, indent=4)
+        os.replace(str_tmp_file, self.manifest_file_name)
+
+    def add_term(self, term:str) -> int:
+        #term_id global (os segmentos possuem term_ids próprios)
+        if term not in self.dic_index:
+            self.autoIncrement += 1
+            self.dic_index[term] = self.autoIncrement
+        return self.dic_index[term]
+
+    def new_file_index(self) -> FileIndex:
+        #o writer e o merge (em outra thread) não podem receber o mesmo prefixo de arquivo
+        with self.lock:
+            self.int_segment_counter += 1
+            str_file_prefix = os.path.join(self.str_dir, f"segment_{self.int_segment_counter}")
+        return FileIndex(spimi=True, compressed=self.compressed, memory_budget=self.memory_budget, positional=self.positional,
+                            file_prefix=str_file_prefix)
+
+    def index(self, term:str, doc_id:int, term_freq:int, positions:List[int]=None):
+        if positions is not None and not self.positional:
+            raise ValueError("O indice não armazena posições (use SegmentedIndex(positional=True))")
+        if doc_id in self.set_writer_deletes:
+            #a versão removida ainda está no writer: vira segmento (com o tombstone) antes da nova
+            self.commit()
+        if self.writer is None:
+            self.writer = self.new_file_index()
+        if doc_id not in self.writer.set_documents:
+            if len(self.writer.set_documents) >= self.max_segment_docs:
+                self.commit()
+                self.writer = self.new_file_index()
+            #reindexar um documento substitui a versão dos segmentos anteriores
+            self.delete_document(doc_id)
+        self.add_term(term)
+        if positions is None:
+            self.writer.index(term, doc_id, term_freq)
+        else:
+            self.writer.index(term, doc_id, term_freq, positions)
+        self.set_documents.add(doc_id)
+
+    def delete_document(self, doc_id:int) -> bool:
+        with self.lock:
+            bol_deleted = False
+            for segment in self.lst_segments:
+                bol_deleted = segment.delete(doc_id) or bol_deleted
+            if self.writer is not None and doc_id in self.writer.set_documents and doc_id not in self.set_writer_deletes:
+                self.set_writer_deletes.add(doc_id)
+                bol_deleted = True
+            self.set_documents.discard(doc_id)
+            return bol_deleted
+
+    def commit(self):
+        #transforma os documentos em memória em um novo segmento e grava as remoções
+        with self.lock:
+            if self.writer is not None and len(self.writer.set_documents) > 0:
+                self.writer.finish_indexing()
+                str_lexicon_file = self.writer.save()
+                segment = Segment(self.writer, str_lexicon_file)
+                for doc_id in self.set_writer_deletes:
+                    segment.delete(doc_id)
+                self.lst_segments.append(segment)
+            self.writer = None
+            self.set_writer_deletes = set()
+            for segment in self.lst_segments:
+                segment.save_tombstones()
+            self.save_manifest()
+        self.maybe_merge()
+
+    def finish_indexing(self):
+        self.commit()
+
+    def segment_tier(self, segment:Segment) -> int:
+        #camada t: segmentos com aproximadamente max_segment_docs*merge_factor^t documentos
+        #(arredondado, pois os documentos removidos reduzem o tamanho do segmento intercalado)
+        if segment.live_document_count <= self.max_segment_docs:
+            return 0
+        return round(log(segment.live_document_count/self.max_segment_docs, self.merge_factor))
+
+    def find_merge(self) -> List[Segment]:
+        #os merge_factor segmentos mais antigos da menor camada que estiver cheia
+        dic_tiers = {}
+        with self.lock:
+            for segment in self.lst_segments:
+                dic_tiers.setdefault(self.segment_tier(segment), []).append(segment)
+        for int_tier in sorted(dic_tiers):
+            if len(dic_tiers[int_tier]) >= self.merge_factor:
+                return dic_tiers[int_tier][:self.merge_factor]
+        return []
+
+    def maybe_merge(self):
+        if not self.background_merge:
+            self.run_merges()
+        elif self.merge_thread is None or not self.merge_thread.is_alive():
+            self.merge_thread = Thread(target=self.run_merges, daemon=True)
+            self.merge_thread.start()
+
+    def wait_for_merges(self):
+        if self.merge_thread is not None:
+            self.merge_thread.join()
+            self.merge_thread = None
+
+    def run_merges(self):
+        lst_merge = self.find_merge()
+        while len(lst_merge) > 0:
+            self.merge_segments(lst_merge)
+            lst_merge = self.find_merge()
+
+    def merge_segments(self, lst_merge:List[Segment]) -> Segment:
+        #reindexa os documentos vivos dos segmentos em um novo FileIndex (ordenação externa SPIMI)
+        obj_index = self.new_file_index()
+        with self.lock:
+            #remoções já existentes no início do merge (esses documentos não são copiados)
+            lst_start_tombstones = [bytes(segment.tombstones) for segment in lst_merge]
+        for segment in lst_merge:
+            for term in segment.index.vocabulary:
+                if self.positional:
+                    for doc_id, term_freq, lst_positions in segment.iter_positional_postings(term):
+                        obj_index.index(term, doc_id, term_freq, lst_positions)
+                else:
+                    for doc_id, term_freq in segment.iter_postings(term):
+                        obj_index.index(term, doc_id, term_freq)
+        merged_segment = None
+        if len(obj_index.set_documents) > 0:
+            obj_index.finish_indexing()
+            merged_segment = Segment(obj_index, obj_index.save())
+
+        with self.lock:
+            int_pos = self.lst_segments.index(lst_merge[0])
+            self.lst_segments = [segment for segment in self.lst_segments if segment not in lst_merge]
+            if merged_segment is not None:
+                #remoções feitas durante o merge ainda não estão no segmento novo. Uma remoção só
+                #vale se nenhum segmento mais novo do merge tiver uma cópia viva do documento
+                #(ex.: a versão antiga de um documento reindexado, removida antes do merge)
+                for i, segment in enumerate(lst_merge):
+                    for doc_id in segment.index.set_documents:
+                        if segment.is_deleted(doc_id) and not is_tombstone(lst_start_tombstones[i], doc_id) and \
+                                not any(doc_id in newer_segment.index.set_documents and not newer_segment.is_deleted(doc_id)
+                                            for newer_segment in lst_merge[i+1:]):
+                            merged_segment.delete(doc_id)
+                self.lst_segments.insert(int_pos, merged_segment)
+                merged_segment.save_tombstones()
+            self.save_manifest()
+        for segment in lst_merge:
+            segment.remove_files()
+        return merged_segment
+
+    def segments(self) -> List[Segment]:
+        #cópia da lista atual: as consultas não são afetadas por um merge concorrente
+        with self.lock:
+            return list(self.lst_segments)
+
+    def get_term_id(self, term:str):
+        return self.dic_index[term]
+
+    def get_posting_cursor(self, term:str) -> PostingCursor:
+        arr_doc_ids, arr_term_freqs = array('I'), array('I')
+        for doc_id, term_freq in heapq.merge(*[segment.iter_postings(term) for segment in self.segments()]):
+            arr_doc_ids.append(doc_id)
+            arr_term_freqs.append(term_freq)
+        return ArrayCursor(arr_doc_ids, arr_term_freqs)
+
+    def get_positions_reader(self, term:str) -> "SegmentedPositionsReader":
+        if not self.positional:
+            raise ValueError("O indice não possui posições (use SegmentedIndex(positional=True))")
+        return SegmentedPositionsReader([(segment, segment.index.get_positions_reader(term)) for segment in self.segments()])
+
+    def get_occurrence_list(self, term:str) -> List:
+        if term not in self.dic_index:
+            return []
+        term_id = self.dic_index[term]
+        return [TermOccurrence(doc_id, term_id, term_freq) for doc_id, term_freq in self.get_posting_cursor(term)]
+
+    def document_count_with_term(self, term:str) -> int:
+        #como no Lucene, documentos removidos continuam contando até o próximo merge
+        return sum(segment.index.document_count_with_term(term) for segment in self.segments())
+
+    def max_term_freq(self, term:str) -> int:
+        return max((segment.index.max_term_freq(term) for segment in self.segments()), default=0)
+
+    def collection_frequency(self, term:str) -> int:
+        return sum(segment.index.collection_frequency(term) for segment in self.segments())
+
+    def live_segment(self, doc_id:int) -> Segment:
+        #segmento com a versão atual do documento (ou None)
+        for segment in reversed(self.segments()):
+            if doc_id in segment.index.set_documents and not segment.is_deleted(doc_id):
+                return segment
+        return None
+
+    def document_length(self, doc_id:int) -> int:
+        segment = self.live_segment(doc_id)
+        return segment.index.document_length(doc_id) if segment is not None else 0
+
+    def document_unique_terms(self, doc_id:int) -> int:
+        segment = self.live_segment(doc_id)
+        return segment.index.document_unique_terms(doc_id) if segment is not None else 0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(segment.live_tokens() for segment in self.segments())
+
+    @property
+    def average_document_length(self) -> float:
+        lst_segments = self.segments()
+        int_docs = sum(segment.live_document_count for segment in lst_segments)
+        if int_docs == 0:
+            return 0.0
+        return sum(segment.live_tokens() for segment in lst_segments)/int_docs
+
+    def close(self):
+        self.wait_for_merges()
+        for segment in self.segments():
+            segment.index.close()
+
+
+class SegmentedPositionsReader:
+    #posições de um termo em um SegmentedIndex: cada documento é lido do segmento que
+    #contém a sua versão atual (os documentos são consultados em ordem crescente)
+    def __init__(self, lst_segment_readers):
+        self.lst_segment_readers = lst_segment_readers
+
+    def positions(self, doc_id:int) -> List[int]:
+        for segment, reader in self.lst_segment_readers:
+            if doc_id in segment.index.set_documents and not segment.is_deleted(doc_id):
+                return reader.positions(doc_id)
+        return []
@@ -0,0 +1,162 @@
+from index.structure import *
+from index.segment import *
+from index.query import BooleanQuery
+import unittest
+import tempfile
+from random import Random
+
+
+class SegmentedIndexTest(unittest.TestCase):
+    def index_documents(self, obj_index, it_doc_ids):
+        #casa: todos os documentos; verde: múltiplos de 3; vermelho: múltiplos de 5
+        for doc_id in it_doc_ids:
+            obj_index.index("casa", doc_id, 1)
+            if doc_id % 3 == 0:
+                obj_index.index("verde", doc_id, 2)
+            if doc_id % 5 == 0:
+                obj_index.index("vermelho", doc_id, doc_id)
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_incremental(self):
+        obj_index = SegmentedIndex(self.tmp_dir.name, max_segment_docs=20, merge_factor=10, background_merge=False)
+        self.index_documents(obj_index, range(1,51))
+        obj_index.commit()
+        self.assertEqual(len(obj_index.segments()), 3, "Deveriam ser criados segmentos de até 20 documentos")
+
+        #novos documentos entram em um novo segmento, sem reindexar os anteriores
+        self.index_documents(obj_index, range(51,61))
+        obj_index.commit()
+        self.assertEqual(len(obj_index.segments()), 4)
+        self.assertListEqual(list(obj_index.get_posting_cursor("vermelho")), [(doc_id, doc_id) for doc_id in range(5,61,5)])
+        self.assertEqual(obj_index.document_count, 60)
+        self.assertEqual(obj_index.document_count_with_term("verde"), 20)
+        self.assertEqual(obj_index.document_length(10), 11)
+        self.assertListEqual(BooleanQuery(obj_index).search("verde vermelho"), [15,30,45,60])
+
+        #remoções e reindexação (a versão anterior do documento é removida)
+        self.assertTrue(obj_index.delete_document(30))
+        self.assertFalse(obj_index.delete_document(30), "Um documento não pode ser removido duas vezes")
+        obj_index.index("verde", 45, 7)
+        obj_index.commit()
+        self.assertListEqual(BooleanQuery(obj_index).search("verde vermelho"), [15,60])
+        self.assertListEqual(BooleanQuery(obj_index).search("verde NOT casa"), [45])
+        self.assertEqual(obj_index.document_count, 59)
+        self.assertEqual(obj_index.document_length(45), 7)
+        obj_index.close()
+
+        #o indice é reaberto a partir do diretório (manifesto + bitsets de remoção)
+        reopened_index = SegmentedIndex(self.tmp_dir.name, max_segment_docs=20, merge_factor=10, background_merge=False)
+        self.assertEqual(len(reopened_index.segments()), 5)
+        self.assertEqual(reopened_index.document_count, 59)
+        self.assertListEqual(BooleanQuery(reopened_index).search("verde vermelho"), [15,60])
+        self.assertCountEqual(reopened_index.vocabulary, ["casa","verde","vermelho"])
+        reopened_index.close()
+
+    def test_delete_uncommitted(self):
+        obj_index = SegmentedIndex(self.tmp_dir.name, background_merge=False)
+        self.index_documents(obj_index, range(1,7))
+        #documentos ainda no writer (antes do commit)
+        self.assertTrue(obj_index.delete_document(3))
+        self.assertFalse(obj_index.delete_document(3), "Um documento não pode ser removido duas vezes")
+        self.assertEqual(obj_index.document_count, 5, "O documento removido não pode contar nas consultas com NOT")
+        obj_index.commit()
+        self.assertListEqual(BooleanQuery(obj_index).search("verde"), [6], "O documento removido antes do commit não pode voltar")
+        self.assertListEqual(BooleanQuery(obj_index).search("casa NOT verde"), [1,2,4,5])
+        self.assertEqual(obj_index.document_count, 5)
+
+        #reindexar um documento removido ainda no writer
+        obj_index.index("casa", 7, 1)
+        obj_index.delete_document(7)
+        obj_index.index("verde", 7, 1)
+        obj_index.commit()
+        self.assertListEqual(BooleanQuery(obj_index).search("verde"), [6,7])
+        self.assertListEqual(BooleanQuery(obj_index).search("casa"), [1,2,4,5,6])
+        obj_index.close()
+
+    def test_reindex_merge(self):
+        #as versões antiga (removida) e nova de um documento reindexado no mesmo merge
+        obj_index = SegmentedIndex(self.tmp_dir.name, merge_factor=2, background_merge=False)
+        obj_index.index("casa", 1, 1)
+        obj_index.commit()
+        obj_index.index("verde", 1, 2)
+        obj_index.commit()
+        self.assertEqual(len(obj_index.segments()), 1)
+        self.assertListEqual(list(obj_index.get_posting_cursor("verde")), [(1,2)])
+        self.assertListEqual(list(obj_index.get_posting_cursor("casa")), [])
+
+        #reindexações e remoções aleatórias, comparadas com o conteúdo esperado de cada documento
+        rnd = Random(7)
+        dic_expected = {1: ("verde", 2)}
+        for _ in range(30):
+            #cada documento no máximo uma vez por commit (um único termo por documento)
+            for doc_id in rnd.sample(range(1, 60), 10):
+                if rnd.random() < 0.2:
+                    obj_index.delete_document(doc_id)
+                    dic_expected.pop(doc_id, None)
+                else:
+                    term, term_freq = rnd.choice(["casa","verde","azul"]), rnd.randrange(1,5)
+                    obj_index.index(term, doc_id, term_freq)
+                    dic_expected[doc_id] = (term, term_freq)
+            obj_index.commit()
+        obj_index.close()
+
+        reopened_index = SegmentedIndex(self.tmp_dir.name, merge_factor=2, background_merge=False)
+        for index in [obj_index, reopened_index]:
+            self.assertEqual(index.document_count, len(dic_expected))
+            for term in ["casa","verde","azul"]:
+                self.assertListEqual(list(index.get_posting_cursor(term)),
+                                     sorted((doc_id, term_freq) for doc_id, (doc_term, term_freq) in dic_expected.items() if doc_term == term))
+        reopened_index.close()
+
+    def test_positional(self):
+        from index.query import PhraseQuery
+        obj_index = SegmentedIndex(self.tmp_dir.name, max_segment_docs=5, merge_factor=2, background_merge=False, positional=True)
+        for doc_id in range(1,21):
+            lst_words = ["casa","verde"] if doc_id % 2 == 0 else ["verde","azul","casa"]
+            for int_position, term in enumerate(lst_words):
+                obj_index.index(term, doc_id, 1, [int_position])
+        obj_index.delete_document(4)
+        #reindexação: o documento 6 passa a ter apenas "verde casa"
+        obj_index.index("verde", 6, 1, [0])
+        obj_index.index("casa", 6, 1, [1])
+        obj_index.commit()
+        self.assertListEqual(PhraseQuery(obj_index).search("casa verde"), [2,8,10,12,14,16,18,20])
+        self.assertListEqual(PhraseQuery(obj_index).search("verde casa"), [6])
+        self.assertLess(len(obj_index.segments()), 5, "Os segmentos (com as posições) deveriam ter sido intercalados")
+        obj_index.close()
+
+        obj_index = SegmentedIndex(os.path.join(self.tmp_dir.name, "sem_posicoes"))
+        self.assertRaises(ValueError, obj_index.index, "casa", 1, 1, [0])
+        self.assertRaises(ValueError, obj_index.get_positions_reader, "casa")
+
+    def test_merge(self):
+        for background_merge in [False, True]:
+            str_dir = os.path.join(self.tmp_dir.name, str(background_merge))
+            obj_index = SegmentedIndex(str_dir, max_segment_docs=10, merge_factor=3, background_merge=background_merge)
+            for int_start in range(1,91,10):
+                self.index_documents(obj_index, range(int_start, int_start+10))
+                obj_index.commit()
+                if int_start == 1:
+                    obj_index.delete_document(2)
+            obj_index.wait_for_merges()
+
+            #9 segmentos de 10 docs -> 3 de ~30 -> 1 de ~90
+            self.assertEqual(len(obj_index.segments()), 1, "Os segmentos deveriam ter sido intercalados")
+            self.assertEqual(obj_index.document_count, 89)
+            self.assertEqual(obj_index.document_count_with_term("casa"), 89, "O merge deve descartar os documentos removidos")
+            self.assertListEqual(list(obj_index.get_posting_cursor("verde")), [(doc_id, 2) for doc_id in range(3,91,3)])
+            self.assertEqual(obj_index.collection_frequency("vermelho"), sum(range(5,91,5)))
+            self.assertCountEqual(os.listdir(str_dir), [MANIFEST_FILE_NAME]+[os.path.basename(str_file) for str_file in
+                                    (obj_index.segments()[0].index.str_idx_file_name, obj_index.segments()[0].str_lexicon_file,
+                                     FileIndex.statistics_file_name(obj_index.segments()[0].str_lexicon_file))],
+                                  "Os arquivos dos segmentos intercalados deveriam ter sido removidos")
+            obj_index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,235 @@
+from typing import Dict, List
+from array import array
+from multiprocessing import Process, Pipe
+import os
+import zlib
+
+from .structure import Index, FileIndex, TermOccurrence
+from .cursor import PostingCursor, ArrayCursor, PositionsReader
+
+
+def shard_of(term:str, num_shards:int) -> int:
+    #crc32 (e não hash()) para que a divisão seja a mesma em todos os processos e execuções
+    return zlib.crc32(term.encode("utf-8")) % num_shards
+
+
+def _shard_worker(conn, dic_options:dict):
+    #processo de cada shard: um FileIndex próprio que recebe lotes de ocorrências e
+    #responde às consultas. Os comandos chegam em ordem pelo pipe; apenas "index" não tem resposta
+    obj_index = FileIndex(**dic_options)
+    error = None
+    while True:
+        str_command, args = conn.recv()
+        if str_command == "index":
+            if error is None:
+                try:
+                    #(termo, doc_id, term_freq) ou, no indice posicional, (termo, doc_id, term_freq, posições)
+                    for occurrence in args:
+                        obj_index.index(*occurrence)
+                except Exception as e:
+                    #reportado na próxima resposta
+                    error = e
+            continue
+        if str_command == "close":
+            obj_index.close()
+            conn.send(("ok", None))
+            conn.close()
+            return
+        if error is not None:
+            conn.send(("error", error))
+            error = None
+            continue
+        try:
+            if str_command == "finish":
+                obj_index.finish_indexing()
+                statistics = obj_index.statistics
+                result = (statistics.arr_doc_length, statistics.arr_doc_unique_terms, statistics.total_tokens)
+            elif str_command == "vocabulary":
+                result = obj_index.vocabulary
+            elif str_command == "postings":
+                result = {term: obj_index.get_posting_arrays(term) for term in args}
+            elif str_command == "positions":
+                #trecho (codificado) do termo no arquivo de posições do shard
+                result = {term: bytes(obj_index.get_positions_reader(term).bytes_positions) for term in args}
+            elif str_command in ("document_count_with_term", "max_term_freq", "collection_frequency"):
+                result = {term: getattr(obj_index, str_command)(term) for term in args}
+            elif str_command == "get_term_id":
+                result = obj_index.get_term_id(args) if args in obj_index.dic_index else None
+            else:
+                raise ValueError(f"Comando desconhecido: {str_command}")
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", e))
+
+
+class IndexShard:
+    #lado do processo principal de um shard: envia comandos e recebe as respostas
+    def __init__(self, dic_options:dict):
+        self.conn, conn_worker = Pipe()
+        self.process = Process(target=_shard_worker, args=(conn_worker, dic_options), daemon=True)
+        self.process.start()
+        conn_worker.close()
+
+    def send(self, str_command:str, args=None):
+        self.conn.send((str_command, args))
+
+    def receive(self):
+        str_status, result = self.conn.recv()
+        if str_status == "error":
+            raise result
+        return result
+
+    def call(self, str_command:str, args=None):
+        self.send(str_command, args)
+        return self.receive()
+
+    def close(self):
+        if self.process.is_alive():
+            self.call("close")
+        self.process.join()
+        self.conn.close()
+
+
+class ShardedIndex(Index):
+    #indice particionado por termo: cada termo pertence a um dos num_shards FileIndex,
+    #cada um em um processo e com arquivos próprios (file_prefix shard_<i> em str_dir).
+    #As ocorrências são enviadas em lotes de batch_size por shard, então os shards ordenam
+    #e gravam em paralelo. As consultas de vários termos são enviadas a todos os shards
+    #envolvidos antes de esperar as respostas (scatter-gather).
+    #O processo principal guarda apenas os documentos e as estatísticas por documento:
+    #o vocabulário fica distribuído entre os shards
+    def __init__(self, num_shards:int=4, str_dir:str=".", batch_size:int=10000, **dic_file_index_options):
+        super().__init__()
+        self.num_shards = num_shards
+        self.batch_size = batch_size
+        self.str_dir = str_dir
+        #com positional=True as posições são enviadas aos shards (FileIndex posicionais)
+        self.positional = dic_file_index_options.get("positional", False)
+        os.makedirs(str_dir, exist_ok=True)
+        dic_file_index_options.setdefault("spimi", True)
+        self.lst_shards = [IndexShard(dict(dic_file_index_options, file_prefix=os.path.join(str_dir, f"shard_{i}")))
+                                for i in range(num_shards)]
+        self.lst_batches = [[] for _ in range(num_shards)]
+
+    def shard_of(self, term:str) -> int:
+        return shard_of(term, self.num_shards)
+
+    def index(self, term:str, doc_id:int, term_freq:int, positions:List[int]=None):
+        int_shard = self.shard_of(term)
+        lst_batch = self.lst_batches[int_shard]
+        if positions is None:
+            lst_batch.append((term, doc_id, term_freq))
+        elif not self.positional:
+            raise ValueError("O indice não armazena posições (use ShardedIndex(positional=True))")
+        else:
+            lst_batch.append((term, doc_id, term_freq, positions))
+        if len(lst_batch) >= self.batch_size:
+            self.send_batch(int_shard)
+        self.set_documents.add(doc_id)
+
+    def send_batch(self, int_shard:int):
+        if len(self.lst_batches[int_shard]) > 0:
+            self.lst_shards[int_shard].send("index", self.lst_batches[int_shard])
+            self.lst_batches[int_shard] = []
+
+    def receive_all(self, lst_shards:List[IndexShard]) -> List:
+        #respostas de todos os shards que receberam um comando; um erro só é lançado depois de
+        #ler todas elas, senão as respostas pendentes seriam lidas pelos comandos seguintes
+        lst_results = []
+        first_error = None
+        for shard in lst_shards:
+            try:
+                lst_results.append(shard.receive())
+            except Exception as e:
+                if first_error is None:
+                    first_error = e
+        if first_error is not None:
+            raise first_error
+        return lst_results
+
+    def finish_indexing(self):
+        for int_shard in range(self.num_shards):
+            self.send_batch(int_shard)
+        #todos os shards finalizam ao mesmo tempo; depois as estatísticas por documento
+        #(cada shard conhece apenas a parte de cada documento com os seus termos) são somadas
+        for shard in self.lst_shards:
+            shard.send("finish")
+        statistics = self.statistics
+        statistics.total_tokens = 0
+        for arr_doc_length, arr_doc_unique_terms, int_total_tokens in self.receive_all(self.lst_shards):
+            statistics.grow(statistics.arr_doc_length, len(arr_doc_length))
+            statistics.grow(statistics.arr_doc_unique_terms, len(arr_doc_unique_terms))
+            for doc_id in range(len(arr_doc_length)):
+                statistics.arr_doc_length[doc_id] += arr_doc_length[doc_id]
+                statistics.arr_doc_unique_terms[doc_id] += arr_doc_unique_terms[doc_id]
+            statistics.total_tokens += int_total_tokens
+        statistics.document_count = len(self.set_documents)
+
+    def scatter_gather(self, str_command:str, lst_terms:List[str]) -> Dict:
+        #envia os termos de cada shard e só então espera as respostas
+        dic_shard_terms = {}
+        for term in dict.fromkeys(lst_terms):
+            dic_shard_terms.setdefault(self.shard_of(term), []).append(term)
+        for int_shard, lst_shard_terms in dic_shard_terms.items():
+            self.lst_shards[int_shard].send(str_command, lst_shard_terms)
+        dic_result = {}
+        for dic_shard_result in self.receive_all([self.lst_shards[int_shard] for int_shard in dic_shard_terms]):
+            dic_result.update(dic_shard_result)
+        return dic_result
+
+    @property
+    def vocabulary(self) -> List:
+        for shard in self.lst_shards:
+            shard.send("vocabulary")
+        return [term for lst_shard_terms in self.receive_all(self.lst_shards) for term in lst_shard_terms]
+
+    def get_term_id(self, term:str):
+        #term_id do shard combinado com o número do shard (único entre os shards)
+        int_shard = self.shard_of(term)
+        term_id = self.lst_shards[int_shard].call("get_term_id", term)
+        return None if term_id is None else term_id*self.num_shards+int_shard
+
+    def get_posting_cursors(self, lst_terms:List[str]) -> Dict[str,PostingCursor]:
+        return {term: ArrayCursor(arr_doc_ids, arr_term_freqs)
+                    for term, (arr_doc_ids, arr_term_freqs) in self.scatter_gather("postings", lst_terms).items()}
+
+    def get_posting_cursor(self, term:str) -> PostingCursor:
+        return self.get_posting_cursors([term])[term]
+
+    def get_posting_arrays(self, term:str):
+        return self.scatter_gather("postings", [term])[term]
+
+    def get_posting_arrays_batch(self, lst_terms:List[str]) -> Dict:
+        return self.scatter_gather("postings", lst_terms)
+
+    def document_counts_with_terms(self, lst_terms:List[str]) -> Dict[str,int]:
+        return self.scatter_gather("document_count_with_term", lst_terms)
+
+    def get_positions_reader(self, term:str) -> PositionsReader:
+        return PositionsReader(self.scatter_gather("positions", [term])[term])
+
+    def get_occurrence_list(self, term:str) -> List:
+        arr_doc_ids, arr_term_freqs = self.scatter_gather("postings", [term])[term]
+        if len(arr_doc_ids) == 0:
+            return []
+        term_id = self.get_term_id(term)
+        return [TermOccurrence(doc_id, term_id, term_freq) for doc_id, term_freq in zip(arr_doc_ids, arr_term_freqs)]
+
+    def document_count_with_term(self, term:str) -> int:
+        return self.scatter_gather("document_count_with_term", [term])[term]
+
+    def max_term_freq(self, term:str) -> int:
+        return self.scatter_gather("max_term_freq", [term])[term]
+
+    def collection_frequency(self, term:str) -> int:
+        return self.scatter_gather("collection_frequency", [term])[term]
+
+    def close(self):
+        for shard in self.lst_shards:
+            shard.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
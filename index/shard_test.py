@@ -0,0 +1,77 @@
+from index.structure import *
+from index.shard import *
+import unittest
+import tempfile
+
+
+class ShardedIndexTest(unittest.TestCase):
+    def test_sharded_index(self):
+        with tempfile.TemporaryDirectory() as str_dir:
+            expected_index = HashIndex()
+            with ShardedIndex(4, str_dir, batch_size=20, memory_budget=1 << 20) as obj_index:
+                for doc_id in range(1,101):
+                    for term in ["casa","verde",f"termo{doc_id%30}",f"cor{doc_id%7}"]:
+                        obj_index.index(term, doc_id, doc_id%4+1)
+                        expected_index.index(term, doc_id, doc_id%4+1)
+                obj_index.finish_indexing()
+
+                #cada termo fica em um único shard, com arquivos próprios
+                self.assertCountEqual(obj_index.vocabulary, expected_index.vocabulary)
+                self.assertGreater(len({shard_of(term, 4) for term in expected_index.vocabulary}), 1, "Os termos deveriam ser distribuídos entre os shards")
+                self.assertTrue(all(os.path.exists(os.path.join(str_dir, f"shard_{i}_1")) for i in range(4)))
+
+                for term in expected_index.vocabulary+["xuxu"]:
+                    self.assertListEqual([(occ.doc_id, occ.term_freq) for occ in obj_index.get_occurrence_list(term)],
+                                         [(occ.doc_id, occ.term_freq) for occ in expected_index.get_occurrence_list(term)])
+                    self.assertEqual(obj_index.document_count_with_term(term), expected_index.document_count_with_term(term))
+                    self.assertEqual(obj_index.collection_frequency(term), expected_index.collection_frequency(term))
+                    self.assertEqual(obj_index.max_term_freq(term), expected_index.max_term_freq(term))
+
+                #estatísticas por documento somadas de todos os shards
+                self.assertEqual(obj_index.document_count, 100)
+                self.assertListEqual([obj_index.document_length(doc_id) for doc_id in range(1,101)],
+                                     [expected_index.document_length(doc_id) for doc_id in range(1,101)])
+                self.assertEqual(obj_index.document_unique_terms(7), 4)
+                self.assertAlmostEqual(obj_index.average_document_length, expected_index.average_document_length)
+
+                dic_cursors = obj_index.get_posting_cursors(["casa","termo3","xuxu"])
+                self.assertListEqual(list(dic_cursors["termo3"]), [(doc_id, doc_id%4+1) for doc_id in (3,33,63,93)])
+                self.assertIsNone(dic_cursors["xuxu"].doc_id)
+
+                lst_term_ids = [obj_index.get_term_id(term) for term in expected_index.vocabulary]
+                self.assertEqual(len(set(lst_term_ids)), len(lst_term_ids), "Os term_ids devem ser únicos entre os shards")
+                self.assertIsNone(obj_index.get_term_id("xuxu"))
+
+    def test_positional(self):
+        from index.query import PhraseQuery
+        with tempfile.TemporaryDirectory() as str_dir:
+            with ShardedIndex(2, str_dir, batch_size=7, positional=True) as obj_index:
+                for doc_id in range(1,31):
+                    lst_words = ["casa","verde"] if doc_id % 2 == 0 else ["verde","azul","casa"]
+                    for int_position, term in enumerate(lst_words):
+                        obj_index.index(term, doc_id, 1, [int_position])
+                obj_index.finish_indexing()
+                self.assertListEqual(PhraseQuery(obj_index).search("casa verde"), list(range(2,31,2)))
+                self.assertListEqual(PhraseQuery(obj_index).search("verde casa", slop=1), list(range(1,31,2)))
+
+            with ShardedIndex(2, os.path.join(str_dir, "sem_posicoes")) as obj_index:
+                self.assertRaises(ValueError, obj_index.index, "casa", 1, 1, [0])
+
+    def test_error_replies(self):
+        #um erro em um shard não pode deixar respostas pendentes para os próximos comandos
+        with tempfile.TemporaryDirectory() as str_dir:
+            with ShardedIndex(4, str_dir) as obj_index:
+                lst_terms = [f"termo{i}" for i in range(20)]
+                for doc_id in range(1,11):
+                    for term in lst_terms:
+                        obj_index.index(term, doc_id, 1)
+                obj_index.finish_indexing()
+                self.assertGreater(len({shard_of(term, 4) for term in lst_terms}), 1)
+                #indice sem posições: todos os shards envolvidos respondem com erro
+                self.assertRaises(ValueError, obj_index.scatter_gather, "positions", lst_terms)
+                self.assertDictEqual(obj_index.document_counts_with_terms(lst_terms), {term: 10 for term in lst_terms})
+                self.assertCountEqual(obj_index.vocabulary, lst_terms)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+from array import array
+import struct
+
+from .codec import array_from_bytes, array_to_bytes
+
+#arquivo de estatísticas (little-endian): cabeçalho | df (por term_id) | cf (por term_id)
+#   | tamanho (por doc_id) | termos distintos (por doc_id)
+STATISTICS_MAGIC = b"RIST"
+STATISTICS_VERSION = 1
+STATISTICS_HEADER = struct.Struct("<4sBxxxQQII")
+
+
+class CollectionStatistics:
+    #estatísticas da coleção em arrays indexados diretamente pelo term_id / doc_id:
+    #todas as consultas são O(1) e não dependem das listas de ocorrências
+    def __init__(self):
+        #por termo (posição = term_id)
+        self.arr_df = array('I')
+        self.arr_cf = array('Q')
+        #por documento (posição = doc_id)
+        self.arr_doc_length = array('I')
+        self.arr_doc_unique_terms = array('I')
+
+        self.total_tokens = 0
+        self.document_count = 0
+
+    @staticmethod
+    def grow(arr:array, int_size:int):
+        if len(arr) < int_size:
+            arr.frombytes(bytes((int_size-len(arr))*arr.itemsize))
+
+    def add(self, doc_id:int, term_id:int, term_freq:int):
+        #chamado pelo Index.index para cada (termo, documento)
+        if term_id >= len(self.arr_df):
+            CollectionStatistics.grow(self.arr_df, max(term_id+1, 2*len(self.arr_df)))
+            CollectionStatistics.grow(self.arr_cf, len(self.arr_df))
+        if doc_id >= len(self.arr_doc_length):
+            CollectionStatistics.grow(self.arr_doc_length, max(doc_id+1, 2*len(self.arr_doc_length)))
+            CollectionStatistics.grow(self.arr_doc_unique_terms, len(self.arr_doc_length))
+
+        self.arr_df[term_id] += 1
+        self.arr_cf[term_id] += term_freq
+        if self.arr_doc_unique_terms[doc_id] == 0:
+            self.document_count += 1
+        self.arr_doc_unique_terms[doc_id] += 1
+        self.arr_doc_length[doc_id] += term_freq
+        self.total_tokens += term_freq
+
+    def set_term(self, term_id:int, int_df:int, int_cf:int):
+        #usado no finish_indexing para gravar os valores obtidos das listas de ocorrências
+        if term_id >= len(self.arr_df):
+            CollectionStatistics.grow(self.arr_df, term_id+1)
+            CollectionStatistics.grow(self.arr_cf, term_id+1)
+        self.arr_df[term_id] = int_df
+        self.arr_cf[term_id] = int_cf
+
+    def df(self, term_id:int) -> int:
+        return self.arr_df[term_id] if 0 <= term_id < len(self.arr_df) else 0
+
+    def cf(self, term_id:int) -> int:
+        return self.arr_cf[term_id] if 0 <= term_id < len(self.arr_cf) else 0
+
+    def doc_length(self, doc_id:int) -> int:
+        return self.arr_doc_length[doc_id] if 0 <= doc_id < len(self.arr_doc_length) else 0
+
+    def doc_unique_terms(self, doc_id:int) -> int:
+        return self.arr_doc_unique_terms[doc_id] if 0 <= doc_id < len(self.arr_doc_unique_terms) else 0
+
+    @property
+    def average_document_length(self) -> float:
+        if self.document_count == 0:
+            return 0.0
+        return self.total_tokens/self.document_count
+
+    def save(self, str_file:str):
+        with open(str_file, "wb") as file:
+            file.write(STATISTICS_HEADER.pack(STATISTICS_MAGIC, STATISTICS_VERSION, self.total_tokens,
+                                              self.document_count, len(self.arr_df), len(self.arr_doc_length)))
+            for arr in (self.arr_df, self.arr_cf, self.arr_doc_length, self.arr_doc_unique_terms):
+                file.write(array_to_bytes(arr))
+
+    @classmethod
+    def load(cls, str_file:str) -> "CollectionStatistics":
+        with open(str_file, "rb") as file:
+            bytes_file = memoryview(file.read())
+        magic, version, total_tokens, document_count, int_terms, int_docs = STATISTICS_HEADER.unpack_from(bytes_file)
+        if magic != STATISTICS_MAGIC or version != STATISTICS_VERSION:
+            raise ValueError(f"{str_file} não é um arquivo de estatísticas válido")
+
+        statistics = cls()
+        statistics.total_tokens = total_tokens
+        statistics.document_count = document_count
+        int_pos = STATISTICS_HEADER.size
+        for str_attr, type_code, int_len in (("arr_df", 'I', int_terms), ("arr_cf", 'Q', int_terms),
+                                             ("arr_doc_length", 'I', int_docs), ("arr_doc_unique_terms", 'I', int_docs)):
+            int_size = array(type_code).itemsize*int_len
+            setattr(statistics, str_attr, array_from_bytes(type_code, bytes_file[int_pos:int_pos+int_size]))
+            int_pos += int_size
+        return statistics
@@ -1,22 +1,46 @@
-from IPython.display import clear_output
-from typing import List, Set, Union
+from typing import Dict, List, Set, Union
 from abc import abstractmethod
 from functools import total_ordering
 from os import path
+from array import array
 import os
+import sys
 import json
 import pickle
+from itertools import groupby
+from fnmatch import fnmatchcase
+from operator import itemgetter
+import heapq
+from bisect import bisect_left
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from time import perf_counter
+import mmap
 import gc
+from .codec import BYTE_SIZE, OCCURRENCE_RECORD, RECORD_SIZE, OccurrenceWriter, read_occurrences, decode_occurrences
+from .codec import encode_postings, decode_postings, encode_positions
+from .codec import PositionsWriter, load_term_offsets, write_positions_run, read_positions_run
+from .cursor import PostingCursor, ArrayCursor, BlockCursor, RecordColumn, PositionsReader, MappingPositionsReader
+from .bitmap import Bitmap, BitmapWriter, decode_bitmap, decode_bitmap_postings
+from .statistics import CollectionStatistics
+from .cache import ByteBudgetCache
+from .metrics import Metrics, timer, peak_rss_bytes
 
-BYTE_SIZE = 4
+logger = logging.getLogger(__name__)
 
 class Index:
     def __init__(self):
         self.dic_index = {}
         self.autoIncrement = 0
         self.set_documents = set()
+        #df, cf, tamanho dos documentos etc. (ver statistics.CollectionStatistics)
+        self.statistics = CollectionStatistics()
+        #cache opcional de resultados completos de consultas (ver query.py e ranking.py)
+        self.query_cache = None
 
-    def index(self, term:str, doc_id:int, term_freq:int):
+    def index(self, term:str, doc_id:int, term_freq:int, positions:List[int]=None):
+        #positions: posições (em ordem crescente) do termo no documento, apenas nos
+        #indices que as armazenam (ver get_positions_reader)
         if term not in self.dic_index:
             self.autoIncrement+=1
             int_term_id = self.autoIncrement
@@ -24,8 +48,12 @@ class Index:
         else:
             int_term_id = self.get_term_id(term)
 
-        self.add_index_occur(self.dic_index[term], doc_id, int_term_id, term_freq)
+        if positions is None:
+            self.add_index_occur(self.dic_index[term], doc_id, int_term_id, term_freq)
+        else:
+            self.add_index_occur(self.dic_index[term], doc_id, int_term_id, term_freq, positions)
         self.set_documents.add(doc_id)
+        self.statistics.add(doc_id, int_term_id, term_freq)
     
     def writeOnFile(self):
         dic_index_serializable = {}
@@ -46,6 +74,30 @@ class Index:
     def document_count(self) -> int:
         return len(self.set_documents)
 
+    def document_length(self, doc_id:int) -> int:
+        return self.statistics.doc_length(doc_id)
+
+    def document_unique_terms(self, doc_id:int) -> int:
+        return self.statistics.doc_unique_terms(doc_id)
+
+    @property
+    def average_document_length(self) -> float:
+        return self.statistics.average_document_length
+
+    @property
+    def total_tokens(self) -> int:
+        return self.statistics.total_tokens
+
+    def collection_frequency(self, term:str) -> int:
+        #soma das frequências do termo em todos os documentos
+        if term not in self.dic_index:
+            return 0
+        return self.statistics.cf(self.get_term_id(term))
+
+    def max_term_freq(self, term:str) -> int:
+        #maior frequência do termo em um documento (usada como limite superior nos rankings)
+        return max((occur.term_freq for occur in self.get_occurrence_list(term)), default=0)
+
     @abstractmethod
     def get_term_id(self, term:str):
         raise NotImplementedError("Voce deve criar uma subclasse e a mesma deve sobrepor este método")
@@ -63,9 +115,50 @@ class Index:
     def get_occurrence_list(self, term:str) -> List:
         raise NotImplementedError("Voce deve criar uma subclasse e a mesma deve sobrepor este método")
 
-    @abstractmethod
     def document_count_with_term(self,term:str) -> int:
-         raise NotImplementedError("Voce deve criar uma subclasse e a mesma deve sobrepor este método")
+        if term not in self.dic_index:
+            return 0
+        return self.statistics.df(self.get_term_id(term))
+
+    def get_posting_cursor(self, term:str) -> PostingCursor:
+        #cursor ordenado por doc_id (ver cursor.py); as subclasses podem evitar materializar a lista
+        lst_occurrences = sorted(self.get_occurrence_list(term), key=lambda occur: occur.doc_id)
+        return ArrayCursor([occur.doc_id for occur in lst_occurrences], [occur.term_freq for occur in lst_occurrences])
+
+    def get_posting_cursors(self, lst_terms:List[str]) -> Dict[str,PostingCursor]:
+        #cursores de vários termos de uma vez (ex.: o ShardedIndex consulta os shards em paralelo)
+        return {term: self.get_posting_cursor(term) for term in lst_terms}
+
+    def get_posting_arrays(self, term:str):
+        #colunas (doc_ids, term_freqs) ordenadas por doc_id (ex.: para a pontuação vetorizada)
+        arr_doc_ids, arr_term_freqs = array('I'), array('I')
+        for doc_id, term_freq in self.get_posting_cursor(term):
+            arr_doc_ids.append(doc_id)
+            arr_term_freqs.append(term_freq)
+        return arr_doc_ids, arr_term_freqs
+
+    def get_posting_arrays_batch(self, lst_terms:List[str]) -> Dict:
+        #colunas de vários termos de uma vez (como get_posting_cursors)
+        return {term: self.get_posting_arrays(term) for term in lst_terms}
+
+    def document_counts_with_terms(self, lst_terms:List[str]) -> Dict[str,int]:
+        return {term: self.document_count_with_term(term) for term in lst_terms}
+
+    def terms_matching(self, str_pattern:str) -> List[str]:
+        #termos do vocabulário que casam com o padrão (* e ? como no fnmatch; ex.: "cas*")
+        return sorted(term for term in self.vocabulary if fnmatchcase(term, str_pattern))
+
+    def has_bitmap(self, term:str) -> bool:
+        #se as ocorrências do termo estão armazenadas como bitmap (ver bitmap.Bitmap)
+        return False
+
+    def get_bitmap(self, term:str) -> Bitmap:
+        #doc_ids do termo como bitmap (None se o termo não estiver armazenado assim)
+        return None
+
+    def get_positions_reader(self, term:str):
+        #leitor das posições do termo (ver cursor.PositionsReader), usado nas consultas por frase
+        raise ValueError(f"O indice {type(self).__name__} não armazena as posições dos termos")
 
     def finish_indexing(self):
         pass
@@ -87,9 +180,7 @@ class TermOccurrence:
         self.term_freq = term_freq
 
     def write(self, idx_file):
-        idx_file.write(self.doc_id.to_bytes(BYTE_SIZE,byteorder="big"))
-        idx_file.write(self.term_id.to_bytes(BYTE_SIZE,byteorder="big"))
-        idx_file.write(self.term_freq.to_bytes(BYTE_SIZE,byteorder="big"))
+        idx_file.write(OCCURRENCE_RECORD.pack(self.doc_id, self.term_id, self.term_freq))
 
     def __hash__(self):
     	return hash((self.doc_id,self.term_id))
@@ -109,66 +200,464 @@ class TermOccurrence:
     def __repr__(self):
         return str(self)
 
+class OccurrenceBuffer:
+    #buffer colunar de ocorrências: três colunas array('I') paralelas no lugar de um
+    #objeto TermOccurrence por ocorrência. Os objetos só são criados quando
+    #solicitados (indexação ou iteração sobre o buffer)
+    def __init__(self, lst_occurrences=(), positional:bool=False):
+        self.arr_doc_id = array('I')
+        self.arr_term_id = array('I')
+        self.arr_term_freq = array('I')
+        #modo posicional: quarta coluna com as posições codificadas (codec.encode_positions)
+        self.lst_positions = [] if positional else None
+        self.int_positions_bytes = 0
+        for occur in lst_occurrences:
+            self.add(occur.doc_id, occur.term_id, occur.term_freq)
+
+    def add(self, doc_id:int, term_id:int, term_freq:int, positions:List[int]=None):
+        self.arr_doc_id.append(doc_id)
+        self.arr_term_id.append(term_id)
+        self.arr_term_freq.append(term_freq)
+        if self.lst_positions is not None:
+            bytes_positions = encode_positions(positions if positions is not None else ())
+            self.lst_positions.append(bytes_positions)
+            self.int_positions_bytes += sys.getsizeof(bytes_positions)+8
+
+    def sort(self):
+        #ordena por (term_id, doc_id) sem criar objetos: cada ocorrência é empacotada
+        #em um único inteiro term_id|doc_id|term_freq e a comparação é feita em C
+        if self.lst_positions is not None:
+            return self.sort_positional()
+        lst_keys = [(term_id << 64) | (doc_id << 32) | term_freq for term_id, doc_id, term_freq in self.iter_tuples()]
+        lst_keys.sort()
+        self.arr_term_id = array('I', [key >> 64 for key in lst_keys])
+        self.arr_doc_id = array('I', [(key >> 32) & 0xFFFFFFFF for key in lst_keys])
+        self.arr_term_freq = array('I', [key & 0xFFFFFFFF for key in lst_keys])
+
+    def sort_positional(self):
+        #a chave leva também a posição original da ocorrência, para reordenar as posições
+        lst_keys = [(term_id << 96) | (doc_id << 64) | (term_freq << 32) | i
+                        for i, (term_id, doc_id, term_freq) in enumerate(self.iter_tuples())]
+        lst_keys.sort()
+        self.arr_term_id = array('I', [key >> 96 for key in lst_keys])
+        self.arr_doc_id = array('I', [(key >> 64) & 0xFFFFFFFF for key in lst_keys])
+        self.arr_term_freq = array('I', [(key >> 32) & 0xFFFFFFFF for key in lst_keys])
+        self.lst_positions = [self.lst_positions[key & 0xFFFFFFFF] for key in lst_keys]
+
+    def iter_tuples(self):
+        #tuplas (term_id, doc_id, term_freq), na ordem de ordenação
+        return zip(self.arr_term_id, self.arr_doc_id, self.arr_term_freq)
+
+    def __len__(self):
+        return len(self.arr_doc_id)
+
+    def __getitem__(self, i:int) -> TermOccurrence:
+        return TermOccurrence(self.arr_doc_id[i], self.arr_term_id[i], self.arr_term_freq[i])
+
+    def __iter__(self):
+        for term_id, doc_id, term_freq in self.iter_tuples():
+            yield TermOccurrence(doc_id, term_id, term_freq)
+
+#memória estimada por ocorrência no buffer: as três colunas mais a chave empacotada
+#(int de 96 bits e sua referência na lista) criada durante a ordenação
+OCCURRENCE_BUFFER_BYTES = 3*array('I').itemsize+sys.getsizeof(1 << 95)+8
+
+class PostingList:
+    #lista de ocorrências de um termo do HashIndex armazenada em colunas array('I')
+    def __init__(self, term_id:int):
+        self.term_id = term_id
+        self.arr_doc_id = array('I')
+        self.arr_term_freq = array('I')
+        self.is_sorted = True
+        self.max_term_freq = 0
+        #doc_id -> posições do termo no documento (somente se indexadas com posições)
+        self.dic_positions = None
+
+    def add(self, doc_id:int, term_freq:int, positions:List[int]=None):
+        if self.is_sorted and len(self.arr_doc_id) > 0 and doc_id < self.arr_doc_id[-1]:
+            self.is_sorted = False
+        self.arr_doc_id.append(doc_id)
+        self.arr_term_freq.append(term_freq)
+        if term_freq > self.max_term_freq:
+            self.max_term_freq = term_freq
+        if positions is not None:
+            if self.dic_positions is None:
+                self.dic_positions = {}
+            self.dic_positions[doc_id] = array('I', positions)
+
+    def sort(self):
+        #ordena as ocorrências por doc_id (os documentos podem ser indexados fora de ordem)
+        if not self.is_sorted:
+            lst_order = sorted(range(len(self.arr_doc_id)), key=self.arr_doc_id.__getitem__)
+            self.arr_doc_id = array('I', map(self.arr_doc_id.__getitem__, lst_order))
+            self.arr_term_freq = array('I', map(self.arr_term_freq.__getitem__, lst_order))
+            self.is_sorted = True
+
+    def __len__(self):
+        return len(self.arr_doc_id)
+
+    def __getitem__(self, i:int) -> TermOccurrence:
+        return TermOccurrence(self.arr_doc_id[i], self.term_id, self.arr_term_freq[i])
+
+    def __iter__(self):
+        for doc_id, term_freq in zip(self.arr_doc_id, self.arr_term_freq):
+            yield TermOccurrence(doc_id, self.term_id, term_freq)
+
+
+
+class FrozenPostings:
+    #listas de ocorrências do HashIndex congelado, em layout CSR (arrays NumPy contíguos):
+    #as ocorrências do termo t são arr_doc_ids[arr_offsets[t]:arr_offsets[t+1]] (ordenadas por
+    #doc_id) e os respectivos arr_term_freqs. Não há um objeto por termo nem por ocorrência
+    def __init__(self, arr_offsets, arr_doc_ids, arr_term_freqs, arr_max_term_freq):
+        self.arr_offsets = arr_offsets
+        self.arr_doc_ids = arr_doc_ids
+        self.arr_term_freqs = arr_term_freqs
+        self.arr_max_term_freq = arr_max_term_freq
+
+    @classmethod
+    def from_posting_lists(cls, lst_posting_lists:List[PostingList], int_max_term_id:int) -> "FrozenPostings":
+        import numpy as np
+        arr_sizes = np.zeros(int_max_term_id+1, dtype=np.int64)
+        for posting_list in lst_posting_lists:
+            arr_sizes[posting_list.term_id] = len(posting_list)
+        arr_offsets = np.zeros(int_max_term_id+2, dtype=np.int64)
+        np.cumsum(arr_sizes, out=arr_offsets[1:])
+
+        arr_doc_ids = np.empty(arr_offsets[-1], dtype=np.uint32)
+        arr_term_freqs = np.empty(arr_offsets[-1], dtype=np.uint32)
+        arr_max_term_freq = np.zeros(int_max_term_id+1, dtype=np.uint32)
+        for posting_list in lst_posting_lists:
+            posting_list.sort()
+            int_start, int_end = arr_offsets[posting_list.term_id], arr_offsets[posting_list.term_id+1]
+            arr_doc_ids[int_start:int_end] = np.frombuffer(posting_list.arr_doc_id, dtype=np.uint32)
+            arr_term_freqs[int_start:int_end] = np.frombuffer(posting_list.arr_term_freq, dtype=np.uint32)
+            arr_max_term_freq[posting_list.term_id] = posting_list.max_term_freq
+        return cls(arr_offsets, arr_doc_ids, arr_term_freqs, arr_max_term_freq)
+
+    def postings(self, term_id:int):
+        #(doc_ids, term_freqs) do termo: views, sem cópia
+        int_start, int_end = self.arr_offsets[term_id], self.arr_offsets[term_id+1]
+        return self.arr_doc_ids[int_start:int_end], self.arr_term_freqs[int_start:int_end]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(arr.nbytes for arr in (self.arr_offsets, self.arr_doc_ids, self.arr_term_freqs, self.arr_max_term_freq))
 
 
 #HashIndex é subclasse de Index
 class HashIndex(Index):
+    def __init__(self, frozen:bool=False):
+        super().__init__()
+        #frozen: finish_indexing chama freeze(). Depois de congelado, dic_index guarda apenas
+        #termo -> term_id e as ocorrências ficam em self.postings (ver FrozenPostings)
+        self.frozen = frozen
+        self.postings = None
+        #posições (se indexadas) do indice congelado: term_id -> {doc_id: posições}
+        self.dic_frozen_positions = {}
+
+    def finish_indexing(self):
+        if self.frozen:
+            self.freeze()
+
+    def freeze(self):
+        #converte as listas de ocorrências para o layout CSR (requer NumPy); o indice
+        #passa a ser somente leitura
+        if self.postings is not None:
+            return
+        try:
+            self.postings = FrozenPostings.from_posting_lists(list(self.dic_index.values()), self.autoIncrement)
+        except ImportError as e:
+            raise ImportError("HashIndex.freeze() requer o NumPy (pip install numpy)") from e
+        self.dic_frozen_positions = {posting_list.term_id: posting_list.dic_positions
+                                        for posting_list in self.dic_index.values() if posting_list.dic_positions}
+        self.dic_index = {term: posting_list.term_id for term, posting_list in self.dic_index.items()}
+
+    def index(self, term:str, doc_id:int, term_freq:int, positions:List[int]=None):
+        if self.postings is not None:
+            raise ValueError("O indice foi congelado (freeze) e não aceita novas ocorrências")
+        super().index(term, doc_id, term_freq, positions)
+
     def get_term_id(self, term:str):
-        return self.dic_index[term][0].term_id
+        if self.postings is not None:
+            return self.dic_index[term]
+        return self.dic_index[term].term_id
 
-    def create_index_entry(self, termo_id:int) -> List:
-        return []
+    def writeOnFile(self):
+        #congelado, dic_index guarda apenas os term_ids: as ocorrências vêm das arrays CSR
+        #(o arquivo tem o mesmo formato do indice não congelado)
+        if self.postings is None:
+            return super().writeOnFile()
+        dic_index_serializable = {term: [occurrence.__dict__ for occurrence in self.get_occurrence_list(term)]
+                                    for term in self.dic_index}
+        with open('dic_index.json', 'w') as outfile:
+            json.dump(dic_index_serializable, outfile, indent=4)
+
+    def get_posting_arrays(self, term:str):
+        #(doc_ids, term_freqs) ordenados por doc_id: arrays NumPy se o indice estiver congelado
+        if term not in self.dic_index:
+            return array('I'), array('I')
+        if self.postings is not None:
+            return self.postings.postings(self.dic_index[term])
+        posting_list = self.dic_index[term]
+        posting_list.sort()
+        return posting_list.arr_doc_id, posting_list.arr_term_freq
 
-    def add_index_occur(self, entry_dic_index:List[TermOccurrence], doc_id:int, term_id:int, term_freq:int):
-        entry_dic_index.append(TermOccurrence(doc_id, term_id, term_freq ))
+    def create_index_entry(self, termo_id:int) -> PostingList:
+        return PostingList(termo_id)
+
+    def add_index_occur(self, entry_dic_index:PostingList, doc_id:int, term_id:int, term_freq:int, positions:List[int]=None):
+        entry_dic_index.add(doc_id, term_freq, positions)
 
     def get_occurrence_list(self,term: str)->List:
-        if term in self.dic_index:
-            return self.dic_index[term]
-        return []
+        if term not in self.dic_index:
+            return []
+        if self.postings is not None:
+            term_id = self.dic_index[term]
+            arr_doc_ids, arr_term_freqs = self.postings.postings(term_id)
+            return [TermOccurrence(doc_id, term_id, term_freq) for doc_id, term_freq in zip(arr_doc_ids.tolist(), arr_term_freqs.tolist())]
+        return list(self.dic_index[term])
 
-    def document_count_with_term(self,term:str) -> int:
-        return len(self.get_occurrence_list(term))
+    def get_posting_cursor(self, term:str) -> PostingCursor:
+        if term not in self.dic_index:
+            return ArrayCursor([])
+        arr_doc_ids, arr_term_freqs = self.get_posting_arrays(term)
+        if self.postings is not None:
+            #memoryview: o cursor lê inteiros Python das arrays NumPy sem copiá-las
+            return ArrayCursor(memoryview(arr_doc_ids), memoryview(arr_term_freqs))
+        return ArrayCursor(arr_doc_ids, arr_term_freqs)
+
+    def max_term_freq(self, term:str) -> int:
+        if term not in self.dic_index:
+            return 0
+        if self.postings is not None:
+            return int(self.postings.arr_max_term_freq[self.dic_index[term]])
+        return self.dic_index[term].max_term_freq
+
+    def get_positions_reader(self, term:str) -> MappingPositionsReader:
+        if term not in self.dic_index:
+            return MappingPositionsReader({})
+        if self.postings is not None:
+            return MappingPositionsReader(self.dic_frozen_positions.get(self.dic_index[term], {}))
+        return MappingPositionsReader(self.dic_index[term].dic_positions or {})
 
 
 
 
 
 class TermFilePosition:
-    def __init__(self,term_id:int,  term_file_start_pos:int=None, doc_count_with_term:int = None):
+    def __init__(self,term_id:int,  term_file_start_pos:int=None, doc_count_with_term:int = None, term_file_byte_len:int = None,
+                        max_term_freq:int = None):
         self.term_id = term_id
 
         #a serem definidos após a indexação
         self.term_file_start_pos = term_file_start_pos
         self.doc_count_with_term = doc_count_with_term
+        #tamanho, em bytes, das ocorrências do termo no arquivo
+        self.term_file_byte_len = term_file_byte_len
+        #maior term_freq do termo (limite superior para o ranking)
+        self.max_term_freq = max_term_freq
 
     def __str__(self):
-        return f"term_id: {self.term_id}, doc_count_with_term: {self.doc_count_with_term}, term_file_start_pos: {self.term_file_start_pos}"
+        return f"term_id: {self.term_id}, doc_count_with_term: {self.doc_count_with_term}, term_file_start_pos: {self.term_file_start_pos}, term_file_byte_len: {self.term_file_byte_len}, max_term_freq: {self.max_term_freq}"
     def __repr__(self):
         return str(self)
 
+def _sort_and_write_run(occurrences:OccurrenceBuffer, str_run_file_name:str, bol_disable_gc:bool):
+    #executado pelo executor do FileIndex (thread ou processo): ordena o buffer e grava o run.
+    #Retorna os tempos de ordenação e gravação e os bytes gravados (para as métricas)
+    if bol_disable_gc:
+        gc.disable()
+    time_start = perf_counter()
+    occurrences.sort()
+    time_sorted = perf_counter()
+    with open(str_run_file_name, "wb") as file, OccurrenceWriter(file) as writer:
+        writer.write_all(occurrences.iter_tuples())
+    int_bytes = writer.record_count*RECORD_SIZE
+    if occurrences.lst_positions is not None:
+        int_bytes += _write_positions_run(occurrences, str_run_file_name)
+    if bol_disable_gc:
+        gc.enable()
+    return time_sorted-time_start, perf_counter()-time_sorted, int_bytes
+
+def _write_positions_run(occurrences:OccurrenceBuffer, str_run_file_name:str) -> int:
+    #as posições do run ficam em <run>.pos, na mesma ordem das ocorrências
+    with open(f"{str_run_file_name}.pos", "wb") as file:
+        write_positions_run(file, occurrences.lst_positions)
+        return file.tell()
+
+#memória estimada de cada termo do vocabulário em memória (além da própria string):
+#o TermFilePosition, o seu __dict__ e a entrada no dicionário
+LEXICON_ENTRY_BYTES = sys.getsizeof(TermFilePosition(0))+sys.getsizeof(TermFilePosition(0).__dict__)+3*8
+#memória de cada doc_id no conjunto de documentos (o int; a tabela do set é medida com sys.getsizeof)
+DOCUMENT_ENTRY_BYTES = sys.getsizeof(1 << 20)
+
 class FileIndex(Index):
 
     TMP_OCCURRENCES_LIMIT = 1000000
+    #com memory_budget, o buffer nunca é gravado com menos ocorrências que isso
+    #(mesmo que apenas o vocabulário já ocupe todo o orçamento)
+    MIN_BUFFER_OCCURRENCES = 4096
+    #None: gravação síncrona; "thread": ordenação e gravação em uma thread (sobrepõe a E/S);
+    #"process": em um processo (sobrepõe também a ordenação)
+    FLUSH_EXECUTORS = (None, "thread", "process")
 
-    def __init__(self):
+    def __init__(self, spimi:bool=False, file_prefix:str="occur_index", compressed:bool=False,
+                        cache_bytes:int=0, query_cache_bytes:int=0, metrics:Metrics=None,
+                        memory_budget:int=None, flush_executor:str=None, max_pending_flushes:int=2,
+                        positional:bool=False, frozen_lexicon:bool=False, bitmap_threshold:int=None):
         super().__init__()
+        if flush_executor not in FileIndex.FLUSH_EXECUTORS:
+            raise ValueError(f"flush_executor deve ser um de {FileIndex.FLUSH_EXECUTORS} e não {flush_executor}")
+        if flush_executor is not None and not spimi:
+            raise ValueError("A gravação em segundo plano (flush_executor) só é suportada no modo SPIMI")
+        if positional and not spimi:
+            raise ValueError("O indice posicional só é suportado no modo SPIMI")
+        if bitmap_threshold is not None and not spimi:
+            raise ValueError("As listas em bitmap (bitmap_threshold) só são suportadas no modo SPIMI")
+
+        #modo posicional: as posições de cada ocorrência são gravadas em um arquivo
+        #separado (<arquivo de indice>.pos), lido apenas pelas consultas por frase
+        self.positional = positional
+        self.positions_mmap = None
+        self.arr_positions_term_id = None
+        self.arr_positions_start = None
+
+        #ao final da indexação, o dicionário termo -> TermFilePosition é substituído por um
+        #lexicon.Lexicon (termos ordenados e com front coding em um único buffer)
+        self.frozen_lexicon = frozen_lexicon
 
-        self.lst_occurrences_tmp = []
+        #termos com df >= bitmap_threshold são gravados no final da indexação como bitmaps
+        #de doc_ids (<arquivo de indice>.bm, ver bitmap.py) e não como lista ordenada: AND/OR
+        #entre eles são operações bit a bit. As consultas às ocorrências não mudam
+        self.bitmap_threshold = bitmap_threshold
+        self.bitmap_writer = None
+        self.bitmap_mmap = None
+        self.arr_bitmap_term_id = None
+        self.arr_bitmap_start = None
+
+        self.lst_occurrences_tmp = self.new_buffer()
         self.idx_file_counter = 0
         self.str_idx_file_name = None
         self.next_from_list_idx = 0
 
+        #modo SPIMI: cada buffer ordenado é gravado como um run imutável e todos
+        #os runs são intercalados uma única vez (k-way merge) no finish_indexing
+        self.spimi = spimi
+        self.file_prefix = file_prefix
+        self.lst_run_file_names = []
+
+        #arquivo final no formato comprimido (ver codec.encode_postings)
+        self.compressed = compressed
+
+        #mmap somente leitura do arquivo de indice final (aberto no finish_indexing)
+        self.idx_mmap = None
+
+        #cache das listas de ocorrências já decodificadas (limitado a cache_bytes bytes)
+        #e, opcionalmente, dos resultados de consultas. Ambos são invalidados sempre
+        #que o arquivo de indice é (re)aberto
+        self.posting_cache = ByteBudgetCache(cache_bytes) if cache_bytes > 0 else None
+        self.query_cache = ByteBudgetCache(query_cache_bytes) if query_cache_bytes > 0 else None
+
+        #métricas opcionais (ver metrics.Metrics): gravações, tamanho dos runs, bytes
+        #lidos/escritos e tempo de ordenação e intercalação
+        self.metrics = metrics
+
+        #orçamento de memória (em bytes) para o buffer e o vocabulário: substitui o
+        #TMP_OCCURRENCES_LIMIT fixo. O buffer é gravado quando a estimativa
+        #(ver memory_usage) atinge o orçamento
+        #gravação em segundo plano (SPIMI): o buffer cheio é entregue ao executor e a
+        #indexação continua em um buffer novo. Com max_pending_flushes gravações
+        #pendentes, a próxima espera a mais antiga terminar (backpressure)
+        self.flush_executor = flush_executor
+        self.max_pending_flushes = max_pending_flushes
+        self.executor = None
+        self.lst_pending_flushes = []
+
+        self.memory_budget = memory_budget
+        self.int_lexicon_bytes = 0
+        self.int_buffer_limit = None
+        self.bol_budget_warning = False
+        if memory_budget is not None:
+            self.update_buffer_limit()
+
+    @property
+    def lst_occurrences_tmp(self) -> OccurrenceBuffer:
+        return self.occurrences_tmp
+
+    @lst_occurrences_tmp.setter
+    def lst_occurrences_tmp(self, lst_occurrences):
+        #aceita também uma lista de TermOccurrence, convertendo-a para o buffer colunar
+        if not isinstance(lst_occurrences, OccurrenceBuffer):
+            lst_occurrences = OccurrenceBuffer(lst_occurrences, self.positional)
+        self.occurrences_tmp = lst_occurrences
+
+    def new_buffer(self) -> OccurrenceBuffer:
+        return OccurrenceBuffer(positional=self.positional)
+
+    def buffer_size(self) -> int:
+        #tamanho do buffer em ocorrências; as posições contam como as ocorrências que ocupariam a mesma memória
+        return len(self.lst_occurrences_tmp)+self.lst_occurrences_tmp.int_positions_bytes//OCCURRENCE_BUFFER_BYTES
+
+    def index(self, term:str, doc_id:int, term_freq:int, positions:List[int]=None):
+        if self.memory_budget is None:
+            return super().index(term, doc_id, term_freq, positions)
+
+        #termo ou documento novo: o vocabulário, os documentos e as estatísticas crescem e o limite do buffer diminui
+        bol_new_term = term not in self.dic_index
+        bol_grow = bol_new_term or doc_id not in self.set_documents
+        if bol_new_term:
+            self.int_lexicon_bytes += sys.getsizeof(term)+LEXICON_ENTRY_BYTES
+        super().index(term, doc_id, term_freq, positions)
+        if bol_grow:
+            self.update_buffer_limit()
+            if self.buffer_size() >= self.int_buffer_limit:
+                self.save_tmp_occurrences()
+
+    def update_buffer_limit(self):
+        #quantas ocorrências cabem no que sobra do orçamento depois do vocabulário
+        #(dividido entre o buffer atual e os que podem estar aguardando gravação)
+        int_used_bytes = self.int_lexicon_bytes+self.documents_bytes()+self.statistics_bytes()
+        int_free_bytes = self.memory_budget-int_used_bytes
+        #avisa (uma vez) apenas quando o vocabulário existe e já não sobra espaço nem para o buffer mínimo
+        if self.int_lexicon_bytes > 0 and int_free_bytes < self.MIN_BUFFER_OCCURRENCES*OCCURRENCE_BUFFER_BYTES and \
+                not self.bol_budget_warning:
+            self.bol_budget_warning = True
+            logger.warning("O vocabulário e os documentos ocupam quase todo o orçamento de memória (%d de %d bytes)",
+                            int_used_bytes, self.memory_budget)
+        if self.flush_executor is not None:
+            int_free_bytes //= 1+self.max_pending_flushes
+        self.int_buffer_limit = max(int_free_bytes//OCCURRENCE_BUFFER_BYTES, self.MIN_BUFFER_OCCURRENCES)
+
+    def documents_bytes(self) -> int:
+        return sys.getsizeof(self.set_documents)+len(self.set_documents)*DOCUMENT_ENTRY_BYTES
+
+    def statistics_bytes(self) -> int:
+        return sum(len(arr)*arr.itemsize for arr in (self.statistics.arr_df, self.statistics.arr_cf,
+                                                     self.statistics.arr_doc_length, self.statistics.arr_doc_unique_terms))
+
+    def memory_usage(self) -> dict:
+        #estimativa (em bytes) da memória usada durante a indexação e o pico real do processo
+        int_buffer_bytes = (len(self.lst_occurrences_tmp)+sum(int_size for _, int_size in self.lst_pending_flushes))*OCCURRENCE_BUFFER_BYTES
+        int_lexicon_bytes = self.int_lexicon_bytes if self.memory_budget is not None else \
+                                sum(sys.getsizeof(term)+LEXICON_ENTRY_BYTES for term in self.dic_index)
+        return {"buffer_bytes": int_buffer_bytes, "lexicon_bytes": int_lexicon_bytes,
+                "documents_bytes": self.documents_bytes(), "statistics_bytes": self.statistics_bytes(),
+                "estimated_bytes": int_buffer_bytes+int_lexicon_bytes+self.documents_bytes()+self.statistics_bytes(),
+                "memory_budget": self.memory_budget, "peak_rss_bytes": peak_rss_bytes()}
+
     def get_term_id(self, term:str):
         return self.dic_index[term].term_id
 
     def create_index_entry(self, term_id:int) -> TermFilePosition:
         return TermFilePosition(term_id)
 
-    def add_index_occur(self, entry_dic_index:TermFilePosition,  doc_id:int, term_id:int, term_freq:int):
-        self.lst_occurrences_tmp.append(TermOccurrence(doc_id,term_id,term_freq))
+    def add_index_occur(self, entry_dic_index:TermFilePosition,  doc_id:int, term_id:int, term_freq:int, positions:List[int]=None):
+        if positions is not None and not self.positional:
+            raise ValueError("Posições só podem ser indexadas em um FileIndex com positional=True")
+        self.lst_occurrences_tmp.add(doc_id,term_id,term_freq,positions)
 
-        if len(self.lst_occurrences_tmp) >= FileIndex.TMP_OCCURRENCES_LIMIT:
+        if self.buffer_size() >= (self.TMP_OCCURRENCES_LIMIT if self.int_buffer_limit is None else self.int_buffer_limit):
             self.save_tmp_occurrences()
 
     def next_from_list(self) -> TermOccurrence:
@@ -179,113 +668,495 @@ class FileIndex(Index):
         return next_from_list
 
     def next_from_file(self,file_idx) -> TermOccurrence:
-        bytes_doc_id = file_idx.read(BYTE_SIZE)
-        if not bytes_doc_id:
+        bytes_occurrence = file_idx.read(RECORD_SIZE)
+        if len(bytes_occurrence) < RECORD_SIZE:
             return None
-        bytes_term_id = file_idx.read(BYTE_SIZE)
-        bytes_term_freq = file_idx.read(BYTE_SIZE)
 
         #next_from_file = pickle.load(file_idx) # Não conseguimos usar, deu erro: UnpicklingError: invalid load key, '\x00'.
-        
-        doc_id = int.from_bytes(bytes_doc_id, "big")
-        term_id = int.from_bytes(bytes_term_id, "big")
-        term_freq = int.from_bytes(bytes_term_freq, "big")
+
+        doc_id, term_id, term_freq = OCCURRENCE_RECORD.unpack(bytes_occurrence)
         return TermOccurrence(doc_id, term_id, term_freq)
 
+    def iter_file_occurrences(self, file_idx):
+        #gera tuplas (term_id, doc_id, term_freq) lidas em blocos, para que as intercalações
+        #comparem tuplas (em C) e não objetos TermOccurrence
+        return read_occurrences(file_idx)
+
+    def write_occurrences(self, file_idx, it_occurrences):
+        with OccurrenceWriter(file_idx) as writer:
+            writer.write_all(it_occurrences)
+        if self.metrics is not None:
+            self.metrics.increment("bytes_written", writer.record_count*RECORD_SIZE)
+
+    def count_bytes_read(self, lst_file_names:List[str]):
+        if self.metrics is not None:
+            self.metrics.increment("bytes_read", sum(os.path.getsize(str_file) for str_file in lst_file_names))
+
 
     def save_tmp_occurrences(self):
+        if self.flush_executor is not None:
+            self.submit_tmp_occurrences()
+            return
 
         #ordena pelo term_id, doc_id
         #Para eficiencia, todo o codigo deve ser feito com o garbage
         #collector desabilitado
         gc.disable()
+        if self.metrics is not None:
+            self.metrics.increment("flushes")
+            self.metrics.observe("run_size", len(self.lst_occurrences_tmp))
         
         #ordena pelo term_id, doc_id
-        self.lst_occurrences_tmp.sort()
+        with timer(self.metrics, "sort"):
+            self.lst_occurrences_tmp.sort()
+
+        if self.spimi:
+            with timer(self.metrics, "write_run"):
+                self.write_run_file(self.lst_occurrences_tmp.iter_tuples())
+            gc.enable()
+            if self.metrics is not None:
+                self.metrics.maybe_report()
+            return
 
         ### Abra um arquivo novo faça a ordenação externa: comparar sempre a primeira posição
-        ### da lista com a primeira possição do arquivo usando os métodos next_from_list e next_from_file
-        ### para armazenar no novo indice ordenado
+        ### da lista com a primeira possição do arquivo, intercalando as duas sequências
+        ### ordenadas diretamente no novo indice
 
         if self.str_idx_file_name == None:
-            self.write_file_occurences(self.lst_occurrences_tmp)
+            with timer(self.metrics, "write_run"):
+                self.write_file_occurences(self.lst_occurrences_tmp.iter_tuples())
             
         else:
-            with open(self.str_idx_file_name,"rb") as file:
-                new_ordered_list = []
-
-                next_from_list = self.next_from_list()
-                next_from_file = self.next_from_file(file)
-                
-                while next_from_list != None or next_from_file != None:
-                    if next_from_list < next_from_file:
-                        new_ordered_list.append(next_from_list)
-                        next_from_list = self.next_from_list()
-                    else:
-                        new_ordered_list.append(next_from_file)
-                        next_from_file = self.next_from_file(file)
-                self.write_file_occurences(new_ordered_list)
+            self.count_bytes_read([self.str_idx_file_name])
+            with timer(self.metrics, "merge"), open(self.str_idx_file_name,"rb") as file:
+                self.write_file_occurences(heapq.merge(self.lst_occurrences_tmp.iter_tuples(),
+                                                        self.iter_file_occurrences(file)))
 
         gc.enable()
+        if self.metrics is not None:
+            self.metrics.maybe_report()
+
+    def submit_tmp_occurrences(self):
+        #o nome do run é definido aqui, então a ordem dos runs não depende de qual gravação termina antes
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(1) if self.flush_executor == "thread" else ProcessPoolExecutor(1)
+        while len(self.lst_pending_flushes) >= self.max_pending_flushes:
+            self.collect_flush(self.lst_pending_flushes.pop(0))
 
-    def write_file_occurences(self, lst_occurrences):
-        self.lst_occurrences_tmp = []
+        if self.metrics is not None:
+            self.metrics.increment("flushes")
+            self.metrics.observe("run_size", len(self.lst_occurrences_tmp))
+        str_run_file_name = f"{self.file_prefix}_run_{len(self.lst_run_file_names)+1}"
+        self.lst_run_file_names.append(str_run_file_name)
+        #o gc só é desabilitado em outro processo: em uma thread afetaria também a indexação
+        future = self.executor.submit(_sort_and_write_run, self.lst_occurrences_tmp,
+                                        str_run_file_name, self.flush_executor == "process")
+        self.lst_pending_flushes.append((future, len(self.lst_occurrences_tmp)))
+        self.lst_occurrences_tmp = self.new_buffer()
         self.next_from_list_idx = 0
+
+    def collect_flush(self, pending_flush):
+        #espera a gravação terminar (repassando eventuais exceções) e registra as métricas
+        future, _ = pending_flush
+        sort_seconds, write_seconds, int_bytes = future.result()
+        if self.metrics is not None:
+            self.metrics.add_time("sort", sort_seconds)
+            self.metrics.add_time("write_run", write_seconds)
+            self.metrics.increment("bytes_written", int_bytes)
+            self.metrics.maybe_report()
+
+    def wait_flushes(self):
+        #aguarda todas as gravações pendentes e libera o executor
+        with timer(self.metrics, "wait_flushes"):
+            while len(self.lst_pending_flushes) > 0:
+                self.collect_flush(self.lst_pending_flushes.pop(0))
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def write_file_occurences(self, it_occurrences):
         self.idx_file_counter = self.idx_file_counter + 1
-        self.str_idx_file_name = f"occur_index_{self.idx_file_counter}"
+        self.str_idx_file_name = f"{self.file_prefix}_{self.idx_file_counter}"
 
         #pickle.dump(self.lst_occurrences_tmp, open(self.str_idx_file_name,"wb") )
 
         with open(self.str_idx_file_name,"wb") as file:
-            for term_occurence in lst_occurrences:
-                term_occurence.write(file)
-            file.close()
+            self.write_occurrences(file, it_occurrences)
+        self.lst_occurrences_tmp = self.new_buffer()
+        self.next_from_list_idx = 0
+
+    def write_run_file(self, it_occurrences):
+        str_run_file_name = f"{self.file_prefix}_run_{len(self.lst_run_file_names)+1}"
+
+        with open(str_run_file_name,"wb") as file:
+            self.write_occurrences(file, it_occurrences)
+        if self.positional:
+            int_bytes = _write_positions_run(self.lst_occurrences_tmp, str_run_file_name)
+            if self.metrics is not None:
+                self.metrics.increment("bytes_written", int_bytes)
+        self.lst_run_file_names.append(str_run_file_name)
+        self.lst_occurrences_tmp = self.new_buffer()
+        self.next_from_list_idx = 0
+
+    def iter_run_file(self, str_file_name:str):
+        with open(str_file_name,"rb") as file:
+            yield from self.iter_file_occurrences(file)
+
+    def iter_run_file_positions(self, str_file_name:str):
+        #tuplas (term_id, doc_id, term_freq, posições codificadas) do run e do seu arquivo de posições
+        with open(f"{str_file_name}.pos","rb") as pos_file:
+            yield from ((term_id, doc_id, term_freq, bytes_positions)
+                            for (term_id, doc_id, term_freq), bytes_positions in zip(self.iter_run_file(str_file_name),
+                                                                                     read_positions_run(pos_file)))
+
+    def iter_sorted_occurrences(self):
+        #sequência final ordenada: intercalação de todos os runs (SPIMI)
+        #ou o último arquivo intercalado
+        if self.positional:
+            it_occurrences = self.iter_sorted_positional_occurrences()
+        elif self.spimi:
+            it_occurrences = heapq.merge(*[self.iter_run_file(str_run) for str_run in self.lst_run_file_names])
+        else:
+            return self.iter_run_file(self.str_idx_file_name)
+        if self.bitmap_threshold is not None:
+            return self.iter_bitmap_filtered_occurrences(it_occurrences)
+        return it_occurrences
+
+    def is_bitmap_term(self, term_id:int) -> bool:
+        #o df acumulado durante a indexação já é o definitivo quando os runs são intercalados
+        return self.statistics.df(term_id) >= self.bitmap_threshold
+
+    def iter_bitmap_filtered_occurrences(self, it_occurrences):
+        #grava os termos frequentes em <arquivo de indice>.bm e segue apenas com os demais.
+        #Como em iter_sorted_positional_occurrences, só é percorrido depois que o nome do arquivo final foi definido
+        with open(f"{self.str_idx_file_name}.bm", "wb") as bitmap_file:
+            self.bitmap_writer = BitmapWriter(bitmap_file)
+            yield from self.bitmap_writer.filter(it_occurrences, self.is_bitmap_term)
+        with open(f"{self.str_idx_file_name}.bmidx", "wb") as file:
+            file.write(self.bitmap_writer.index_bytes())
+        if self.metrics is not None:
+            self.metrics.increment("bytes_written", self.bitmap_writer.int_pos)
+
+    def iter_sorted_positional_occurrences(self):
+        #intercala os runs junto com as suas posições: as ocorrências seguem para o arquivo de
+        #indice e as posições são gravadas, na mesma ordem, em <arquivo de indice>.pos.
+        #O gerador só começa a ser percorrido depois que o nome do arquivo final foi definido
+        self.count_bytes_read([f"{str_run}.pos" for str_run in self.lst_run_file_names])
+        it_occurrences = heapq.merge(*[self.iter_run_file_positions(str_run) for str_run in self.lst_run_file_names])
+        with open(f"{self.str_idx_file_name}.pos", "wb") as pos_file:
+            writer = PositionsWriter(pos_file)
+            for term_id, doc_id, term_freq, bytes_positions in it_occurrences:
+                writer.write(term_id, doc_id, bytes_positions)
+                yield term_id, doc_id, term_freq
+        with open(f"{self.str_idx_file_name}.posidx", "wb") as file:
+            file.write(writer.index_bytes())
+        if self.metrics is not None:
+            self.metrics.increment("bytes_written", writer.int_pos)
+
+    def remove_run_files(self):
+        for str_run in self.lst_run_file_names:
+            os.remove(str_run)
+            if self.positional:
+                os.remove(f"{str_run}.pos")
+        self.lst_run_file_names = []
+
+    def merge_run_files(self):
+        #intercala todos os runs em um único arquivo de indice (cada ocorrência é
+        #escrita no máximo duas vezes: no run e no arquivo final)
+        self.count_bytes_read(self.lst_run_file_names)
+        it_occurrences = self.iter_sorted_occurrences()
+        self.idx_file_counter = self.idx_file_counter + 1
+        self.str_idx_file_name = f"{self.file_prefix}_{self.idx_file_counter}"
+
+        with timer(self.metrics, "merge"), open(self.str_idx_file_name,"wb") as file:
+            self.write_occurrences(file, it_occurrences)
+        self.remove_run_files()
+
+    def write_compressed_postings(self, dic_ids_por_termo):
+        #grava as ocorrências ordenadas no formato comprimido, agrupadas por termo,
+        #atualizando a posição, quantidade de documentos e tamanho de cada termo
+        self.count_bytes_read(self.lst_run_file_names if self.spimi else [self.str_idx_file_name])
+        it_occurrences = self.iter_sorted_occurrences()
+        self.idx_file_counter = self.idx_file_counter + 1
+        self.str_idx_file_name = f"{self.file_prefix}_{self.idx_file_counter}.vb"
+
+        with timer(self.metrics, "merge"), open(self.str_idx_file_name,"wb") as file:
+            for term_id, it_term_occurrences in groupby(it_occurrences, key=itemgetter(0)):
+                lst_doc_ids = []
+                lst_term_freqs = []
+                for _, doc_id, term_freq in it_term_occurrences:
+                    lst_doc_ids.append(doc_id)
+                    lst_term_freqs.append(term_freq)
+                bytes_postings = encode_postings(lst_doc_ids, lst_term_freqs)
+                dic_ids_por_termo[term_id] = (file.tell(), len(lst_doc_ids), dic_ids_por_termo[term_id][2], len(bytes_postings),
+                                                max(lst_term_freqs), sum(lst_term_freqs))
+                file.write(bytes_postings)
+            if self.metrics is not None:
+                self.metrics.increment("bytes_written", file.tell())
+        if self.spimi:
+            self.remove_run_files()
 
     def finish_indexing(self):
         if len(self.lst_occurrences_tmp) > 0:
             self.save_tmp_occurrences()
+        self.wait_flushes()
 
         #Sugestão: faça a navegação e obetenha um mapeamento 
         # id_termo -> obj_termo armazene-o em dic_ids_por_termo
         dic_ids_por_termo = {}
         for str_term,obj_term in self.dic_index.items():
-            dic_ids_por_termo[obj_term.term_id] = (0, 0, str_term)
+            dic_ids_por_termo[obj_term.term_id] = (0, 0, str_term, 0, 0, 0)
+
+        logger.debug("Finalizando o indice: %d termos", len(dic_ids_por_termo))
+
+        if self.compressed:
+            self.write_compressed_postings(dic_ids_por_termo)
+        else:
+            if self.spimi:
+                self.merge_run_files()
+            self.count_bytes_read([self.str_idx_file_name])
+            with timer(self.metrics, "finalize_scan"), open(self.str_idx_file_name,'rb') as idx_file:
+                for int_record, (term_id, doc_id, term_freq) in enumerate(read_occurrences(idx_file)):
+                    pointer_value, dic_count, key, byte_len, max_freq, sum_freq = dic_ids_por_termo[term_id]
+                    if(dic_count == 0):
+                        pointer_value = int_record * RECORD_SIZE
+                    dic_count += 1
+                    dic_ids_por_termo[term_id] = (pointer_value, dic_count, key, dic_count * RECORD_SIZE,
+                                                    max(max_freq, term_freq), sum_freq + term_freq)
+
+        if self.bitmap_writer is not None:
+            #termos gravados como bitmap: não ocupam espaço no arquivo de indice
+            for term_id, (int_doc_count, max_freq, sum_freq) in self.bitmap_writer.dic_term_stats.items():
+                dic_ids_por_termo[term_id] = (0, int_doc_count, dic_ids_por_termo[term_id][2], 0, max_freq, sum_freq)
+            self.bitmap_writer = None
 
-        print(dic_ids_por_termo)
-        
-        with open(self.str_idx_file_name,'rb') as idx_file:
-            file_trio = self.next_from_file(idx_file)
-            while(file_trio != None) :
-                pointer_value = dic_ids_por_termo[file_trio.term_id][0]
-                dic_count = dic_ids_por_termo[file_trio.term_id][1]
-                key = dic_ids_por_termo[file_trio.term_id][2]
-                if(dic_count == 0):
-                    pointer_value = idx_file.tell() - (BYTE_SIZE * 3) # 3 pois são salvos 3 interios por TermOccurrence
-                dic_count += 1
-                dic_ids_por_termo[file_trio.term_id] = (pointer_value, dic_count, key)
-                file_trio = self.next_from_file(idx_file)
-
-            print(dic_ids_por_termo)
         for key,value in dic_ids_por_termo.items():
-            self.dic_index[value[2]] = TermFilePosition(key, value[0], value[1])
-        print(self.dic_index)
+            self.dic_index[value[2]] = TermFilePosition(key, value[0], value[1], value[3], value[4])
+            #df e cf definitivos, obtidos das próprias listas de ocorrências
+            self.statistics.set_term(key, value[1], value[5])
+        if self.frozen_lexicon:
+            from .lexicon import Lexicon
+            self.dic_index = Lexicon.from_dic_index(self.dic_index, (), self.str_idx_file_name, self.compressed)
+        logger.debug("Indice %s finalizado: %d termos, %d documentos", self.str_idx_file_name,
+                        len(self.dic_index), self.document_count)
+        if self.memory_budget is not None:
+            logger.info("Orçamento de memória: %d bytes; vocabulário estimado em %d bytes; pico de RSS do processo: %s bytes",
+                        self.memory_budget, self.int_lexicon_bytes, peak_rss_bytes())
+        self.open_idx_file()
+        if self.metrics is not None:
+            self.metrics.report()
            
             #navega nas ocorrencias para atualizar cada termo em dic_ids_por_termo 
             #apropriadamente
 
 
-    def get_occurrence_list(self,term: str)->List:
+    def save(self, str_lexicon_file:str=None) -> str:
+        #grava o léxico binário (ver lexicon.Lexicon) ao lado do arquivo de ocorrências final
+        from .lexicon import Lexicon
+        if str_lexicon_file is None:
+            str_lexicon_file = f"{self.str_idx_file_name}.lex"
+        Lexicon.from_dic_index(self.dic_index, self.set_documents,
+                                self.str_idx_file_name, self.compressed).save(str_lexicon_file)
+        self.statistics.save(FileIndex.statistics_file_name(str_lexicon_file))
+        return str_lexicon_file
+
+    @staticmethod
+    def statistics_file_name(str_lexicon_file:str) -> str:
+        #estatísticas da coleção ficam ao lado do léxico (ex.: occur_index_3.lex -> occur_index_3.stats)
+        return f"{path.splitext(str_lexicon_file)[0]}.stats"
+
+    @classmethod
+    def open(cls, str_lexicon_file:str, cache_bytes:int=0, query_cache_bytes:int=0) -> "FileIndex":
+        #reabre um indice gravado por save() sem reindexar a coleção
+        from .lexicon import Lexicon
+        lexicon = Lexicon.load(str_lexicon_file)
+        obj_index = cls(compressed=lexicon.compressed, cache_bytes=cache_bytes, query_cache_bytes=query_cache_bytes)
+        obj_index.dic_index = lexicon
+        #o conjunto de documentos só é criado quando usado (ver set_documents)
+        obj_index.arr_doc_ids = lexicon.arr_doc_ids
+        obj_index.lazy_documents = None
+        obj_index.autoIncrement = max(lexicon.arr_term_id, default=0)
+        obj_index.str_idx_file_name = lexicon.str_idx_file_name
+        str_statistics_file = FileIndex.statistics_file_name(str_lexicon_file)
+        if path.exists(str_statistics_file):
+            obj_index.statistics = CollectionStatistics.load(str_statistics_file)
+        else:
+            #índice sem estatísticas gravadas: o df vem do próprio léxico
+            for i in range(len(lexicon)):
+                obj_index.statistics.set_term(lexicon.arr_term_id[i], lexicon.arr_doc_count[i], 0)
+        obj_index.open_idx_file()
+        return obj_index
+
+    @property
+    def set_documents(self) -> Set[int]:
+        #no indice reaberto por open() os doc_ids ficam no array do léxico e o conjunto
+        #é criado apenas na primeira consulta que precisar dele (ex.: NOT)
+        if self.lazy_documents is None:
+            self.lazy_documents = set(self.arr_doc_ids)
+        return self.lazy_documents
+
+    @set_documents.setter
+    def set_documents(self, set_documents:Set[int]):
+        self.lazy_documents = set_documents
+
+    @property
+    def document_count(self) -> int:
+        if self.lazy_documents is None:
+            return len(self.arr_doc_ids)
+        return len(self.lazy_documents)
+
+    def open_idx_file(self):
+        #mantém um único mmap do arquivo final: as consultas fatiam diretamente a posição
+        #do termo, sem reabrir nem ler o arquivo desde o início
+        self.close()
+        self.clear_cache()
+        with open(self.str_idx_file_name,'rb') as idx_file:
+            if os.fstat(idx_file.fileno()).st_size > 0:
+                self.idx_mmap = mmap.mmap(idx_file.fileno(), 0, access=mmap.ACCESS_READ)
+        #posições (indice posicional) e bitmaps, se existirem ao lado do arquivo de indice
+        self.arr_positions_term_id, self.arr_positions_start, self.positions_mmap = self.open_term_file(".pos")
+        self.arr_bitmap_term_id, self.arr_bitmap_start, self.bitmap_mmap = self.open_term_file(".bm")
+
+    def open_term_file(self, str_extension:str):
+        #arquivo auxiliar com um trecho por termo (<arquivo de indice><extensão>) e a sua
+        #tabela term_id -> início (<arquivo de indice><extensão>idx): (term_ids, inícios, mmap)
+        str_file_name = f"{self.str_idx_file_name}{str_extension}"
+        if not path.exists(f"{str_file_name}idx"):
+            return None, None, None
+        with open(f"{str_file_name}idx", "rb") as file:
+            arr_term_id, arr_term_start = load_term_offsets(file.read())
+        obj_mmap = None
+        with open(str_file_name, "rb") as file:
+            if os.fstat(file.fileno()).st_size > 0:
+                obj_mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        return arr_term_id, arr_term_start, obj_mmap
+
+    def term_file_view(self, term:str, arr_term_id, arr_term_start, obj_mmap) -> memoryview:
+        #trecho do termo em um arquivo auxiliar (None se o termo não estiver nele)
+        if arr_term_id is None or obj_mmap is None or term not in self.dic_index:
+            return None
+        term_id = self.dic_index[term].term_id
+        i = bisect_left(arr_term_id, term_id)
+        if i == len(arr_term_id) or arr_term_id[i] != term_id:
+            return None
+        return memoryview(obj_mmap)[arr_term_start[i]:arr_term_start[i+1]]
+
+    def close(self):
+        if self.executor is not None:
+            self.wait_flushes()
+        for str_attribute in ("idx_mmap", "positions_mmap", "bitmap_mmap"):
+            obj_mmap = getattr(self, str_attribute)
+            if obj_mmap is not None:
+                try:
+                    obj_mmap.close()
+                except BufferError:
+                    #ainda existem views exportadas; o mmap é liberado quando elas forem coletadas
+                    pass
+                setattr(self, str_attribute, None)
+
+    def clear_cache(self):
+        for cache in (self.posting_cache, self.query_cache):
+            if cache is not None:
+                cache.clear()
+
+    @property
+    def cache_info(self) -> dict:
+        #métricas (acertos, tamanho em bytes etc.) de cada nível de cache habilitado
+        return {str_name: cache.cache_info for str_name, cache in (("postings", self.posting_cache), ("queries", self.query_cache))
+                    if cache is not None}
+
+    def get_posting_view(self, term:str) -> memoryview:
+        #view (sem cópia) dos registros do termo no arquivo de indice
         if term not in self.dic_index:
-            return []
+            return memoryview(b"")
         termFilePosition : TermFilePosition = self.dic_index[term]
-        occurrences = 0
-        response = []
-        with open(self.str_idx_file_name,'rb') as idx_file:
-            idx_file.read(termFilePosition.term_file_start_pos) # skip pointer
-            while(occurrences < termFilePosition.doc_count_with_term) :
-                file_trio: TermOccurrence = self.next_from_file(idx_file)
-                occurrences+=1
-                response.append(file_trio)
-        return response
-    def document_count_with_term(self,term:str) -> int:
-        return len(self.get_occurrence_list(term))
+        if not termFilePosition.doc_count_with_term:
+            return memoryview(b"")
+        if self.idx_mmap is None:
+            self.open_idx_file()
+        int_start = termFilePosition.term_file_start_pos
+        int_byte_len = termFilePosition.term_file_byte_len
+        if int_byte_len is None:
+            int_byte_len = termFilePosition.doc_count_with_term*RECORD_SIZE
+        return memoryview(self.idx_mmap)[int_start:int_start+int_byte_len]
+
+    def iter_occurrences(self, term:str):
+        #iterador preguiçoso de tuplas (term_id, doc_id, term_freq)
+        view = self.bitmap_view(term)
+        if view is not None:
+            term_id = self.dic_index[term].term_id
+            return ((term_id, doc_id, term_freq) for doc_id, term_freq in zip(*decode_bitmap_postings(view)))
+        if self.compressed:
+            if term not in self.dic_index:
+                return iter(())
+            term_id = self.dic_index[term].term_id
+            return ((term_id, doc_id, term_freq) for doc_id, term_freq in decode_postings(self.get_posting_view(term)))
+        return decode_occurrences(self.get_posting_view(term))
+
+    def get_posting_arrays(self, term:str):
+        #(doc_ids, term_freqs) decodificados do termo, consultando antes o cache
+        if self.posting_cache is not None:
+            arrays = self.posting_cache.get(term)
+            if arrays is not None:
+                return arrays
+        arr_doc_ids, arr_term_freqs = array('I'), array('I')
+        for _, doc_id, term_freq in self.iter_occurrences(term):
+            arr_doc_ids.append(doc_id)
+            arr_term_freqs.append(term_freq)
+        if self.posting_cache is not None:
+            self.posting_cache.put(term, (arr_doc_ids, arr_term_freqs),
+                                    sys.getsizeof(arr_doc_ids)+sys.getsizeof(arr_term_freqs)+sys.getsizeof(term))
+        return arr_doc_ids, arr_term_freqs
+
+    def get_occurrence_list(self,term: str)->List:
+        if self.posting_cache is not None:
+            if term not in self.dic_index:
+                return []
+            term_id = self.dic_index[term].term_id
+            arr_doc_ids, arr_term_freqs = self.get_posting_arrays(term)
+            return [TermOccurrence(doc_id, term_id, term_freq) for doc_id, term_freq in zip(arr_doc_ids, arr_term_freqs)]
+        return [TermOccurrence(doc_id, term_id, term_freq)
+                    for term_id, doc_id, term_freq in self.iter_occurrences(term)]
+
+    def max_term_freq(self, term:str) -> int:
+        if term not in self.dic_index:
+            return 0
+        return self.dic_index[term].max_term_freq or 0
+
+    def terms_matching(self, str_pattern:str) -> List[str]:
+        #com o léxico (congelado ou reaberto por open), apenas o intervalo do prefixo é percorrido
+        from .lexicon import Lexicon
+        if isinstance(self.dic_index, Lexicon):
+            return list(self.dic_index.match(str_pattern))
+        return super().terms_matching(str_pattern)
+
+    def get_posting_cursor(self, term:str) -> PostingCursor:
+        #lê diretamente do mmap: no formato fixo os doc_ids são acessados por posição
+        #e no comprimido os blocos que não interessam são pulados
+        if self.posting_cache is not None or self.has_bitmap(term):
+            return ArrayCursor(*self.get_posting_arrays(term))
+        view = self.get_posting_view(term)
+        if self.compressed:
+            return BlockCursor(view, self.dic_index[term].doc_count_with_term if len(view) else 0)
+        return ArrayCursor(RecordColumn(view, 0), RecordColumn(view, 2*BYTE_SIZE))
+
+    def get_positions_reader(self, term:str) -> PositionsReader:
+        #somente o trecho do termo no arquivo de posições é lido (e apenas dos documentos consultados)
+        if self.arr_positions_term_id is None:
+            raise ValueError("O indice não possui posições (use FileIndex(spimi=True, positional=True))")
+        view = self.term_file_view(term, self.arr_positions_term_id, self.arr_positions_start, self.positions_mmap)
+        return PositionsReader(view if view is not None else b"")
+
+    def bitmap_view(self, term:str) -> memoryview:
+        if self.bitmap_mmap is None and self.arr_bitmap_term_id is not None and len(self.arr_bitmap_term_id) > 0:
+            #indice fechado (close): reabre os arquivos
+            self.open_idx_file()
+        return self.term_file_view(term, self.arr_bitmap_term_id, self.arr_bitmap_start, self.bitmap_mmap)
+
+    def has_bitmap(self, term:str) -> bool:
+        return self.bitmap_view(term) is not None
+
+    def get_bitmap(self, term:str) -> Bitmap:
+        #apenas os doc_ids: as frequências não são decodificadas
+        view = self.bitmap_view(term)
+        return None if view is None else decode_bitmap(view)